@@ -0,0 +1,66 @@
+"""Compares row by row and columnar matching of index entries.
+
+Matches equality and range query against index with string, integer
+and float keys stored with tuple and struct codecs.
+
+Usage: python -m benchmarks.columnar_match
+"""
+
+import timeit
+
+from ihashmap import columnar
+from ihashmap.cache import Cache
+from ihashmap.codec import StructCodec, TupleCodec
+
+KEYS = ["_id", "size", "weight"]
+
+QUERY = {"size": 7, "weight": {"$gte": 1000, "$lt": 20000}}
+
+CODECS = {
+    "tuple": TupleCodec(),
+    "struct": StructCodec({"_id": "12s", "size": "i", "weight": "d"}),
+    "packed": StructCodec({"_id": "12s", "size": "i", "weight": "d"}, packed=True),
+}
+
+
+def match_rows(codec, index_data):
+    return [
+        value
+        for value in codec.decode_many(KEYS, index_data)
+        if Cache._match_query(value, QUERY)
+    ]
+
+
+def match_columns(codec, index_data, numpy):
+    columns = codec.decode_columns(KEYS, index_data, numpy=numpy)
+    positions = columnar.match_columns(
+        QUERY, columns, len(index_data), Cache._match_operators
+    )
+    return [codec.decode(KEYS, index_data[i]) for i in positions]
+
+
+def main(entries=200000, number=3):
+    values = [
+        {"_id": f"{i:012d}", "size": i % 10, "weight": i / 3} for i in range(entries)
+    ]
+    engines = {"rows": lambda codec, data: match_rows(codec, data)}
+    engines["columns"] = lambda codec, data: match_columns(codec, data, None)
+    if columnar.numpy is not None:
+        engines["numpy"] = lambda codec, data: match_columns(
+            codec, data, columnar.numpy
+        )
+    print(f"{'codec':<10}" + "".join(f"{f'{name}, ms':>14}" for name in engines))
+    for name, codec in CODECS.items():
+        index_data = codec.load(
+            KEYS,
+            codec.dump(KEYS, sorted(codec.encode(KEYS, value) for value in values)),
+        )
+        timings = []
+        for engine in engines.values():
+            elapsed = timeit.timeit(lambda: engine(codec, index_data), number=number)
+            timings.append(elapsed / number * 1e3)
+        print(f"{name:<10}" + "".join(f"{timing:>14.2f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
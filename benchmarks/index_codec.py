@@ -0,0 +1,57 @@
+"""Compares index codecs.
+
+Measures pickled and in-memory size of stored index, encoding time of values
+and decoding time of stored index with string, integer and float keys.
+
+Usage: python -m benchmarks.index_codec
+"""
+
+import pickle
+import sys
+import timeit
+
+from ihashmap.codec import StringCodec, StructCodec, TupleCodec
+
+KEYS = ["_id", "price", "weight"]
+
+CODECS = {
+    "string": StringCodec(),
+    "tuple": TupleCodec(),
+    "struct": StructCodec({"_id": "12s", "price": "q", "weight": "d"}),
+    "packed": StructCodec({"_id": "12s", "price": "q", "weight": "d"}, packed=True),
+}
+
+
+def get_memory_size(stored) -> int:
+    size = sys.getsizeof(stored)
+    if isinstance(stored, (list, tuple)):
+        size += sum(get_memory_size(item) for item in stored)
+    return size
+
+
+def main(entries=100000, number=5):
+    values = [
+        {"_id": f"{i:012d}", "price": i * 7 % 1000, "weight": i / 3}
+        for i in range(entries)
+    ]
+    print(
+        f"{'codec':<10}{'pickled, KB':>14}{'memory, KB':>14}"
+        f"{'encode, ms':>14}{'decode, ms':>14}"
+    )
+    for name, codec in CODECS.items():
+        stored = codec.dump(KEYS, sorted(codec.encode(KEYS, value) for value in values))
+        pickled = len(pickle.dumps(stored, protocol=pickle.HIGHEST_PROTOCOL))
+        encode = timeit.timeit(
+            lambda: [codec.encode(KEYS, value) for value in values], number=number
+        )
+        decode = timeit.timeit(
+            lambda: codec.decode_many(KEYS, codec.load(KEYS, stored)), number=number
+        )
+        print(
+            f"{name:<10}{pickled / 1024:>14.1f}{get_memory_size(stored) / 1024:>14.1f}"
+            f"{encode / number * 1e3:>14.2f}{decode / number * 1e3:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
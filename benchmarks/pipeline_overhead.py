@@ -0,0 +1,46 @@
+"""Measures per-call overhead of Cache pipelines.
+
+Compares plain backend call with Cache.get executed through pipeline
+with different amount of registered middlewares.
+
+Usage: python -m benchmarks.pipeline_overhead
+"""
+
+import collections
+import timeit
+
+from ihashmap.cache import Cache
+
+STORAGE = {"bench": {"key": collections.UserDict({"_id": "key"})}}
+
+
+def get_method(cache, name, key, default=None):
+    return STORAGE[name].get(key, default)
+
+
+def noop(ctx):
+    pass
+
+
+def main(number=100000):
+    Cache.register_get_method(get_method)
+
+    class BenchCache(Cache):
+        pass
+
+    cache = BenchCache()
+    baseline = timeit.timeit(lambda: get_method(cache, "bench", "key"), number=number)
+    print(f"{'plain call':<20}{baseline / number * 1e6:>10.3f} us")
+
+    registered = 0
+    for middlewares in (0, 1, 5, 10):
+        while registered < middlewares:
+            BenchCache.PIPELINE.get.before()(noop)
+            registered += 1
+        elapsed = timeit.timeit(lambda: cache.get("bench", "key"), number=number)
+        title = f"{middlewares} middlewares"
+        print(f"{title:<20}{elapsed / number * 1e6:>10.3f} us")
+
+
+if __name__ == "__main__":
+    main()
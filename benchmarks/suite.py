@@ -0,0 +1,372 @@
+"""Reproducible benchmarks of Cache and Index hot paths.
+
+Measures set, get, update and delete throughput, search latency
+for different cache sizes and query selectivities, Cache.all,
+pipeline overhead for different amount of middlewares and memory
+used per indexed value. Every scenario runs against in-memory backend
+and backend adding artificial latency to every call.
+
+Results are written to JSON, so runs can be compared:
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --output after.json --compare before.json
+
+Usage: python -m benchmarks.suite [--sizes 1000 10000] [--latency 0.0002]
+"""
+
+import argparse
+import collections
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import typing
+
+from ihashmap.cache import Cache
+from ihashmap.index import Index, SortedIndex
+
+COLORS = 10
+"""Number of distinct values of equality searched key."""
+
+
+class MemoryBackend:
+    """Dict storage registered as Cache METHODS."""
+
+    def __init__(self):
+        self.storage = collections.defaultdict(dict)
+        self.calls = 0
+
+    def wait(self):
+        self.calls += 1
+
+    def get(self, cache, name, key, default=None):
+        self.wait()
+        return self.storage[name].get(key, default)
+
+    def set(self, cache, name, key, value):
+        self.wait()
+        self.storage[name][key] = value
+        return value
+
+    def delete(self, cache, name, key):
+        self.wait()
+        self.storage[name].pop(key, None)
+
+    def get_many(self, cache, name, keys, default=None):
+        self.wait()
+        storage = self.storage[name]
+        return [storage.get(key, default) for key in keys]
+
+    def set_many(self, cache, name, values):
+        self.wait()
+        self.storage[name].update(values)
+
+    def delete_many(self, cache, name, keys):
+        self.wait()
+        storage = self.storage[name]
+        for key in keys:
+            storage.pop(key, None)
+
+    def register(self):
+        """Registers backend methods as functions, so they are bound to cache like
+        methods registered by applications."""
+
+        for register, method in (
+            (Cache.register_get_method, self.get),
+            (Cache.register_set_method, self.set),
+            (Cache.register_update_method, self.set),
+            (Cache.register_delete_method, self.delete),
+            (Cache.register_get_many_method, self.get_many),
+            (Cache.register_set_many_method, self.set_many),
+            (Cache.register_update_many_method, self.set_many),
+            (Cache.register_delete_many_method, self.delete_many),
+        ):
+            register(as_function(method))
+
+
+def as_function(method: typing.Callable) -> typing.Callable:
+    def function(cache, *args, **kwargs):
+        return method(cache, *args, **kwargs)
+
+    return function
+
+
+class LatencyBackend(MemoryBackend):
+    """MemoryBackend waiting given seconds on every call like network storage."""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def wait(self):
+        super().wait()
+        time.sleep(self.latency)
+
+
+def create_value(i: int) -> collections.UserDict:
+    return collections.UserDict(
+        {"_id": f"{i:08d}", "color": f"color{i % COLORS}", "price": i % 1000}
+    )
+
+
+def declare_indexes(cache_name: str):
+    type(
+        "BenchIndexByColor",
+        (Index,),
+        {"keys": ["_id", "color"], "cache_name": cache_name},
+    )
+    type(
+        "BenchIndexByPrice",
+        (SortedIndex,),
+        {"keys": ["price", "_id"], "cache_name": cache_name},
+    )
+
+
+def measure(function, repeat: int = 5) -> dict:
+    """Runs function several times.
+
+    :return: dict with median, min and max seconds.
+    """
+
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return {
+        "median": statistics.median(timings),
+        "min": min(timings),
+        "max": max(timings),
+    }
+
+
+def bench_crud(backend, cache_name: str, size: int, operations: int) -> list:
+    cache = Cache()
+    values = {f"{i:08d}": create_value(i) for i in range(size)}
+    keys = list(values)[:operations]
+    results = []
+
+    def set_values():
+        for key in keys:
+            cache.set(cache_name, key, values[key])
+
+    def get_values():
+        for key in keys:
+            cache.get(cache_name, key)
+
+    def update_values():
+        for key in keys:
+            value = cache.get(cache_name, key)
+            value["color"] = "updated" if value["color"] != "updated" else "color0"
+            cache.update(cache_name, key, value)
+
+    def delete_values():
+        for key in keys:
+            cache.delete(cache_name, key)
+
+    cache.set_many(cache_name, values)
+    for name, function in (
+        ("delete", delete_values),
+        ("set", set_values),
+        ("get", get_values),
+        ("update", update_values),
+    ):
+        timing = measure(function, repeat=1)
+        timing["ops_per_second"] = len(keys) / timing["median"]
+        results.append({"name": name, "size": size, **timing})
+    return results
+
+
+def bench_search(cache_name: str, size: int) -> list:
+    cache = Cache()
+    queries = {
+        "equal": {"color": "color1"},
+        "range": {"price": {"$lt": 10}},
+        "equal+range": {"color": "color1", "price": {"$gte": 500}},
+        "range+limit": ({"price": {"$gte": 100}}, "price", 10),
+        "unindexed": {"missing": None},
+    }
+    results = []
+    for name, query in queries.items():
+        sort = limit = None
+        if isinstance(query, tuple):
+            query, sort, limit = query
+        rows = len(cache.search(cache_name, query, sort=sort, limit=limit))
+        timing = measure(
+            lambda: cache.search(cache_name, query, sort=sort, limit=limit)
+        )
+        results.append(
+            {
+                "name": f"search[{name}]",
+                "size": size,
+                "selectivity": rows / size,
+                **timing,
+            }
+        )
+    results.append(
+        {"name": "all", "size": size, **measure(lambda: cache.all(cache_name))}
+    )
+    return results
+
+
+def bench_pipeline(backend, middlewares=(0, 1, 5, 10), number=20000) -> list:
+    class PipelineBenchCache(Cache):
+        pass
+
+    def noop(ctx):
+        pass
+
+    cache = PipelineBenchCache()
+    backend.storage["pipeline"]["key"] = create_value(0)
+    results, registered = [], 0
+    for count in middlewares:
+        while registered < count:
+            PipelineBenchCache.PIPELINE.get.before()(noop)
+            registered += 1
+
+        def get_values():
+            for _ in range(number):
+                cache.get("pipeline", "key")
+
+        timing = measure(get_values, repeat=3)
+        timing = {key: value / number for key, value in timing.items()}
+        results.append({"name": "pipeline", "middlewares": count, **timing})
+    return results
+
+
+def bench_memory(cache_name: str, size: int) -> dict:
+    """Measures memory allocated by storing values with their index entries."""
+
+    cache = Cache()
+    values = {f"{i:08d}": create_value(i) for i in range(size)}
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        cache.set_many(cache_name, values)
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return {"name": "memory", "size": size, "bytes_per_value": used / size}
+
+
+def run(sizes, latency: float, latency_size: int, operations: int) -> dict:
+    results = []
+    backends = [("memory", MemoryBackend(), sizes)]
+    if latency:
+        backends.append(("latency", LatencyBackend(latency), [latency_size]))
+    for backend_name, backend, backend_sizes in backends:
+        backend.register()
+        for size in backend_sizes:
+            cache_name = f"bench_{backend_name}_{size}"
+            declare_indexes(cache_name)
+            for result in bench_crud(backend, cache_name, size, operations):
+                results.append({"backend": backend_name, **result})
+            for result in bench_search(cache_name, size):
+                results.append({"backend": backend_name, **result})
+        if backend_name == "memory":
+            for result in bench_pipeline(backend):
+                results.append({"backend": backend_name, **result})
+            cache_name = f"bench_{backend_name}_memory"
+            declare_indexes(cache_name)
+            results.append(
+                {"backend": backend_name, **bench_memory(cache_name, sizes[-1])}
+            )
+    return {"meta": get_meta(latency), "results": results}
+
+
+def get_meta(latency: float) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "commit": commit or None,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "latency": latency,
+    }
+
+
+def get_key(result: dict) -> tuple:
+    return tuple(
+        (key, value)
+        for key, value in sorted(result.items())
+        if key in ("backend", "name", "size", "middlewares")
+    )
+
+
+def get_value(result: dict) -> float:
+    return result.get("bytes_per_value", result.get("median"))
+
+
+def compare(current: dict, baseline: dict) -> list:
+    """Pairs results with the same scenario of baseline run.
+
+    :return: list of (result key, baseline value, current value, ratio).
+    """
+
+    baseline_results = {get_key(result): result for result in baseline["results"]}
+    changes = []
+    for result in current["results"]:
+        previous = baseline_results.get(get_key(result))
+        if previous is None:
+            continue
+        ratio = get_value(result) / get_value(previous)
+        changes.append((get_key(result), get_value(previous), get_value(result), ratio))
+    return changes
+
+
+def format_key(key: tuple) -> str:
+    return " ".join(f"{name}={value}" for name, value in key)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--operations", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0002)
+    parser.add_argument("--latency-size", type=int, default=1000)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", help="baseline results file")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.latency, args.latency_size, args.operations)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    for result in results["results"]:
+        print(f"{format_key(get_key(result)):<60}{get_value(result):>14.6g}")
+    if args.compare is None:
+        return 0
+
+    with open(args.compare) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = 0
+    print(
+        f"\nCompared with {args.compare} (ratio > {1 + args.threshold} is regression)"
+    )
+    for key, previous, current, ratio in compare(results, baseline):
+        regression = ratio > 1 + args.threshold
+        regressions += regression
+        mark = "REGRESSION" if regression else ""
+        print(
+            f"{format_key(key):<60}{previous:>12.6g}{current:>12.6g}{ratio:>8.2f} {mark}"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,967 @@
+import asyncio
+import collections
+import functools
+import inspect
+import itertools
+import random
+import typing
+
+from ihashmap.batch import Batch
+from ihashmap.cache import Cache, Pipeline, PipelineContext, PipelineManager
+from ihashmap.concurrency import IndexConflictError, Versioned, get_version
+from ihashmap.index import Index, IndexContainer, PkIndex, add_snapshot, add_snapshots
+from ihashmap.planner import QueryPlan
+from ihashmap.tracking import get_original
+
+
+class AsyncPipeline(Pipeline):
+    """Pipeline for coroutine main functions.
+
+    Actions can be both regular and coroutine functions.
+    """
+
+    async def wrap_action(self, ctx: PipelineContext):
+        metrics = self.METRICS
+        if metrics is not None:
+            return await self.wrap_measured(ctx, metrics)
+        before, after = self.compile(ctx.name)
+        for action in before:
+            result = action(ctx)
+            if inspect.isawaitable(result):
+                await result
+        ctx.result = await ctx.f(ctx.cls_or_self, ctx.name, *ctx.args, **ctx.kwargs)
+        for action in after:
+            result = action(ctx)
+            if inspect.isawaitable(result):
+                await result
+        return ctx.result
+
+    async def wrap_measured(self, ctx: PipelineContext, metrics):
+        """Version of wrap_action recording latencies. See Pipeline.wrap_measured."""
+
+        started = metrics.clock()
+        before, after = self.compile(ctx.name)
+        for action in before:
+            await self._measure_action(ctx, metrics, action)
+        called = metrics.clock()
+        ctx.result = await ctx.f(ctx.cls_or_self, ctx.name, *ctx.args, **ctx.kwargs)
+        metrics.observe_backend(self.name, ctx, metrics.clock() - called)
+        for action in after:
+            await self._measure_action(ctx, metrics, action)
+        metrics.observe_pipeline(self.name, metrics.clock() - started)
+        return ctx.result
+
+    async def _measure_action(self, ctx: PipelineContext, metrics, action):
+        started = metrics.clock()
+        result = action(ctx)
+        if inspect.isawaitable(result):
+            await result
+        metrics.observe_action(self.name, action, metrics.clock() - started)
+
+    def __call__(self, f: typing.Callable) -> typing.Callable:
+        """Wrapper around main coroutine function.
+        Executes actions before and after main function execution.
+
+        :param f: main coroutine function.
+        :return: wrapped coroutine function.
+        """
+
+        @functools.wraps(f)
+        async def wrap(cls_or_self, name, *args, **kwargs):
+            ctx = PipelineContext(f, cls_or_self, name, *args, **kwargs)
+            return await self.resolve(cls_or_self).wrap_action(ctx)
+
+        return wrap
+
+
+class AsyncPipelineManager(PipelineManager):
+    """Manager of AsyncPipeline pipes."""
+
+    PIPELINE_CLASS = AsyncPipeline
+
+
+async def _placeholder(*args, **kwargs):
+    return None
+
+
+class AsyncCache(Cache):
+    """asyncio version of Cache.
+
+    All registered METHODS must be coroutine functions with signatures
+    matching Cache ones. Same Index subclasses are used: indexes are
+    maintained by async pipeline actions using Index.get_changes
+    and stored using registered METHODS.
+    Custom Index hooks such as after_create are not executed.
+    """
+
+    PIPELINE = AsyncPipelineManager()
+
+    GET_METHOD = _placeholder
+    SET_METHOD = _placeholder
+    UPDATE_METHOD = _placeholder
+    DELETE_METHOD = _placeholder
+    """METHODS placeholders. You should register yours."""
+
+    INDEX_ADD_METHOD = None
+    INDEX_REMOVE_METHOD = None
+    GET_MANY_METHOD = None
+    SET_MANY_METHOD = None
+    UPDATE_MANY_METHOD = None
+    DELETE_MANY_METHOD = None
+    COMPARE_AND_SET_METHOD = None
+    """Optional METHODS. See Cache."""
+
+    INDEX_LOCKS = None
+    """Optional locks serializing index rewrites of coroutines.
+    See ihashmap.concurrency.AsyncStripedLock."""
+
+    CONCURRENCY = 100
+    """Maximum number of concurrent METHODS calls made by single operation."""
+
+    async def set(self, name: str, key: str, value: typing.Mapping):
+        """See Cache.set."""
+
+        batch = self._get_batch()
+        if batch is not None:
+            return batch.set(name, key, value)
+        return await self._set(name, key, value)
+
+    async def get(
+        self, name: str, key: str, default: typing.Optional[typing.Any] = None
+    ):
+        """See Cache.get."""
+
+        batch = self._get_batch()
+        if batch is not None and (name, key) in batch:
+            return batch.get(name, key, default)
+        return await self._get(name, key, default)
+
+    async def update(self, name: str, key: str, value: typing.Mapping):
+        """See Cache.update."""
+
+        batch = self._get_batch()
+        if batch is not None:
+            return batch.update(name, key, value)
+        return await self._update(name, key, value)
+
+    async def delete(self, name: str, key: str):
+        """See Cache.delete."""
+
+        batch = self._get_batch()
+        if batch is not None:
+            return batch.delete(name, key)
+        return await self._delete(name, key)
+
+    async def set_many(self, name: str, values: typing.Mapping[str, typing.Mapping]):
+        """See Cache.set_many."""
+
+        batch = self._get_batch()
+        if batch is not None:
+            return batch.set_many(name, values)
+        return await self._set_many(name, values)
+
+    async def get_many(
+        self,
+        name: str,
+        keys: typing.Iterable[str],
+        default: typing.Optional[typing.Any] = None,
+    ) -> typing.List:
+        """See Cache.get_many."""
+
+        batch = self._get_batch()
+        if batch is None:
+            return await self._get_many(name, keys, default)
+        keys = list(keys)
+        missing = [key for key in keys if (name, key) not in batch]
+        found = {}
+        if missing:
+            found = dict(zip(missing, await self._get_many(name, missing, default)))
+        return [
+            found[key] if key in found else batch.get(name, key, default)
+            for key in keys
+        ]
+
+    async def update_many(self, name: str, values: typing.Mapping[str, typing.Mapping]):
+        """See Cache.update_many."""
+
+        batch = self._get_batch()
+        if batch is not None:
+            return batch.update_many(name, values)
+        return await self._update_many(name, values)
+
+    async def delete_many(self, name: str, keys: typing.Iterable[str]):
+        """See Cache.delete_many."""
+
+        batch = self._get_batch()
+        if batch is not None:
+            return batch.delete_many(name, keys)
+        return await self._delete_many(name, keys)
+
+    def batch(self) -> "AsyncBatchContext":
+        """Buffers writes made through this cache instance until block exits.
+
+        Async version of Cache.batch. Values are written with *_many METHODS
+        and index changes of all values are merged and written once per index.
+        Batch is bound to cache instance, so concurrent tasks must use
+        separate instances.
+
+        Example:
+            async with cache.batch():
+                await cache.set("my_cache", "1", value)
+                await cache.update("my_cache", "2", other_value)
+        """
+
+        return AsyncBatchContext(self)
+
+    async def gather(self, coroutines: typing.Iterable[typing.Awaitable]) -> list:
+        """Awaits coroutines concurrently keeping at most CONCURRENCY running.
+
+        :param coroutines: coroutines to await.
+        :return: list of results in coroutines order.
+        """
+
+        semaphore = asyncio.Semaphore(self.CONCURRENCY)
+
+        async def run(coroutine):
+            async with semaphore:
+                return await coroutine
+
+        return list(await asyncio.gather(*(run(coroutine) for coroutine in coroutines)))
+
+    async def all(self, name: str):
+        """Finds all values in cache fetching them concurrently through get_many pipeline."""
+
+        index_data = await index_get(self, PkIndex, name)
+        return await self._get_many(name, list(index_data))
+
+    async def iter_all(
+        self, name: str, chunk_size: typing.Optional[int] = None
+    ) -> typing.AsyncIterator[typing.Mapping]:
+        """Iterates over all values in cache fetching them in chunks.
+
+        See Cache.iter_all.
+        """
+
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        index_data = await index_get(self, PkIndex, name)
+        for start in range(0, len(index_data), chunk_size):
+            stop = start + chunk_size
+            for value in await self._get_many(name, list(index_data[start:stop])):
+                if value is not None:
+                    yield value
+
+    async def explain(
+        self,
+        name: str,
+        search_query: typing.Mapping,
+        sort: typing.Optional[str] = None,
+        limit: typing.Optional[int] = None,
+        projection: typing.Optional[typing.Sequence[str]] = None,
+    ) -> dict:
+        """Describes how search query would be executed. See Cache.explain."""
+
+        plan = await self._plan(name, search_query, sort, limit, projection)
+        return plan.explain()
+
+    async def search(
+        self,
+        name: str,
+        search_query: typing.Mapping,
+        sort: typing.Optional[str] = None,
+        limit: typing.Optional[int] = None,
+        projection: typing.Optional[typing.Sequence[str]] = None,
+    ) -> typing.List[typing.Mapping]:
+        """Searches cache for required values based on search query.
+
+        Values of every chunk are fetched concurrently. See Cache.search.
+        """
+
+        plan = await self._plan(name, search_query, sort, limit, projection)
+        metrics = self.METRICS
+        if metrics is None:
+            return await plan.execute(self, self.CHUNK_SIZE)
+        started = metrics.clock()
+        result = await plan.execute(self, self.CHUNK_SIZE)
+        metrics.observe_search(plan, len(result), metrics.clock() - started)
+        return result
+
+    async def iter_search(
+        self,
+        name: str,
+        search_query: typing.Mapping,
+        sort: typing.Optional[str] = None,
+        limit: typing.Optional[int] = None,
+        projection: typing.Optional[typing.Sequence[str]] = None,
+        chunk_size: typing.Optional[int] = None,
+    ) -> typing.AsyncIterator[typing.Mapping]:
+        """Lazy version of AsyncCache.search. See Cache.iter_search."""
+
+        plan = await self._plan(name, search_query, sort, limit, projection)
+        async for value in plan.iterate(self, chunk_size or self.CHUNK_SIZE):
+            yield value
+
+    async def _plan(self, name, search_query, sort, limit, projection):
+        await load_build_states(self, name)
+        await load_stats(self, name)
+        return AsyncQueryPlan(
+            name, search_query, sort=sort, limit=limit, projection=projection
+        )
+
+    @PIPELINE.get
+    async def _get(
+        self, name: str, key: str, default: typing.Optional[typing.Any] = None
+    ):
+        """Internal method. PLEASE DONT CHANGE!"""
+
+        return await self.GET_METHOD(name, key, default)
+
+    @PIPELINE.get_many
+    async def _get_many(self, name, keys, default=None):
+        """Internal method. PLEASE DONT CHANGE!"""
+
+        if self.GET_MANY_METHOD is None:
+            return await self.gather(
+                self.GET_METHOD(name, key, default) for key in keys
+            )
+        return await self.GET_MANY_METHOD(name, keys, default)
+
+    @PIPELINE.set
+    async def _set(self, name, key, value):
+        """Internal method. PLEASE DONT CHANGE!"""
+
+        return await self.SET_METHOD(name, key, value)
+
+    @PIPELINE.update
+    async def _update(self, name, key, value):
+        """Internal method. PLEASE DONT CHANGE!"""
+
+        return await self.UPDATE_METHOD(name, key, value)
+
+    @PIPELINE.delete
+    async def _delete(self, name, key):
+        """Internal method. PLEASE DONT CHANGE!"""
+
+        return await self.DELETE_METHOD(name, key)
+
+    @PIPELINE.set_many
+    async def _set_many(self, name, values):
+        """Internal method. PLEASE DONT CHANGE!"""
+
+        if self.SET_MANY_METHOD is None:
+            return await self.gather(
+                self.SET_METHOD(name, key, value) for key, value in values.items()
+            )
+        return await self.SET_MANY_METHOD(name, values)
+
+    @PIPELINE.update_many
+    async def _update_many(self, name, values):
+        """Internal method. PLEASE DONT CHANGE!"""
+
+        if self.UPDATE_MANY_METHOD is None:
+            return await self.gather(
+                self.UPDATE_METHOD(name, key, value) for key, value in values.items()
+            )
+        return await self.UPDATE_MANY_METHOD(name, values)
+
+    @PIPELINE.delete_many
+    async def _delete_many(self, name, keys):
+        """Internal method. PLEASE DONT CHANGE!"""
+
+        if self.DELETE_MANY_METHOD is None:
+            return await self.gather(self.DELETE_METHOD(name, key) for key in keys)
+        return await self.DELETE_MANY_METHOD(name, keys)
+
+
+class AsyncBatch(Batch):
+    """Unit of work buffering AsyncCache writes. See Batch."""
+
+    async def flush(self):
+        """Writes buffered values and merged index changes."""
+
+        self.started = self.flushing = True
+        try:
+            for name, (sets, updates, deletes) in self.group_operations().items():
+                if sets:
+                    await self.cache._set_many(name, sets)
+                if updates:
+                    await self.cache._update_many(name, updates)
+                if deletes:
+                    await self.cache._delete_many(name, deletes)
+                await self.write_index_changes()
+        except BaseException:
+            await self.write_index_changes()
+            raise
+        finally:
+            self.flushing = False
+        self.clear()
+
+    async def write_index_changes(self):
+        """Writes and forgets merged index changes of flushed writes concurrently."""
+
+        changes, self.index_changes = self.index_changes, collections.OrderedDict()
+        await asyncio.gather(
+            *(
+                write_changes(self.cache, index, cache_name, index_changes, batch=True)
+                for (index, cache_name), index_changes in changes.items()
+            )
+        )
+
+
+class AsyncBatchContext:
+    """Asynchronous context manager of AsyncCache.batch block.
+
+    Nested blocks join outer batch.
+    """
+
+    def __init__(self, cache: AsyncCache):
+        self.cache = cache
+        self.batch = None
+
+    async def __aenter__(self) -> AsyncBatch:
+        if self.cache._batch is not None:
+            return self.cache._batch
+        self.batch = self.cache._batch = AsyncBatch(self.cache)
+        return self.batch
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        batch = self.batch
+        if batch is None:
+            return
+        try:
+            if exc_type is None:
+                await batch.flush()
+            else:
+                batch.rollback()
+        except BaseException:
+            batch.rollback()
+            raise
+        finally:
+            self.cache._batch = None
+
+
+class AsyncQueryPlan(QueryPlan):
+    """QueryPlan executed by AsyncCache.
+
+    Index statistics must be loaded with load_stats before plan creation.
+    """
+
+    def get_indexes(self) -> typing.List[typing.Type[Index]]:
+        """Finds indexes usable by search using states loaded by load_build_states."""
+
+        return [
+            index
+            for index in Index.find_index_for_cache(self.cache_name)
+            if index is PkIndex or index.is_ready(self.cache_name, read=False)
+        ]
+
+    async def find_values(self, cache) -> typing.List[dict]:
+        """Finds driving index values matching all chosen index scans.
+
+        Filtering indexes are read concurrently.
+        """
+
+        driver, filters = self.scans[0], self.scans[1:]
+        primary_keys = None
+        found = await asyncio.gather(
+            *(find(cache, scan.index, self.cache_name, scan.query) for scan in filters)
+        )
+        for scan, values in zip(filters, found):
+            keys = {value[cache.PRIMARY_KEY] for value in values}
+            self.matched[scan.index.__name__] = len(keys)
+            primary_keys = keys if primary_keys is None else primary_keys & keys
+        if primary_keys is not None and not primary_keys:
+            return []
+        push_limit = self.in_order and not filters and not self.rest_query
+        matched = await find(
+            cache,
+            driver.index,
+            self.cache_name,
+            driver.query,
+            reverse=self.reverse and self.in_order,
+            limit=self.limit if push_limit else None,
+        )
+        self.matched[driver.index.__name__] = len(matched)
+        return [
+            value
+            for value in matched
+            if primary_keys is None or value[cache.PRIMARY_KEY] in primary_keys
+        ]
+
+    async def iterate(
+        self, cache, chunk_size: int
+    ) -> typing.AsyncIterator[typing.Mapping]:
+        """Executes plan lazily fetching entities in chunks. See QueryPlan.iterate."""
+
+        if not self.in_order:
+            result = self.sort_values(
+                [value async for value in self._iterate_values(cache, chunk_size)]
+            )
+            for value in result[: self.limit]:
+                yield self._project_value(value)
+            return
+        async for value in self._iterate_values(cache, chunk_size):
+            yield self._project_value(value)
+
+    async def execute(self, cache, chunk_size: int) -> typing.List[typing.Mapping]:
+        return [value async for value in self.iterate(cache, chunk_size)]
+
+    async def _iterate_values(
+        self, cache, chunk_size: int
+    ) -> typing.AsyncIterator[typing.Mapping]:
+        values = iter(await self.find_values(cache))
+        limit = self.limit if self.in_order else None
+        if self.covers_projection:
+            for value in itertools.islice(values, limit):
+                yield value
+            return
+        found = 0
+        while limit is None or found < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - found)
+            chunk = [
+                value[cache.PRIMARY_KEY] for value in itertools.islice(values, size)
+            ]
+            if not chunk:
+                return
+            self.fetched += len(chunk)
+            for entity in await cache._get_many(self.cache_name, chunk):
+                if entity is None or not cache._match_query(entity, self.rest_query):
+                    continue
+                yield entity
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+
+
+async def index_get(
+    cache, index: typing.Type[Index], cache_name: str, bucket=None, shard=None
+):
+    """Async version of Index.get. Shards of sharded index are read concurrently."""
+
+    index.count_operation("index_reads_total")
+    if index.is_sharded(bucket, shard):
+        keys = [
+            index.get_name(cache_name, shard=shard) for shard in range(index.shards)
+        ]
+        stored = await _read_index_keys(cache, index, keys)
+        return index.merge_shards(index.load_entries(data) for data in stored)
+    stored = await cache.GET_METHOD(
+        index.INDEX_CACHE_NAME,
+        index.get_name(cache_name, bucket, shard),
+        IndexContainer(),
+    )
+    return index.load_entries(stored, bucket=bucket)
+
+
+async def index_get_many(
+    cache, index: typing.Type[Index], cache_name: str, buckets: typing.List[str]
+) -> typing.List:
+    """Async version of Index.get_many."""
+
+    index.count_operation("index_reads_total")
+    keys = [index.get_name(cache_name, bucket) for bucket in buckets]
+    stored = await _read_index_keys(cache, index, keys)
+    return [
+        index.load_entries(data, bucket=bucket) for bucket, data in zip(buckets, stored)
+    ]
+
+
+async def _read_index_keys(cache, index: typing.Type[Index], keys: typing.List[str]):
+    if cache.GET_MANY_METHOD is None:
+        return await cache.gather(
+            cache.GET_METHOD(index.INDEX_CACHE_NAME, key, IndexContainer())
+            for key in keys
+        )
+    return await cache.GET_MANY_METHOD(index.INDEX_CACHE_NAME, keys, IndexContainer())
+
+
+async def index_set(
+    cache,
+    index: typing.Type[Index],
+    cache_name: str,
+    index_data,
+    bucket=None,
+    shard=None,
+):
+    """Async version of Index.set. Shards of sharded index are written concurrently."""
+
+    if index.is_sharded(bucket, shard):
+        shards = index.split_shards(index_data)
+        return await cache.gather(
+            index_set(
+                cache,
+                index,
+                cache_name,
+                IndexContainer(shards.get(shard, [])),
+                shard=shard,
+            )
+            for shard in range(index.shards)
+        )
+    index.count_operation("index_writes_total")
+    return await cache.SET_METHOD(
+        index.INDEX_CACHE_NAME,
+        index.get_name(cache_name, bucket, shard),
+        index.dump_entries(index_data, bucket=bucket),
+    )
+
+
+async def index_add(
+    cache, index: typing.Type[Index], cache_name: str, entry, bucket=None, shard=None
+):
+    """Async version of Index.add."""
+
+    if index.is_sharded(bucket, shard):
+        shard = index.get_shard(entry)
+    key = index.get_name(cache_name, bucket, shard)
+    if cache.INDEX_ADD_METHOD is not None and not index.is_packed(bucket):
+        index.count_operation("index_writes_total")
+        return await cache.INDEX_ADD_METHOD(index.INDEX_CACHE_NAME, key, entry)
+    return await modify(
+        cache,
+        index,
+        cache_name,
+        lambda index_data: index.merge_entries(index_data, added=[entry]),
+        bucket=bucket,
+        shard=shard,
+    )
+
+
+async def index_remove(
+    cache, index: typing.Type[Index], cache_name: str, entry, bucket=None, shard=None
+):
+    """Async version of Index.remove."""
+
+    if index.is_sharded(bucket, shard):
+        shard = index.get_shard(entry)
+    key = index.get_name(cache_name, bucket, shard)
+    if cache.INDEX_REMOVE_METHOD is not None and not index.is_packed(bucket):
+        index.count_operation("index_writes_total")
+        return await cache.INDEX_REMOVE_METHOD(index.INDEX_CACHE_NAME, key, entry)
+    return await modify(
+        cache,
+        index,
+        cache_name,
+        lambda index_data: index.merge_entries(index_data, removed=[entry]),
+        bucket=bucket,
+        shard=shard,
+    )
+
+
+async def apply_changes(
+    cache,
+    index: typing.Type[Index],
+    cache_name: str,
+    added: typing.Iterable = (),
+    removed: typing.Iterable = (),
+    bucket=None,
+    shard=None,
+) -> IndexContainer:
+    """Async version of Index.apply_changes."""
+
+    added, removed = list(added), list(removed)
+    return await modify(
+        cache,
+        index,
+        cache_name,
+        lambda index_data: index.merge_entries(index_data, added, removed),
+        bucket=bucket,
+        shard=shard,
+    )
+
+
+async def modify(
+    cache,
+    index: typing.Type[Index],
+    cache_name: str,
+    function: typing.Callable[[typing.Sequence], typing.Tuple[typing.Sequence, bool]],
+    bucket=None,
+    shard=None,
+) -> typing.Sequence:
+    """Async version of Index.modify.
+
+    Rewrites of the same index key are serialized by AsyncCache.INDEX_LOCKS
+    and retried by AsyncCache.COMPARE_AND_SET_METHOD if registered.
+    """
+
+    locks = cache.INDEX_LOCKS
+    if locks is None:
+        return await _modify(cache, index, cache_name, function, bucket, shard)
+    async with locks.get(index.get_name(cache_name, bucket, shard)):
+        return await _modify(cache, index, cache_name, function, bucket, shard)
+
+
+async def _modify(cache, index, cache_name, function, bucket, shard):
+    if cache.COMPARE_AND_SET_METHOD is None:
+        index_data, changed = function(
+            await index_get(cache, index, cache_name, bucket, shard)
+        )
+        if changed:
+            await index_set(cache, index, cache_name, index_data, bucket, shard)
+        return index_data
+
+    name = index.get_name(cache_name, bucket, shard)
+    for attempt in range(index.CAS_RETRIES):
+        if attempt:
+            index.count_operation("index_conflicts_total")
+            await asyncio.sleep(
+                random.uniform(0, index.CAS_BACKOFF * 2 ** (attempt - 1))
+            )
+        index.count_operation("index_reads_total")
+        stored = await cache.GET_METHOD(index.INDEX_CACHE_NAME, name, None)
+        index_data, changed = function(
+            index.load_entries(
+                IndexContainer() if stored is None else stored, bucket=bucket
+            )
+        )
+        if not changed:
+            return index_data
+        index.count_operation("index_writes_total")
+        if await cache.COMPARE_AND_SET_METHOD(
+            index.INDEX_CACHE_NAME,
+            name,
+            stored,
+            Versioned(get_version(stored) + 1, index.dump_entries(index_data, bucket)),
+        ):
+            return index_data
+    raise IndexConflictError(
+        f"{name} was changed concurrently on {index.CAS_RETRIES} attempts"
+    )
+
+
+async def write_changes(
+    cache, index: typing.Type[Index], cache_name: str, changes: dict, batch=False
+):
+    """Async version of Index.write_changes."""
+
+    buckets_added, buckets_removed = [], []
+    for bucket, (added, removed) in changes.items():
+        is_empty = await _write_entries(
+            cache, index, cache_name, added, removed, bucket, batch
+        )
+        index._update_stats(cache_name, bucket, added, removed)
+        if bucket is None:
+            continue
+        if added:
+            buckets_added.append(bucket)
+        elif is_empty:
+            buckets_removed.append(bucket)
+    if buckets_added or buckets_removed:
+        await write_changes(
+            cache, index, cache_name, {None: (buckets_added, buckets_removed)}, batch
+        )
+
+
+async def _write_entries(
+    cache, index, cache_name, added, removed, bucket, batch, shard=None
+):
+    if index.is_sharded(bucket, shard):
+        await asyncio.gather(
+            *(
+                _write_entries(
+                    cache, index, cache_name, *changes, bucket, batch, shard=shard
+                )
+                for shard, changes in index.split_changes(added, removed).items()
+            )
+        )
+        return False
+    if batch:
+        index_data = await apply_changes(
+            cache, index, cache_name, added, removed, bucket=bucket, shard=shard
+        )
+    else:
+        for entry in removed:
+            await index_remove(cache, index, cache_name, entry, bucket, shard)
+        for entry in added:
+            await index_add(cache, index, cache_name, entry, bucket, shard)
+        if bucket is None or added:
+            return False
+        index_data = await index_get(cache, index, cache_name, bucket)
+    return not index_data
+
+
+async def find(
+    cache,
+    index: typing.Type[Index],
+    cache_name: str,
+    query: typing.Mapping,
+    reverse: bool = False,
+    limit: typing.Optional[int] = None,
+) -> typing.List[dict]:
+    """Async version of Index.find."""
+
+    if not index.bucketed:
+        index_data = await index_get(cache, index, cache_name)
+        return index.match(query, index_data, reverse=reverse, limit=limit)
+    buckets = index.get_query_buckets(query)
+    if buckets is None:
+        buckets = index.filter_buckets(query, await index_get(cache, index, cache_name))
+    buckets_data = await index_get_many(cache, index, cache_name, buckets)
+    return index.match_buckets(
+        query, buckets, buckets_data, reverse=reverse, limit=limit
+    )
+
+
+async def load_build_states(cache, cache_name: str):
+    """Loads build states of cache indexes which are not known to be ready."""
+
+    indexes = [
+        index
+        for index in Index.find_index_for_cache(cache_name)
+        if index is not PkIndex and not index.is_ready(cache_name, read=False)
+    ]
+    states = await cache.gather(
+        cache.GET_METHOD(index.INDEX_CACHE_NAME, index.get_build_name(cache_name))
+        for index in indexes
+    )
+    for index, state in zip(indexes, states):
+        index.set_build_state(cache_name, state)
+
+
+async def load_stats(cache, cache_name: str):
+    """Loads statistics of cache indexes used by query planner."""
+
+    for index in Index.find_index_for_cache(cache_name):
+        if index.has_stats(cache_name):
+            continue
+        index_data = await index_get(cache, index, cache_name)
+        buckets_data = None
+        if index.bucketed:
+            index_data = list(index_data)
+            buckets_data = await index_get_many(cache, index, cache_name, index_data)
+        index.set_stats(cache_name, index.create_stats(index_data, buckets_data))
+
+
+async def write_indexes(
+    ctx: PipelineContext,
+    values: typing.List,
+    batch=False,
+    indexes: typing.Optional[typing.List[typing.Type[Index]]] = None,
+):
+    """Writes changes of cache indexes concurrently.
+
+    :param ctx: pipeline context.
+    :param values: list of (old_value, new_value) pairs.
+    :param bool batch: write changes using single read and write per index.
+                       Changes made while AsyncCache.batch is flushed are merged
+                       into it and written after all values are written.
+    :param indexes: indexes to write, all cache indexes by default.
+    """
+
+    cache = ctx.cls_or_self
+    if indexes is None:
+        indexes = Index.find_index_for_cache(ctx.name)
+    unit_of_work = cache._batch
+    if unit_of_work is not None and unit_of_work.flushing:
+        for index in indexes:
+            unit_of_work.add_index_changes(index, ctx.name, index.merge_changes(values))
+        return
+    await asyncio.gather(
+        *(
+            write_changes(cache, index, ctx.name, index.merge_changes(values), batch)
+            for index in indexes
+        )
+    )
+
+
+AsyncCache.PIPELINE.get.after(priority=2)(add_snapshot)
+AsyncCache.PIPELINE.set.after(priority=2)(add_snapshot)
+AsyncCache.PIPELINE.update.after(priority=2)(add_snapshot)
+AsyncCache.PIPELINE.get_many.after(priority=2)(add_snapshots)
+AsyncCache.PIPELINE.set_many.after(priority=2)(add_snapshots)
+AsyncCache.PIPELINE.update_many.after(priority=2)(add_snapshots)
+
+
+@AsyncCache.PIPELINE.set.before()
+def store_original_value(ctx: PipelineContext):
+    key, value = ctx.args
+    ctx.local_data["original_value"] = value
+
+
+@AsyncCache.PIPELINE.set_many.before()
+def store_original_values(ctx: PipelineContext):
+    (values,) = ctx.args
+    ctx.local_data["original_values"] = values
+
+
+@AsyncCache.PIPELINE.update.before()
+async def get_previous_value(ctx: PipelineContext):
+    """Async version of Index.before_update."""
+
+    key, value = ctx.args
+    previous = get_original(value)
+    if previous is None:
+        previous = await ctx.cls_or_self._get(ctx.name, key)
+    ctx.local_data["original_value"] = value
+    ctx.local_data["previous_value"] = previous
+    ctx.local_data["changed_keys"] = Index.get_changed_keys(ctx.name, previous, value)
+
+
+@AsyncCache.PIPELINE.update_many.before()
+async def get_previous_values(ctx: PipelineContext):
+    """Async version of Index.before_update_many."""
+
+    (values,) = ctx.args
+    previous = {key: get_original(value) for key, value in values.items()}
+    missing = [key for key, value in previous.items() if value is None]
+    if missing:
+        fetched = await ctx.cls_or_self._get_many(ctx.name, missing)
+        previous.update(zip(missing, fetched))
+    ctx.local_data["original_values"] = values
+    ctx.local_data["previous_values"] = previous
+
+
+@AsyncCache.PIPELINE.delete.before()
+async def get_deleted_value(ctx: PipelineContext):
+    (key,) = ctx.args
+    value = await ctx.cls_or_self._get(ctx.name, key)
+    ctx.local_data["original_value"] = value
+
+
+@AsyncCache.PIPELINE.delete_many.before()
+async def get_deleted_values(ctx: PipelineContext):
+    keys = list(ctx.args[0])
+    values = await ctx.cls_or_self._get_many(ctx.name, keys)
+    ctx.local_data["original_values"] = dict(zip(keys, values))
+
+
+@AsyncCache.PIPELINE.set.after()
+async def create_indexes(ctx: PipelineContext):
+    await write_indexes(ctx, [(None, ctx.local_data["original_value"])])
+
+
+@AsyncCache.PIPELINE.update.after()
+async def update_indexes(ctx: PipelineContext):
+    indexes = [
+        index
+        for index in Index.find_index_for_cache(ctx.name)
+        if not index.is_unchanged(ctx.local_data["changed_keys"])
+    ]
+    value = (ctx.local_data["previous_value"], ctx.local_data["original_value"])
+    await write_indexes(ctx, [value], indexes=indexes)
+
+
+@AsyncCache.PIPELINE.delete.after()
+async def delete_indexes(ctx: PipelineContext):
+    value = ctx.local_data["original_value"]
+    if value is not None:
+        await write_indexes(ctx, [(value, None)])
+
+
+@AsyncCache.PIPELINE.set_many.after()
+async def create_indexes_many(ctx: PipelineContext):
+    values = ctx.local_data["original_values"].values()
+    await write_indexes(ctx, [(None, value) for value in values], batch=True)
+
+
+@AsyncCache.PIPELINE.update_many.after()
+async def update_indexes_many(ctx: PipelineContext):
+    previous = ctx.local_data["previous_values"]
+    values = ctx.local_data["original_values"].items()
+    changes = [(previous[key], value) for key, value in values]
+    await write_indexes(ctx, changes, batch=True)
+
+
+@AsyncCache.PIPELINE.delete_many.after()
+async def delete_indexes_many(ctx: PipelineContext):
+    values = ctx.local_data["original_values"].values()
+    changes = [(value, None) for value in values if value is not None]
+    await write_indexes(ctx, changes, batch=True)
@@ -0,0 +1,161 @@
+import collections
+import typing
+
+from ihashmap.index import Index
+
+SET = "set"
+UPDATE = "update"
+DELETE = "delete"
+
+
+class Batch:
+    """Unit of work buffering cache writes. See Cache.batch.
+
+    Only last operation of every key is kept: update of value set in same
+    batch stays set, delete replaces any previous operation.
+    On flush values are written with single batch operation per cache name
+    and operation type, index changes of all values of cache name are merged
+    and written once per index right after them. If flush fails, index changes
+    of values written before failure are still written, so only values of
+    failed backend call (or failed index write) may be left without index entries.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.operations = collections.OrderedDict()
+        self.index_changes = collections.OrderedDict()
+        self.flushing = False
+        self.started = False
+
+    @property
+    def buffering(self) -> bool:
+        """Writes are buffered, not executed."""
+
+        return not self.started
+
+    def set(self, name: str, key: str, value: typing.Mapping):
+        self.operations[(name, key)] = (SET, value)
+
+    def update(self, name: str, key: str, value: typing.Mapping):
+        operation = self.operations.get((name, key), (UPDATE, None))[0]
+        if operation == DELETE:
+            operation = UPDATE
+        self.operations[(name, key)] = (operation, value)
+
+    def delete(self, name: str, key: str):
+        self.operations[(name, key)] = (DELETE, None)
+
+    def set_many(self, name: str, values: typing.Mapping[str, typing.Mapping]):
+        for key, value in values.items():
+            self.set(name, key, value)
+
+    def update_many(self, name: str, values: typing.Mapping[str, typing.Mapping]):
+        for key, value in values.items():
+            self.update(name, key, value)
+
+    def delete_many(self, name: str, keys: typing.Iterable[str]):
+        for key in keys:
+            self.delete(name, key)
+
+    def __contains__(self, name_and_key: typing.Tuple[str, str]) -> bool:
+        return name_and_key in self.operations
+
+    def get(self, name: str, key: str, default: typing.Optional[typing.Any] = None):
+        """Gets value written in batch or default if it was deleted.
+
+        Key must be written in batch, check it with (name, key) in batch.
+        """
+
+        operation, value = self.operations[(name, key)]
+        return default if operation == DELETE else value
+
+    def add_index_changes(
+        self,
+        index: typing.Type[Index],
+        cache_name: str,
+        changes: typing.Dict[typing.Optional[str], typing.Tuple[list, list]],
+    ):
+        """Merges index changes made by flushed writes.
+
+        :param index: changed index.
+        :param str cache_name: cache name.
+        :param changes: index changes computed by Index.get_changes.
+        """
+
+        merged = self.index_changes.setdefault((index, cache_name), {})
+        for bucket, (added, removed) in changes.items():
+            bucket_changes = merged.setdefault(bucket, ([], []))
+            bucket_changes[0].extend(added)
+            bucket_changes[1].extend(removed)
+
+    def group_operations(
+        self,
+    ) -> typing.Dict[str, typing.Tuple[dict, dict, typing.List[str]]]:
+        """Groups buffered operations by cache name.
+
+        :return: dict of cache name to values to set, values to update
+                 and keys to delete.
+        """
+
+        grouped = collections.OrderedDict()
+        for (name, key), (operation, value) in self.operations.items():
+            sets, updates, deletes = grouped.setdefault(name, ({}, {}, []))
+            if operation == SET:
+                sets[key] = value
+            elif operation == UPDATE:
+                updates[key] = value
+            else:
+                deletes.append(key)
+        return grouped
+
+    def flush(self):
+        """Writes buffered values and merged index changes."""
+
+        self.started = self.flushing = True
+        try:
+            for name, (sets, updates, deletes) in self.group_operations().items():
+                if sets:
+                    self.cache._set_many(name, sets)
+                if updates:
+                    self.cache._update_many(name, updates)
+                if deletes:
+                    self.cache._delete_many(name, deletes)
+                self.write_index_changes()
+        except BaseException:
+            self.write_index_changes()
+            raise
+        finally:
+            self.flushing = False
+        self.clear()
+
+    def write_index_changes(self):
+        """Writes and forgets merged index changes of flushed writes."""
+
+        while self.index_changes:
+            (index, cache_name), changes = self.index_changes.popitem(last=False)
+            index.write_changes(cache_name, changes, batch=True)
+
+    def rollback(self):
+        """Drops buffered writes.
+
+        If flush has already started, storage may contain part of them:
+        local cache values and index statistics of all buffered keys
+        are dropped then, so they are read from storage again.
+        """
+
+        if self.started:
+            local_cache = self.cache.LOCAL_CACHE
+            names = set()
+            for name, key in self.operations:
+                names.add(name)
+                if local_cache is not None:
+                    local_cache.invalidate(name, key)
+            for name in names:
+                for index in Index.find_index_for_cache(name):
+                    index.drop_stats(name)
+        self.started = True
+        self.clear()
+
+    def clear(self):
+        self.operations.clear()
+        self.index_changes.clear()
@@ -0,0 +1,326 @@
+import hashlib
+import math
+import threading
+import typing
+
+from ihashmap.cache import Cache, PipelineContext
+
+
+class BloomFilter:
+    """Set of keys answering "definitely absent" or "probably present".
+
+    Key is present if all its hashes bits are set. Keys can't be removed.
+    """
+
+    def __init__(self, size: int, hashes: int):
+        """
+        :param int size: number of bits.
+        :param int hashes: number of bits set per key.
+        """
+
+        self.size = max(size, 8)
+        self.hashes = max(hashes, 1)
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    @classmethod
+    def create(
+        cls,
+        capacity: int,
+        error_rate: float = 0.01,
+        max_bytes: typing.Optional[int] = None,
+    ) -> "BloomFilter":
+        """Creates filter of optimal size for capacity keys and false positive rate.
+
+        :param int capacity: expected number of keys.
+        :param float error_rate: false positive rate at capacity.
+        :param max_bytes: memory budget, filter is smaller (and less precise) if exceeded.
+        """
+
+        capacity = max(capacity, 1)
+        size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        if max_bytes is not None:
+            size = min(size, max_bytes * 8 // cls.bits_per_slot())
+        hashes = round(size / capacity * math.log(2))
+        return cls(size, hashes)
+
+    @classmethod
+    def bits_per_slot(cls) -> int:
+        return 1
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+    def get_positions(self, key: str) -> typing.List[int]:
+        """Computes key slots by double hashing of single digest."""
+
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self.get_positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self.get_positions(key)
+        )
+
+    @property
+    def error_rate(self) -> float:
+        """Estimated false positive rate for number of added keys."""
+
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class CountingBloomFilter(BloomFilter):
+    """Bloom filter with byte counters instead of bits, so keys can be removed.
+
+    Counters stop at 255 and are never decreased after that.
+    """
+
+    def __init__(self, size: int, hashes: int):
+        super().__init__(size, hashes)
+        self.bits = bytearray(self.size)
+
+    @classmethod
+    def bits_per_slot(cls) -> int:
+        return 8
+
+    def add(self, key: str):
+        counters = self.bits
+        for position in self.get_positions(key):
+            if counters[position] < 255:
+                counters[position] += 1
+        self.count += 1
+
+    def remove(self, key: str):
+        """Removes key. Removing key which wasn't added may remove other keys."""
+
+        counters = self.bits
+        for position in self.get_positions(key):
+            if 0 < counters[position] < 255:
+                counters[position] -= 1
+        self.count = max(self.count - 1, 0)
+
+    def __contains__(self, key: str) -> bool:
+        counters = self.bits
+        return all(counters[position] for position in self.get_positions(key))
+
+
+class KeyFilter:
+    """Per cache filters answering reads of missing keys without storage calls.
+
+    Filter of cache is filled from PkIndex when cache is tracked and kept
+    up to date by set and delete pipelines of current process. Reads of keys
+    missing in filter return default without GET_METHOD call.
+    Keys written by other processes are unknown to filter, so rebuild
+    filters after such writes or don't use them.
+
+    Example:
+        key_filter = KeyFilter()
+        key_filter.track("my_cache", capacity=1000000, error_rate=0.001)
+        Cache.register_key_filter(key_filter)
+    """
+
+    def __init__(self):
+        self.filters = {}
+        self.options = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def track(
+        self,
+        name: str,
+        capacity: int,
+        error_rate: float = 0.01,
+        max_bytes: typing.Optional[int] = None,
+        counting: bool = True,
+    ):
+        """Creates filter of cache and fills it with cached keys.
+
+        :param str name: cache name.
+        :param int capacity: expected number of keys.
+        :param float error_rate: false positive rate at capacity.
+        :param max_bytes: filter memory budget.
+        :param bool counting: use CountingBloomFilter, so deleted keys are removed.
+                              Deleted keys stay in plain BloomFilter until rebuild.
+        """
+
+        self.options[name] = {
+            "capacity": capacity,
+            "error_rate": error_rate,
+            "max_bytes": max_bytes,
+            "counting": counting,
+        }
+        self.rebuild(name)
+
+    def rebuild(self, name: str, capacity: typing.Optional[int] = None):
+        """Recreates filter of cache from its PkIndex.
+
+        :param str name: cache name.
+        :param capacity: new expected number of keys.
+        """
+
+        from ihashmap.index import PkIndex
+
+        options = self.options[name]
+        if capacity is not None:
+            options["capacity"] = capacity
+        filter_class = CountingBloomFilter if options["counting"] else BloomFilter
+        key_filter = filter_class.create(
+            options["capacity"], options["error_rate"], options["max_bytes"]
+        )
+        for key in PkIndex.get(name):
+            key_filter.add(str(key))
+        with self._lock:
+            self.filters[name] = key_filter
+            self.counters[name] = {"checks": 0, "avoided": 0, "false_positives": 0}
+
+    def untrack(self, name: str):
+        with self._lock:
+            self.filters.pop(name, None)
+            self.options.pop(name, None)
+            self.counters.pop(name, None)
+
+    def might_contain(self, name: str, key: str) -> bool:
+        """Checks if key may be cached. Untracked caches may contain any key.
+
+        Counts checks and reads avoided by filter.
+        """
+
+        key_filter = self.filters.get(name)
+        if key_filter is None:
+            return True
+        counters = self.counters[name]
+        counters["checks"] += 1
+        if str(key) in key_filter:
+            return True
+        counters["avoided"] += 1
+        return False
+
+    def record_miss(self, name: str):
+        """Counts key which passed filter but was missing in storage."""
+
+        counters = self.counters.get(name)
+        if counters is not None:
+            counters["false_positives"] += 1
+
+    def add(self, name: str, keys: typing.Iterable[str]):
+        key_filter = self.filters.get(name)
+        if key_filter is None:
+            return
+        with self._lock:
+            for key in keys:
+                key_filter.add(str(key))
+
+    def remove(self, name: str, keys: typing.Iterable[str]):
+        key_filter = self.filters.get(name)
+        if not isinstance(key_filter, CountingBloomFilter):
+            return
+        with self._lock:
+            for key in keys:
+                key_filter.remove(str(key))
+
+    def stats(self, name: str) -> dict:
+        """Describes cache filter.
+
+        :return: dict with numbers of checks, reads avoided by filter and
+                 false positives (reads which passed filter but found nothing),
+                 filter keys count, size in bytes, hashes and estimated error rate.
+        """
+
+        key_filter = self.filters[name]
+        return dict(
+            self.counters[name],
+            keys=key_filter.count,
+            bytes=key_filter.nbytes,
+            hashes=key_filter.hashes,
+            error_rate=key_filter.error_rate,
+        )
+
+
+def _add_keys(
+    cache,
+    name: str,
+    keys: typing.Iterable[str],
+    previous: typing.Optional[typing.Mapping] = None,
+):
+    """Adds written keys to cache filter.
+
+    Counting filter must count every stored key once, so one delete removes it:
+    keys with previous value (given or read for keys passing filter) are skipped.
+    """
+
+    key_filter = cache.KEY_FILTER
+    if key_filter is None:
+        return
+    counting = key_filter.filters.get(name)
+    if isinstance(counting, CountingBloomFilter):
+        previous = dict(previous or {})
+        unknown = [key for key in keys if key not in previous and str(key) in counting]
+        if unknown:
+            previous.update(zip(unknown, cache._get_many(name, unknown)))
+        keys = [key for key in keys if previous.get(key) is None]
+    key_filter.add(name, keys)
+
+
+@Cache.PIPELINE.set.before()
+def add_key(ctx: PipelineContext):
+    """Adds key before write, so concurrent reads never miss stored value."""
+
+    _add_keys(ctx.cls_or_self, ctx.name, ctx.args[:1])
+
+
+@Cache.PIPELINE.update.before(priority=2)
+def add_updated_key(ctx: PipelineContext):
+    """Adds key before write using previous value read by Index.before_update."""
+
+    key, _ = ctx.args
+    previous = {}
+    if "previous_value" in ctx.local_data:
+        previous[key] = ctx.local_data["previous_value"]
+    _add_keys(ctx.cls_or_self, ctx.name, [key], previous)
+
+
+@Cache.PIPELINE.set_many.before()
+def add_keys(ctx: PipelineContext):
+    _add_keys(ctx.cls_or_self, ctx.name, list(ctx.args[0]))
+
+
+@Cache.PIPELINE.update_many.before(priority=2)
+def add_updated_keys(ctx: PipelineContext):
+    """Batch version of add_updated_key."""
+
+    _add_keys(
+        ctx.cls_or_self,
+        ctx.name,
+        list(ctx.args[0]),
+        ctx.local_data.get("previous_values"),
+    )
+
+
+@Cache.PIPELINE.delete.after()
+def remove_key(ctx: PipelineContext):
+    """Removes deleted key if it existed (read by Index.before_delete)."""
+
+    key_filter = ctx.cls_or_self.KEY_FILTER
+    if key_filter is not None and ctx.local_data.get("original_value") is not None:
+        key_filter.remove(ctx.name, ctx.args[:1])
+
+
+@Cache.PIPELINE.delete_many.after()
+def remove_keys(ctx: PipelineContext):
+    key_filter = ctx.cls_or_self.KEY_FILTER
+    if key_filter is None:
+        return
+    values = ctx.local_data.get("original_values") or {}
+    key_filter.remove(
+        ctx.name, [key for key, value in values.items() if value is not None]
+    )
@@ -0,0 +1,154 @@
+import bisect
+import time
+import typing
+
+from ihashmap.cache import Cache
+from ihashmap.index import Index, IndexContainer, PkIndex
+
+BUILDING = "building"
+READY = "ready"
+
+
+class IndexBuilder:
+    """Fills index with values cached before it was declared or changed.
+
+    Primary keys are streamed from PkIndex in chunks, values are fetched
+    with get_many and their entries are written with single read and
+    single write per chunk. Values written meanwhile are indexed by
+    regular index hooks. Build state is stored after every chunk,
+    so interrupted build resumes after last written chunk.
+    Search ignores index until build is completed (see Index.is_ready).
+
+    Example:
+        class IndexByColor(Index):
+            keys = ["_id", "color"]
+            requires_build = True
+
+        IndexBuilder(IndexByColor, "my_cache", max_rate=5000).run()
+    """
+
+    def __init__(
+        self,
+        index: typing.Type[Index],
+        cache_name: str,
+        cache: typing.Optional[Cache] = None,
+        chunk_size: typing.Optional[int] = None,
+        max_rate: typing.Optional[float] = None,
+        progress: typing.Optional[typing.Callable[[int, int], typing.Any]] = None,
+        clock: typing.Callable[[], float] = time.monotonic,
+        sleep: typing.Callable[[float], typing.Any] = time.sleep,
+    ):
+        """
+        :param index: index to build.
+        :param str cache_name: cache name.
+        :param cache: cache used to fetch values, new Cache by default.
+        :param chunk_size: number of values indexed at once, Cache.CHUNK_SIZE by default.
+        :param max_rate: maximum number of values indexed per second.
+        :param progress: function called after every chunk with number
+                         of processed and total values.
+        :param clock: monotonic time source in seconds.
+        :param sleep: function pausing build for given seconds.
+        """
+
+        if index is PkIndex:
+            raise ValueError("PkIndex is source of IndexBuilder and can't be built")
+        self.index = index
+        self.cache_name = cache_name
+        self.cache = cache if cache is not None else Cache()
+        self.chunk_size = chunk_size or self.cache.CHUNK_SIZE
+        self.max_rate = max_rate
+        self.progress = progress
+        self.clock = clock
+        self.sleep = sleep
+
+    def get_state(self) -> typing.Optional[dict]:
+        """Reads stored build state.
+
+        :return: dict with status, last_key and done keys
+                 or None if index was never built.
+        """
+
+        return Cache._read(
+            Cache, Index.INDEX_CACHE_NAME, self.index.get_build_name(self.cache_name)
+        )
+
+    def set_state(self, state: dict):
+        """Stores build state dropping its stale copy from Cache.LOCAL_CACHE."""
+
+        name = self.index.get_build_name(self.cache_name)
+        Cache.SET_METHOD(Cache, Index.INDEX_CACHE_NAME, name, state)
+        local_cache = Cache.LOCAL_CACHE
+        if local_cache is not None:
+            local_cache.invalidate(Index.INDEX_CACHE_NAME, name)
+        self.index.set_build_state(self.cache_name, state)
+
+    def run(self, rebuild: bool = False) -> dict:
+        """Builds index resuming interrupted build if there is one.
+
+        :param bool rebuild: drop index entries and build it from scratch
+                             even if it is ready.
+        :return: final build state.
+        """
+
+        state = self.get_state()
+        if state is not None and state["status"] == READY and not rebuild:
+            self.index.set_build_state(self.cache_name, state)
+            return state
+        if rebuild or state is None or state["status"] == READY:
+            state = {"status": BUILDING, "last_key": None, "done": 0}
+            self.set_state(state)
+            if rebuild:
+                self.clear()
+        else:
+            state = dict(state)
+            self.index.set_build_state(self.cache_name, state)
+
+        primary_keys = PkIndex.get(self.cache_name)
+        total = len(primary_keys)
+        start = 0
+        if state["last_key"] is not None:
+            start = bisect.bisect_right(primary_keys, state["last_key"])
+        started, processed = self.clock(), 0
+        for chunk_start in range(start, total, self.chunk_size):
+            chunk_stop = chunk_start + self.chunk_size
+            keys = list(primary_keys[chunk_start:chunk_stop])
+            self.write_chunk(keys)
+            processed += len(keys)
+            state.update(last_key=keys[-1], done=chunk_start + len(keys))
+            self.set_state(state)
+            if self.progress is not None:
+                self.progress(state["done"], total)
+            self.throttle(started, processed)
+
+        state.update(status=READY, done=total)
+        self.set_state(state)
+        self.index.drop_stats(self.cache_name)
+        return state
+
+    def write_chunk(self, keys: typing.List[str]):
+        """Adds index entries of values with given primary keys."""
+
+        values = self.cache._get_many(self.cache_name, keys)
+        changes = self.index.merge_changes(
+            (None, value) for value in values if value is not None
+        )
+        if changes:
+            self.index.write_changes(self.cache_name, changes, batch=True)
+
+    def throttle(self, started: float, processed: int):
+        """Pauses build to keep indexing rate below max_rate."""
+
+        if self.max_rate is None:
+            return
+        delay = processed / self.max_rate - (self.clock() - started)
+        if delay > 0:
+            self.sleep(delay)
+
+    def clear(self):
+        """Drops all index entries."""
+
+        if self.index.bucketed:
+            for bucket in self.index.get(self.cache_name):
+                self.index.set(self.cache_name, IndexContainer(), bucket=bucket)
+        self.index.set(self.cache_name, IndexContainer())
+        self.index.drop_stats(self.cache_name)
@@ -1,6 +1,7 @@
-import collections
-import copy
+import collections.abc
+import contextlib
 import functools
+import operator
 import types
 import typing
 
@@ -27,11 +28,18 @@ class Pipeline:
     temporary data between actions.
     """
 
+    METRICS = None
+    """Metrics recorder shared by all pipelines. See Cache.register_metrics."""
+
     def __init__(self, name, parent_pipe=None):
         self.name = name
         self.parent_pipe = parent_pipe
+        self.children = []
         self._pipe_before = []
         self._pipe_after = []
+        self._compiled = {}
+        if parent_pipe is not None:
+            parent_pipe.children.append(self)
 
     @property
     def pipe_before(self):
@@ -54,6 +62,7 @@ class Pipeline:
     def before(self, priority=1, cache_name=None):
         def wrapper(f):
             self._pipe_before.append(Action(f, priority, cache_name=cache_name))
+            self.invalidate()
             return f
 
         return wrapper
@@ -61,28 +70,87 @@ class Pipeline:
     def after(self, priority=1, cache_name=None):
         def wrapper(f):
             self._pipe_after.append(Action(f, priority, cache_name=cache_name))
+            self.invalidate()
             return f
 
         return wrapper
 
+    def invalidate(self):
+        """Drops compiled actions of this pipe and all its children."""
+
+        self._compiled.clear()
+        for child in self.children:
+            child.invalidate()
+
+    def compile(self, cache_name):
+        """Resolves actions to be executed for specific cache name.
+
+        Result is cached until new action is added to this pipe or its parents.
+
+        :param cache_name: cache name.
+        :return: tuple of before and after action functions.
+        """
+
+        try:
+            return self._compiled[cache_name]
+        except KeyError:
+            pass
+        compiled = (
+            tuple(
+                action.f
+                for action in self.pipe_before
+                if action.cache_name is None or action.cache_name == cache_name
+            ),
+            tuple(
+                action.f
+                for action in self.pipe_after
+                if action.cache_name is None or action.cache_name == cache_name
+            ),
+        )
+        self._compiled[cache_name] = compiled
+        return compiled
+
     def wrap_before(self, ctx: PipelineContext):
         """Executes all actions in parents _pipe_before and this pipes."""
 
-        for action in self.pipe_before:
-            if action.cache_name in [None, ctx.name]:
-                action(ctx)
+        for action in self.compile(ctx.name)[0]:
+            action(ctx)
 
     def wrap_after(self, ctx: PipelineContext):
         """Executes all actions in parents _pipe_after and this pipes."""
 
-        for action in self.pipe_after:
-            if action.cache_name in [None, ctx.name]:
-                action(ctx)
+        for action in self.compile(ctx.name)[1]:
+            action(ctx)
 
     def wrap_action(self, ctx: PipelineContext):
-        self.wrap_before(ctx)
+        metrics = self.METRICS
+        if metrics is not None:
+            return self.wrap_measured(ctx, metrics)
+        before, after = self.compile(ctx.name)
+        for action in before:
+            action(ctx)
         ctx.result = ctx.f(ctx.cls_or_self, ctx.name, *ctx.args, **ctx.kwargs)
-        self.wrap_after(ctx)
+        for action in after:
+            action(ctx)
+        return ctx.result
+
+    def wrap_measured(self, ctx: PipelineContext, metrics):
+        """Version of wrap_action recording latencies of actions and main function.
+
+        :param ctx: pipeline context.
+        :param ihashmap.metrics.Metrics metrics: metrics recorder.
+        """
+
+        started = metrics.clock()
+        before, after = self.compile(ctx.name)
+        for action in before:
+            metrics.measure_action(self.name, action, ctx)
+        called = metrics.clock()
+        ctx.result = ctx.f(ctx.cls_or_self, ctx.name, *ctx.args, **ctx.kwargs)
+        metrics.observe_backend(self.name, ctx, metrics.clock() - called)
+        for action in after:
+            metrics.measure_action(self.name, action, ctx)
+        metrics.observe_pipeline(self.name, metrics.clock() - started)
         return ctx.result
 
     def __call__(self, f: typing.Callable) -> typing.Callable:
@@ -95,22 +163,27 @@ class Pipeline:
 
         @functools.wraps(f)
         def wrap(cls_or_self, name, *args, **kwargs):
-            from ihashmap.index import Index
-
-            pipeline = self
-            if isinstance(cls_or_self, Cache):
-                pipeline = getattr(cls_or_self.PIPELINE, self.name)
-            elif isinstance(cls_or_self, Index):
-                pipeline = getattr(Cache.PIPELINE, self.name)
             ctx = PipelineContext(f, cls_or_self, name, *args, **kwargs)
-            return pipeline.wrap_action(ctx)
+            return self.resolve(cls_or_self).wrap_action(ctx)
 
         return wrap
 
+    def resolve(self, cls_or_self) -> "Pipeline":
+        """Finds pipe with same name in cache class own pipeline manager."""
+
+        if not isinstance(cls_or_self, Cache):
+            return self
+        pipeline = cls_or_self.PIPELINE.pipes.get(self.name)
+        if pipeline is None:
+            pipeline = getattr(cls_or_self.PIPELINE, self.name)
+        return pipeline
+
 
 class PipelineManager:
     """Manager."""
 
+    PIPELINE_CLASS = Pipeline
+
     def __init__(self, parent_manager=None):
         self.pipes = {}
         if parent_manager is not None:
@@ -118,12 +191,12 @@ class PipelineManager:
 
     def __getattr__(self, item):
         if item not in self.pipes:
-            self.pipes[item] = Pipeline(item)
+            self.pipes[item] = self.PIPELINE_CLASS(item)
         return self.pipes[item]
 
     def set_parent(self, parent_manager):
         for pipe_name, pipe in parent_manager.pipes.items():
-            self.pipes[pipe_name] = Pipeline(pipe.name, parent_pipe=pipe)
+            self.pipes[pipe_name] = self.PIPELINE_CLASS(pipe.name, parent_pipe=pipe)
 
 
 class Cache:
@@ -142,28 +215,95 @@ class Cache:
     PRIMARY_KEY = "_id"
     """Values primary key existing in all values."""
 
+    QUERY_OPERATORS = {
+        "$gt": operator.gt,
+        "$gte": operator.ge,
+        "$lt": operator.lt,
+        "$lte": operator.le,
+        "$between": lambda value, bounds: bounds[0] <= value <= bounds[1],
+        "$in": lambda value, arguments: value in arguments,
+        "$contains": lambda value, element: element in value,
+        "$all": lambda value, elements: all(element in value for element in elements),
+        "$any": lambda value, elements: any(element in value for element in elements),
+        "$prefix": lambda value, prefix: str.startswith(value, prefix),
+    }
+    """Operators usable in search query as {key: {"$operator": argument}}."""
+
     GET_METHOD = lambda cache, name, key, default=None: None  # noqa: E731
     SET_METHOD = lambda cache, name, key, value: None  # noqa: E731
     UPDATE_METHOD = lambda cache, name, key, value: None  # noqa: E731
     DELETE_METHOD = lambda cache, name, key: None  # noqa: E731
     """METHODS placeholders. You should register yours."""
 
-    @PIPELINE.set
+    INDEX_ADD_METHOD = None
+    INDEX_REMOVE_METHOD = None
+    """Optional index delta methods with signature (cache, name, key, entry).
+    When not registered indexes are rewritten using GET_METHOD and SET_METHOD."""
+
+    GET_MANY_METHOD = None
+    SET_MANY_METHOD = None
+    UPDATE_MANY_METHOD = None
+    DELETE_MANY_METHOD = None
+    """Optional batch methods with signatures (cache, name, keys, default=None),
+    (cache, name, values), (cache, name, values) and (cache, name, keys)
+    where values is mapping of keys to values.
+    When not registered single key METHODS are called in loop."""
+
+    COMPARE_AND_SET_METHOD = None
+    """Optional method with signature (cache, name, key, expected, value) -> bool
+    storing value only if stored value equals expected (None if key is missing).
+    When registered indexes are rewritten with optimistic retries,
+    so concurrent writers of different processes don't lose index entries."""
+
+    INDEX_LOCKS = None
+    """Optional locks serializing index rewrites of threads.
+    See ihashmap.concurrency.StripedLock."""
+
+    EXECUTOR = None
+    """Optional executor of concurrent storage calls and query matching.
+    See ihashmap.parallel.ParallelExecutor."""
+
+    CHUNK_SIZE = 1000
+    """Maximum number of values fetched at once by search and iteration."""
+
+    LOCAL_CACHE = None
+    """Optional in-process read-through tier. See ihashmap.local.LocalCache."""
+
+    KEY_FILTER = None
+    """Optional filters of cached keys skipping storage reads of missing keys.
+    See ihashmap.bloom.KeyFilter."""
+
+    EXPIRY = None
+    """Optional expiration of values hiding expired ones from reads.
+    See ihashmap.expiry.Expiry."""
+
+    METRICS = None
+    """Optional metrics recorder. See ihashmap.metrics.Metrics."""
+
+    _batch = None
+    """Batch of this cache instance. See Cache.batch."""
+
     def set(self, name: str, key: str, value: typing.Mapping):
         """Wrapper for pipeline execution.
 
+        Inside Cache.batch value is buffered until batch exits.
+
         :param str name: cache name.
         :param str key: hash key.
         :param dict value: stored value.
         :return:
         """
 
-        return self.SET_METHOD(name, key, value)
+        batch = self._get_batch()
+        if batch is not None:
+            return batch.set(name, key, value)
+        return self._set(name, key, value)
 
-    @PIPELINE.get
     def get(self, name: str, key: str, default: typing.Optional[typing.Any] = None):
         """Wrapper for pipeline execution.
 
+        Inside Cache.batch values written in batch are returned from it.
+
         :param str name: cache name.
         :param str key: hash key.
         :param default: default return value. Must be custom class instance
@@ -171,43 +311,328 @@ class Cache:
         :return:
         """
 
-        return self.GET_METHOD(name, key, default)
+        batch = self._get_batch()
+        if batch is not None and (name, key) in batch:
+            return batch.get(name, key, default)
+        value = self._get(name, key, default)
+        return default if self._is_expired(name, value) else value
 
-    @PIPELINE.update
     def update(self, name: str, key: str, value: typing.Mapping):
         """Wrapper for pipeline execution.
 
+        Inside Cache.batch value is buffered until batch exits.
+
         :param str name: cache name.
         :param str key: hash key.
         :param dict value: stored value.
         """
 
-        return self.UPDATE_METHOD(name, key, value)
+        batch = self._get_batch()
+        if batch is not None:
+            return batch.update(name, key, value)
+        return self._update(name, key, value)
 
-    @PIPELINE.delete
     def delete(self, name: str, key: str):
         """Wrapper for pipeline execution.
 
+        Inside Cache.batch deletion is buffered until batch exits.
+
         :param str name: cache name.
         :param str key: hash key.
         """
 
-        return self.DELETE_METHOD(name, key)
+        batch = self._get_batch()
+        if batch is not None:
+            return batch.delete(name, key)
+        return self._delete(name, key)
+
+    def set_many(self, name: str, values: typing.Mapping[str, typing.Mapping]):
+        """Wrapper for batch pipeline execution.
+
+        :param str name: cache name.
+        :param dict values: mapping of hash keys to stored values.
+        :return:
+        """
+
+        batch = self._get_batch()
+        if batch is not None:
+            return batch.set_many(name, values)
+        return self._set_many(name, values)
+
+    def get_many(
+        self,
+        name: str,
+        keys: typing.Iterable[str],
+        default: typing.Optional[typing.Any] = None,
+    ) -> typing.List:
+        """Wrapper for batch pipeline execution.
+
+        :param str name: cache name.
+        :param keys: hash keys.
+        :param default: default value for missing keys.
+        :return: list of values in keys order.
+        """
+
+        batch = self._get_batch()
+        if batch is None:
+            return self._drop_expired(
+                name, self._get_many(name, keys, default), default
+            )
+        keys = list(keys)
+        missing = [key for key in keys if (name, key) not in batch]
+        found = {}
+        if missing:
+            found = dict(
+                zip(
+                    missing,
+                    self._drop_expired(
+                        name, self._get_many(name, missing, default), default
+                    ),
+                )
+            )
+        return [
+            found[key] if key in found else batch.get(name, key, default)
+            for key in keys
+        ]
+
+    def update_many(self, name: str, values: typing.Mapping[str, typing.Mapping]):
+        """Wrapper for batch pipeline execution.
+
+        :param str name: cache name.
+        :param dict values: mapping of hash keys to stored values.
+        """
+
+        batch = self._get_batch()
+        if batch is not None:
+            return batch.update_many(name, values)
+        return self._update_many(name, values)
+
+    def delete_many(self, name: str, keys: typing.Iterable[str]):
+        """Wrapper for batch pipeline execution.
+
+        :param str name: cache name.
+        :param keys: hash keys.
+        """
+
+        batch = self._get_batch()
+        if batch is not None:
+            return batch.delete_many(name, keys)
+        return self._delete_many(name, keys)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Buffers writes made through this cache instance until block exits.
+
+        Values are then written with batch METHODS and index changes of all
+        values are merged and written once per index. If exception is raised
+        inside block nothing is written. Reads return values written in batch,
+        searches see stored values only. Nested blocks join outer batch.
+
+        Example:
+            with cache.batch():
+                cache.set("my_cache", "1", value)
+                cache.update("my_cache", "2", other_value)
+
+        :return: ihashmap.batch.Batch.
+        """
+
+        from ihashmap.batch import Batch
+
+        if self._batch is not None:
+            yield self._batch
+            return
+        batch = self._batch = Batch(self)
+        try:
+            yield batch
+            batch.flush()
+        except BaseException:
+            batch.rollback()
+            raise
+        finally:
+            self._batch = None
+
+    def _get_batch(self):
+        """Returns batch buffering writes of this cache instance if any."""
+
+        batch = self._batch
+        if batch is not None and batch.buffering:
+            return batch
+        return None
 
     def all(self, name: str):
         """Finds all values in cache.
 
+        Values are fetched through get_many pipeline like search results
+        (concurrently by EXECUTOR if registered).
+
         :param name:
         :return:
         """
 
         from ihashmap.index import PkIndex
 
+        values = self._get_many(name, list(PkIndex.get(name)))
+        return [value for value in values if not self._is_expired(name, value)]
+
+    def iter_all(
+        self, name: str, chunk_size: typing.Optional[int] = None
+    ) -> typing.Iterator[typing.Mapping]:
+        """Iterates over all values in cache fetching them in chunks.
+
+        Values deleted during iteration are skipped.
+
+        :param name: cache name.
+        :param chunk_size: maximum number of values fetched at once.
+        :return: iterator over values.
+        """
+
+        from ihashmap.index import PkIndex
+
+        chunk_size = chunk_size or self.CHUNK_SIZE
         index_data = PkIndex.get(name)
-        result = []
-        for item_key in index_data:
-            result.append(self._get(name, item_key))
-        return result
+        for start in range(0, len(index_data), chunk_size):
+            stop = start + chunk_size
+            for value in self._get_many(name, list(index_data[start:stop])):
+                if value is not None and not self._is_expired(name, value):
+                    yield value
+
+    def _is_expired(self, name: str, value) -> bool:
+        """Checks if value has expired. Index hooks read expired values to remove them."""
+
+        expiry = self.EXPIRY
+        return expiry is not None and expiry.is_expired(name, value)
+
+    def _may_expire(self, name: str) -> bool:
+        """Checks if values of cache are tracked by EXPIRY, so found ones may be dropped."""
+
+        expiry = self.EXPIRY
+        return expiry is not None and name in expiry.indexes
+
+    def _drop_expired(
+        self,
+        name: str,
+        values: typing.Iterable,
+        default: typing.Optional[typing.Any] = None,
+    ) -> typing.List:
+        """Replaces expired values with default."""
+
+        expiry = self.EXPIRY
+        if expiry is None:
+            return list(values)
+        now = expiry.clock()
+        return [
+            default if expiry.is_expired(name, value, now) else value
+            for value in values
+        ]
+
+    def _read(self, name: str, key: str, default: typing.Optional[typing.Any] = None):
+        """Calls GET_METHOD through LOCAL_CACHE and KEY_FILTER if registered.
+
+        Can be called with Cache class instead of instance as indexes do.
+        Values missing in storage are not stored locally.
+        """
+
+        local_cache = self.LOCAL_CACHE
+        if local_cache is None:
+            return _read_key(self, name, key, default)
+        value = local_cache.get(name, key, default)
+        if value is default:
+            value = _read_key(self, name, key, default)
+            if value is not default:
+                local_cache.put(name, key, value)
+        return value
+
+    def _read_many(
+        self,
+        name: str,
+        keys: typing.Iterable[str],
+        default: typing.Optional[typing.Any] = None,
+    ) -> typing.List:
+        """Batch version of _read using GET_MANY_METHOD if registered.
+
+        Only keys missing in LOCAL_CACHE are read from storage.
+        """
+
+        local_cache = self.LOCAL_CACHE
+        if local_cache is None:
+            return _read_storage(self, name, keys, default)
+        keys = list(keys)
+        result = [local_cache.get(name, key, default) for key in keys]
+        missing = [key for key, value in zip(keys, result) if value is default]
+        if not missing:
+            return result
+        found = dict(zip(missing, _read_storage(self, name, missing, default)))
+        for key, value in found.items():
+            if value is not default:
+                local_cache.put(name, key, value)
+        return [
+            found.get(key, default) if value is default else value
+            for key, value in zip(keys, result)
+        ]
+
+    @classmethod
+    def register_local_cache(cls, local_cache):
+        """Registers in-process read-through tier for global cache usage.
+
+        :param ihashmap.local.LocalCache local_cache: local tier or None to disable it.
+        """
+
+        cls.LOCAL_CACHE = local_cache
+
+    @classmethod
+    def register_key_filter(cls, key_filter):
+        """Registers filters of cached keys for global cache usage.
+
+        :param ihashmap.bloom.KeyFilter key_filter: filters or None to disable them.
+        """
+
+        cls.KEY_FILTER = key_filter
+
+    @classmethod
+    def register_expiry(cls, expiry):
+        """Registers expiration of values for global cache usage.
+
+        :param ihashmap.expiry.Expiry expiry: expiration or None to keep expired values.
+        """
+
+        cls.EXPIRY = expiry
+
+    @classmethod
+    def register_metrics(cls, metrics):
+        """Registers metrics recorder for all caches, pipelines and indexes.
+
+        :param ihashmap.metrics.Metrics metrics: recorder or None to disable metrics.
+        """
+
+        Cache.METRICS = Pipeline.METRICS = metrics
+
+    @classmethod
+    def register_executor(cls, executor):
+        """Registers executor running storage calls and query matching concurrently.
+
+        :param ihashmap.parallel.ParallelExecutor executor: executor or None
+                                                           to call storage sequentially.
+        """
+
+        cls.EXECUTOR = executor
+
+    @classmethod
+    def register_compare_and_set_method(cls, method: typing.Callable):
+        """Registers compare-and-set method used by indexes rewrites.
+
+        :param method: function which will be called on index rewrite.
+        """
+
+        cls.COMPARE_AND_SET_METHOD = method
+
+    @classmethod
+    def register_index_locks(cls, locks):
+        """Registers locks serializing index rewrites of threads.
+
+        :param ihashmap.concurrency.StripedLock locks: locks or None to disable them.
+        """
+
+        cls.INDEX_LOCKS = locks
 
     @classmethod
     def register_get_method(cls, method: typing.Callable):
@@ -246,79 +671,228 @@ class Cache:
         cls.DELETE_METHOD = method
 
     @classmethod
-    def _match_query(cls, value: dict, query: dict, is_index=False):
+    def register_index_add_method(cls, method: typing.Callable):
+        """Registers method adding single entry to stored index.
+
+        Method must insert entry to index stored under key in place
+        and keep index sorted. Adding existing entry must do nothing.
+
+        :param method: function which will be called on Index.add execution.
+        """
+
+        cls.INDEX_ADD_METHOD = method
+
+    @classmethod
+    def register_index_remove_method(cls, method: typing.Callable):
+        """Registers method removing single entry from stored index.
+
+        Method must remove entry from index stored under key in place.
+        Removing missing entry must do nothing.
+
+        :param method: function which will be called on Index.remove execution.
+        """
+
+        cls.INDEX_REMOVE_METHOD = method
+
+    @classmethod
+    def register_get_many_method(cls, method: typing.Callable):
+        """Registers batch get method for global cache usage.
+
+        :param method: function which will be called on .get_many method execution.
+        """
+
+        cls.GET_MANY_METHOD = method
+
+    @classmethod
+    def register_set_many_method(cls, method: typing.Callable):
+        """Registers batch set method for global cache usage.
+
+        :param method: function which will be called on .set_many method execution.
+        """
+
+        cls.SET_MANY_METHOD = method
+
+    @classmethod
+    def register_update_many_method(cls, method: typing.Callable):
+        """Registers batch update method for global cache usage.
+
+        :param method: function which will be called on .update_many method execution.
+        """
+
+        cls.UPDATE_MANY_METHOD = method
+
+    @classmethod
+    def register_delete_many_method(cls, method: typing.Callable):
+        """Registers batch delete method for global cache usage.
+
+        :param method: function which will be called on .delete_many method execution.
+        """
+
+        cls.DELETE_MANY_METHOD = method
+
+    @classmethod
+    def _match_query(cls, value: dict, query: dict, is_index=False) -> bool:
         """Matches query to mapping values.
 
         :param value: value to match against pattern
-        :param query: dict se
-        :return:
+        :param query: dict of keys to plain values, functions or operators.
+        :param bool is_index: compare plain values converted to strings.
+        :return: True if all query conditions match.
         """
 
-        matched = []
-        match = {key: False for key in query}
         for search_key, search_value in query.items():
+            actual = value.get(search_key)
             if isinstance(search_value, types.FunctionType):
-                if search_value(value.get(search_key)):
-                    match[search_key] = True
+                if not search_value(actual):
+                    return False
+            elif cls.is_operators(search_value):
+                if not cls._match_operators(actual, search_value):
+                    return False
             else:
                 if is_index:
                     search_value = str(search_value)
-                if value.get(search_key) == search_value:
-                    match[search_key] = True
-        if all(match.values()):
-            matched.append(value)
-        return matched
+                if actual != search_value:
+                    return False
+        return True
+
+    @classmethod
+    def is_operators(cls, condition) -> bool:
+        """Checks if query condition is mapping of QUERY_OPERATORS to arguments.
+
+        Other mappings are plain values matched by equality.
+        """
+
+        return (
+            isinstance(condition, collections.abc.Mapping)
+            and bool(condition)
+            and all(name in cls.QUERY_OPERATORS for name in condition)
+        )
+
+    @classmethod
+    def _match_operators(cls, value, operators: typing.Mapping) -> bool:
+        """Matches value against all query operators.
+
+        Values not comparable with operator argument never match.
+
+        :param value: value to match.
+        :param dict operators: operator name to argument mapping.
+        :return: True if all operators match.
+        """
+
+        try:
+            return all(
+                cls.QUERY_OPERATORS[name](value, argument)
+                for name, argument in operators.items()
+            )
+        except TypeError:
+            return False
+
+    def explain(
+        self,
+        name: str,
+        search_query: typing.Mapping,
+        sort: typing.Optional[str] = None,
+        limit: typing.Optional[int] = None,
+        projection: typing.Optional[typing.Sequence[str]] = None,
+    ) -> dict:
+        """Describes how search query would be executed.
+
+        :param name: cache name.
+        :param dict search_query: search query. See Cache.search.
+        :param sort: key to sort results by. See Cache.search.
+        :param limit: maximum number of results.
+        :param projection: keys to return. See Cache.search.
+        :return: dict describing query plan.
+        """
+
+        from ihashmap.planner import QueryPlan
+
+        plan = QueryPlan(
+            name, search_query, sort=sort, limit=limit, projection=projection
+        )
+        return plan.explain()
 
     def search(
         self,
         name: str,
         search_query: typing.Mapping[
-            str, typing.Union[str, int, tuple, list, typing.Callable]
+            str, typing.Union[str, int, tuple, list, dict, typing.Callable]
         ],
+        sort: typing.Optional[str] = None,
+        limit: typing.Optional[int] = None,
+        projection: typing.Optional[typing.Sequence[str]] = None,
     ) -> typing.List[typing.Mapping]:
         """Searches cache for required values based on search query.
 
+        Query planner chooses indexes to use. See Cache.explain.
+
         :param name: cache name.
         :param dict search_query: search key:value to match.
-                                  Values can be any builtin type
-                                  or function to which value will be passed as argument.
-        :return: list of matching values.
+                                  Values can be any builtin type,
+                                  function to which value will be passed as argument
+                                  or dict of operators e.g. {"$gt": 1, "$lt": 5}.
+        :param sort: key to sort results by. Prefix with "-" for descending order.
+        :param limit: maximum number of results.
+        :param projection: keys to return instead of whole values.
+                           Values are not fetched at all if typed index
+                           contains all query and projection keys.
+        :return: list of matching values or dicts with projected keys.
         """
 
-        from ihashmap.index import Index
-
-        index_match = []
-        indexes = Index.find_index_for_cache(name)
-        for index in indexes:
-            index_match.append(
-                len(set(index.keys).intersection(search_query)) / len(search_query)
-            )
-        best_choice_index = index_match.index(max(index_match))
-        best_index = indexes[best_choice_index]
-        index_data = set(best_index.get(name))
-        index_data = best_index.get_values(index_data)
-        matched = []
-        subquery = {
-            key: value for key, value in search_query.items() if key in best_index.keys
-        }
-        rest_query = {
-            key: value
-            for key, value in search_query.items()
-            if key not in best_index.keys
-        }
-        for value in index_data:
-            matched += self._match_query(value, subquery, is_index=True)
-        result = []
-        for value in matched:
-            entity = self._get(name, value[self.PRIMARY_KEY])
-            result += self._match_query(entity, rest_query)
+        from ihashmap.planner import QueryPlan
+
+        plan = QueryPlan(
+            name, search_query, sort=sort, limit=limit, projection=projection
+        )
+        metrics = self.METRICS
+        if metrics is None:
+            return plan.execute(self, self.CHUNK_SIZE)
+        started = metrics.clock()
+        result = plan.execute(self, self.CHUNK_SIZE)
+        metrics.observe_search(plan, len(result), metrics.clock() - started)
         return result
 
+    def iter_search(
+        self,
+        name: str,
+        search_query: typing.Mapping,
+        sort: typing.Optional[str] = None,
+        limit: typing.Optional[int] = None,
+        projection: typing.Optional[typing.Sequence[str]] = None,
+        chunk_size: typing.Optional[int] = None,
+    ) -> typing.Iterator[typing.Mapping]:
+        """Lazy version of Cache.search fetching matching values in chunks.
+
+        Values are yielded as soon as their chunk is fetched unless
+        results are sorted by key driving index is not ordered by.
+
+        :param name: cache name.
+        :param dict search_query: search query. See Cache.search.
+        :param sort: key to sort results by. See Cache.search.
+        :param limit: maximum number of results.
+        :param projection: keys to return. See Cache.search.
+        :param chunk_size: maximum number of values fetched at once.
+        :return: iterator over matching values or dicts with projected keys.
+        """
+
+        from ihashmap.planner import QueryPlan
+
+        plan = QueryPlan(
+            name, search_query, sort=sort, limit=limit, projection=projection
+        )
+        return plan.iterate(self, chunk_size or self.CHUNK_SIZE)
+
     @PIPELINE.get
     def _get(self, name: str, key: str, default: typing.Optional[typing.Any] = None):
         """Internal method. PLEASE DONT CHANGE!"""
 
-        return self.GET_METHOD(name, key, default)
+        return self._read(name, key, default)
+
+    @PIPELINE.get_many
+    def _get_many(self, name, keys, default=None):
+        """Internal method. PLEASE DONT CHANGE!"""
+
+        return self._read_many(name, keys, default)
 
     @PIPELINE.set
     def _set(self, name, key, value):
@@ -326,34 +900,88 @@ class Cache:
 
         return self.SET_METHOD(name, key, value)
 
+    @PIPELINE.set_many
+    def _set_many(self, name, values):
+        """Internal method. PLEASE DONT CHANGE!"""
+
+        if self.SET_MANY_METHOD is None:
+            return [self.SET_METHOD(name, key, value) for key, value in values.items()]
+        return self.SET_MANY_METHOD(name, values)
+
     @PIPELINE.update
     def _update(self, name, key, value):
         """Internal method. PLEASE DONT CHANGE!"""
 
         return self.UPDATE_METHOD(name, key, value)
 
+    @PIPELINE.update_many
+    def _update_many(self, name, values):
+        """Internal method. PLEASE DONT CHANGE!"""
+
+        if self.UPDATE_MANY_METHOD is None:
+            return [
+                self.UPDATE_METHOD(name, key, value) for key, value in values.items()
+            ]
+        return self.UPDATE_MANY_METHOD(name, values)
+
     @PIPELINE.delete
     def _delete(self, name, key):
         """Internal method. PLEASE DONT CHANGE!"""
 
         return self.DELETE_METHOD(name, key)
 
-    def __init_subclass__(cls, **kwargs):
-        cls.PIPELINE = PipelineManager(parent_manager=cls.PIPELINE)
-
+    @PIPELINE.delete_many
+    def _delete_many(self, name, keys):
+        """Internal method. PLEASE DONT CHANGE!"""
 
-@Cache.PIPELINE.get.after()
-@Cache.PIPELINE.set.after()
-@Cache.PIPELINE.update.after()
-def add_shadow_copy(ctx: PipelineContext):
-    """Add .__shadow_copy__ attribute for future use in pipelines."""
+        if self.DELETE_MANY_METHOD is None:
+            return [self.DELETE_METHOD(name, key) for key in keys]
+        return self.DELETE_MANY_METHOD(name, keys)
 
-    if ctx.result is not None:
-        ctx.result.__shadow_copy__ = ctx.result
-    elif "original_value" in ctx.local_data:
-        value = ctx.local_data["original_value"]
-        try:
-            delattr(value, "__shadow_copy__")
-        except AttributeError:
-            pass
-        value.__shadow_copy__ = copy.copy(value)
+    def __init_subclass__(cls, **kwargs):
+        cls.PIPELINE = type(cls.PIPELINE)(parent_manager=cls.PIPELINE)
+
+
+def _class_of(cache) -> type:
+    return cache if isinstance(cache, type) else type(cache)
+
+
+def _read_key(cache, name: str, key: str, default=None):
+    cls = _class_of(cache)
+    key_filter = cls.KEY_FILTER
+    if key_filter is None:
+        return cls.GET_METHOD(cache, name, key, default)
+    if not key_filter.might_contain(name, key):
+        return default
+    value = cls.GET_METHOD(cache, name, key, default)
+    if value is default:
+        key_filter.record_miss(name)
+    return value
+
+
+def _read_storage(cache, name: str, keys: typing.Iterable[str], default=None):
+    """Reads keys passing KEY_FILTER from storage, others are default."""
+
+    key_filter = _class_of(cache).KEY_FILTER
+    if key_filter is None:
+        return _call_storage(cache, name, keys, default)
+    keys = list(keys)
+    passed = [key for key in keys if key_filter.might_contain(name, key)]
+    if not passed:
+        return [default] * len(keys)
+    found = dict(zip(passed, _call_storage(cache, name, passed, default)))
+    for value in found.values():
+        if value is default:
+            key_filter.record_miss(name)
+    return [found.get(key, default) for key in keys]
+
+
+def _call_storage(cache, name: str, keys: typing.Iterable[str], default=None):
+    cls = _class_of(cache)
+    if cls.EXECUTOR is not None:
+        keys = list(keys)
+        if len(keys) > 1:
+            return cls.EXECUTOR.read(cache, name, keys, default)
+    if cls.GET_MANY_METHOD is None:
+        return [cls.GET_METHOD(cache, name, key, default) for key in keys]
+    return cls.GET_MANY_METHOD(cache, name, keys, default)
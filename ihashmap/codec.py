@@ -0,0 +1,366 @@
+import array
+import collections.abc
+import struct
+import typing
+
+
+class IndexCodec:
+    """Converts cached values to index entries and back.
+
+    Entries must be hashable and comparable with each other,
+    as index stores them in sorted IndexContainer.
+    """
+
+    typed: bool = False
+    """Decoded values keep original types and can be compared with operators."""
+
+    packed: bool = False
+    """Whole index is stored as single object produced by dump.
+    Index delta methods can't be used then."""
+
+    def encode(self, keys: typing.Sequence[str], value: typing.Mapping):
+        """Cuts data from value for index storage.
+
+        :param keys: index keys.
+        :param dict value: cached value.
+        :return: index entry.
+        """
+
+        raise NotImplementedError
+
+    def decode(self, keys: typing.Sequence[str], entry) -> dict:
+        """Restores index keys values from entry.
+
+        :param keys: index keys.
+        :param entry: index entry.
+        """
+
+        raise NotImplementedError
+
+    def decode_many(
+        self, keys: typing.Sequence[str], entries: typing.Iterable
+    ) -> typing.List[dict]:
+        return [self.decode(keys, entry) for entry in entries]
+
+    def decode_columns(
+        self, keys: typing.Sequence[str], entries: typing.Sequence, numpy=None
+    ) -> typing.Dict[str, typing.Sequence]:
+        """Decodes entries to columns of values of every key.
+
+        :param keys: index keys.
+        :param entries: index entries.
+        :param numpy: numpy module if codec may return numpy arrays.
+        :return: dict of key to sequence of values in entries order.
+        """
+
+        return _to_columns(
+            keys, [self.decode(keys, entry).values() for entry in entries]
+        )
+
+    def first(self, keys: typing.Sequence[str], entry):
+        """Restores first key value from entry. Used for binary search."""
+
+        raise NotImplementedError
+
+    def dump(self, keys: typing.Sequence[str], entries: typing.Sequence):
+        """Converts sorted entries to stored index data."""
+
+        return entries
+
+    def load(self, keys: typing.Sequence[str], stored) -> typing.Sequence:
+        """Converts stored index data to sorted entries."""
+
+        return stored
+
+
+class StringCodec(IndexCodec):
+    """Stores entries as ":" joined strings of values.
+
+    Values types are lost, so operators can't be evaluated on index data
+    and values containing ":" can't be decoded.
+    """
+
+    def encode(self, keys: typing.Sequence[str], value: typing.Mapping) -> str:
+        return ":".join(str(value[key]) for key in keys)
+
+    def decode(self, keys: typing.Sequence[str], entry: str) -> dict:
+        return dict(zip(keys, entry.split(":")))
+
+    def first(self, keys: typing.Sequence[str], entry: str) -> str:
+        return entry.split(":", 1)[0]
+
+    def decode_columns(
+        self, keys: typing.Sequence[str], entries: typing.Sequence[str], numpy=None
+    ) -> typing.Dict[str, typing.Sequence]:
+        return _to_columns(keys, [entry.split(":") for entry in entries])
+
+
+class TupleCodec(IndexCodec):
+    """Stores entries as tuples of values in keys order.
+
+    Storage backend must be able to serialize tuples of values.
+    """
+
+    typed = True
+
+    def encode(self, keys: typing.Sequence[str], value: typing.Mapping) -> tuple:
+        return tuple(value[key] for key in keys)
+
+    def decode(self, keys: typing.Sequence[str], entry: tuple) -> dict:
+        return dict(zip(keys, entry))
+
+    def first(self, keys: typing.Sequence[str], entry: tuple):
+        return entry[0]
+
+    def decode_columns(
+        self, keys: typing.Sequence[str], entries: typing.Sequence[tuple], numpy=None
+    ) -> typing.Dict[str, typing.Sequence]:
+        return _to_columns(keys, entries)
+
+
+def _to_columns(
+    keys: typing.Sequence[str], rows: typing.Iterable[typing.Iterable]
+) -> typing.Dict[str, typing.Sequence]:
+    columns = list(zip(*rows))
+    if not columns:
+        return {key: () for key in keys}
+    return dict(zip(keys, columns))
+
+
+class _Field:
+    """Struct field converting value to order preserving raw value and back."""
+
+    def __init__(self, code: str):
+        self.code = code
+        self.kind = kind = code[-1]
+        self.size = struct.calcsize(">" + code)
+        self.encode = self.decode = _identity
+        if kind in "bhilq":
+            offset = 1 << (self.size * 8 - 1)
+            self.code = kind.upper()
+            self.encode = offset.__add__
+            self.decode = (-offset).__add__
+        elif kind in "fd":
+            self._init_float(kind)
+        elif kind == "s":
+            self.encode = self._encode_string
+            self.decode = _decode_string
+
+    def _init_float(self, kind: str):
+        size = struct.calcsize(">" + kind)
+        raw_code = {4: "I", 8: "Q"}[size]
+        sign, mask = 1 << (size * 8 - 1), (1 << (size * 8)) - 1
+        self.code = raw_code
+
+        def encode(value):
+            (raw,) = struct.unpack(">" + raw_code, struct.pack(">" + kind, value))
+            return raw ^ mask if raw & sign else raw | sign
+
+        def decode(raw):
+            raw = raw ^ sign if raw & sign else raw ^ mask
+            return struct.unpack(">" + kind, struct.pack(">" + raw_code, raw))[0]
+
+        def decode_column(column):
+            raws = array.array(
+                raw_code, [raw ^ sign if raw & sign else raw ^ mask for raw in column]
+            )
+            return array.array(kind, raws.tobytes()).tolist()
+
+        self.encode, self.decode = encode, decode
+        self.decode_column = decode_column
+
+    def decode_column(self, column: typing.Sequence) -> typing.Iterable:
+        """Decodes raw values of many entries at once."""
+
+        if self.decode is _identity:
+            return column
+        return map(self.decode, column)
+
+    def decode_array(self, raws, numpy) -> typing.Sequence:
+        """Decodes numpy array of raw values."""
+
+        bits = self.size * 8
+        if self.kind == "s":
+            return [raw.decode() for raw in raws.tolist()]
+        if self.kind == "?":
+            return raws
+        raws = raws.astype(f"=u{self.size}")
+        if self.kind in "bhilq":
+            return (raws ^ numpy.array(1 << (bits - 1), raws.dtype)).view(
+                f"=i{self.size}"
+            )
+        if self.kind in "fd":
+            sign = numpy.array(1 << (bits - 1), raws.dtype)
+            mask = numpy.array((1 << bits) - 1, raws.dtype)
+            raws = numpy.where(raws & sign, raws ^ sign, raws ^ mask)
+            return raws.view(f"=f{self.size}")
+        return raws
+
+    def get_dtype(self) -> str:
+        """Numpy type of raw values."""
+
+        if self.kind == "s":
+            return f"S{self.size}"
+        if self.kind == "?":
+            return "?"
+        return f">u{self.size}"
+
+    def _encode_string(self, value: str) -> bytes:
+        raw = value.encode()
+        if len(raw) > self.size:
+            raise ValueError(f"{value!r} is longer than {self.size} bytes")
+        return raw
+
+
+def _identity(value):
+    return value
+
+
+def _decode_string(raw: bytes) -> str:
+    return raw.rstrip(b"\0").decode()
+
+
+class PackedEntries(collections.abc.Sequence):
+    """Read only sequence of fixed size entries stored in single bytes object."""
+
+    def __init__(self, data: bytes, size: int):
+        self.data = data
+        self.size = size
+
+    def __len__(self):
+        return len(self.data) // self.size
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            start, stop, step = position.indices(len(self))
+            if step == 1:
+                first, last = start * self.size, max(start, stop) * self.size
+                return PackedEntries(self.data[first:last], self.size)
+            return [self[i] for i in range(start, stop, step)]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        start = position * self.size
+        stop = start + self.size
+        return self.data[start:stop]
+
+    def __iter__(self):
+        data, size = self.data, self.size
+        return (
+            data[start:stop]
+            for start, stop in zip(
+                range(0, len(data), size), range(size, len(data) + 1, size)
+            )
+        )
+
+
+class StructCodec(IndexCodec):
+    """Stores entries as packed fixed layout bytes.
+
+    Layout is defined by struct format of every index key:
+    integers (b, h, i, l, q and unsigned B, H, I, L, Q), floats (f, d),
+    bool (?) and utf-8 strings of fixed maximum length (like 36s).
+    Entries are encoded so bytes order matches values order,
+    which makes codec suitable for SortedIndex.
+
+    When packed is set whole index is stored as single bytes object,
+    which is much smaller than list of entries, but every change
+    rewrites whole index as index delta methods can't be used.
+
+    Example:
+        class IndexByPrice(SortedIndex):
+            keys = ["price", "_id"]
+            codec = StructCodec({"price": "q", "_id": "36s"})
+    """
+
+    typed = True
+
+    def __init__(self, formats: typing.Mapping[str, str], packed: bool = False):
+        """
+        :param formats: struct format of every index key.
+        :param bool packed: store whole index as single bytes object.
+        """
+
+        self.formats = dict(formats)
+        self.packed = packed
+        self._layouts = {}
+
+    def get_layout(
+        self, keys: typing.Sequence[str]
+    ) -> typing.Tuple[struct.Struct, typing.List[_Field]]:
+        """Composes struct and fields for index keys."""
+
+        keys = tuple(keys)
+        layout = self._layouts.get(keys)
+        if layout is None:
+            fields = [_Field(self.formats[key]) for key in keys]
+            packer = struct.Struct(">" + "".join(field.code for field in fields))
+            layout = self._layouts[keys] = (packer, fields)
+        return layout
+
+    def encode(self, keys: typing.Sequence[str], value: typing.Mapping) -> bytes:
+        packer, fields = self.get_layout(keys)
+        return packer.pack(
+            *(field.encode(value[key]) for key, field in zip(keys, fields))
+        )
+
+    def decode(self, keys: typing.Sequence[str], entry: bytes) -> dict:
+        packer, fields = self.get_layout(keys)
+        return {
+            key: field.decode(raw)
+            for key, field, raw in zip(keys, fields, packer.unpack(entry))
+        }
+
+    def decode_many(
+        self, keys: typing.Sequence[str], entries: typing.Iterable[bytes]
+    ) -> typing.List[dict]:
+        columns = self.decode_columns(keys, entries).values()
+        return [dict(zip(keys, row)) for row in zip(*columns)]
+
+    def decode_columns(
+        self, keys: typing.Sequence[str], entries: typing.Sequence[bytes], numpy=None
+    ) -> typing.Dict[str, typing.Sequence]:
+        """Decodes entries column by column skipping identity conversions.
+
+        Packed entries are decoded to numpy arrays without copying
+        if numpy module is passed.
+        """
+
+        packer, fields = self.get_layout(keys)
+        if numpy is not None and isinstance(entries, PackedEntries):
+            dtype = numpy.dtype(
+                [(f"f{i}", field.get_dtype()) for i, field in enumerate(fields)]
+            )
+            raws = numpy.frombuffer(entries.data, dtype=dtype)
+            return {
+                key: field.decode_array(raws[f"f{i}"], numpy)
+                for i, (key, field) in enumerate(zip(keys, fields))
+            }
+        if isinstance(entries, PackedEntries):
+            rows = list(packer.iter_unpack(entries.data))
+        else:
+            rows = [packer.unpack(entry) for entry in entries]
+        columns = _to_columns(keys, rows)
+        return {
+            key: list(field.decode_column(columns[key]))
+            for key, field in zip(keys, fields)
+        }
+
+    def first(self, keys: typing.Sequence[str], entry: bytes):
+        packer, fields = self.get_layout(keys[:1])
+        return fields[0].decode(packer.unpack_from(entry)[0])
+
+    def dump(
+        self, keys: typing.Sequence[str], entries: typing.Sequence[bytes]
+    ) -> bytes:
+        if not self.packed:
+            return entries
+        if isinstance(entries, PackedEntries):
+            return entries.data
+        return b"".join(entries)
+
+    def load(self, keys: typing.Sequence[str], stored) -> typing.Sequence[bytes]:
+        if not isinstance(stored, (bytes, bytearray)):
+            return stored
+        return PackedEntries(stored, self.get_layout(keys)[0].size)
@@ -0,0 +1,192 @@
+"""Vectorized matching of search query against decoded index columns.
+
+Equality, $in and range conditions are evaluated for whole columns at once:
+with numpy arrays when codec returns them, otherwise by C level map
+over column values. Rows failing any such condition are dropped
+before callable conditions and other operators are checked
+for the rest rows only.
+"""
+
+import collections.abc
+import functools
+import itertools
+import operator
+import types
+import typing
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+COLUMN_OPERATORS = {
+    "$gt": operator.lt,
+    "$gte": operator.le,
+    "$lt": operator.gt,
+    "$lte": operator.ge,
+    "$in": operator.contains,
+}
+"""Operators evaluated on columns as function(argument, value)."""
+
+NUMPY_OPERATORS = {
+    "$eq": operator.eq,
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+"""Operators evaluated on numpy arrays as function(array, argument)."""
+
+
+def is_operators(condition) -> bool:
+    """Checks if query condition is mapping of operators to arguments.
+
+    Default of match_columns is_operators: mapping with "$" prefixed keys only.
+    """
+
+    return (
+        isinstance(condition, collections.abc.Mapping)
+        and bool(condition)
+        and all(str(name).startswith("$") for name in condition)
+    )
+
+
+def split_query(
+    query: typing.Mapping,
+    is_index: bool = False,
+    is_operators: typing.Callable[[typing.Any], bool] = is_operators,
+) -> typing.Tuple[typing.List[tuple], typing.Dict[str, typing.Any]]:
+    """Splits query into column predicates and conditions checked per row.
+
+    :param dict query: search query.
+    :param bool is_index: compare equality with values converted to strings.
+    :param is_operators: function checking if condition is operators mapping,
+                         other conditions are compared for equality.
+    :return: list of (key, operator, argument) ordered equality first
+             and dict of rest conditions.
+    """
+
+    predicates, rest = [], {}
+    for key, condition in query.items():
+        if isinstance(condition, types.FunctionType):
+            rest[key] = condition
+        elif is_operators(condition):
+            if not all(
+                name in COLUMN_OPERATORS or name == "$between" for name in condition
+            ):
+                rest[key] = condition
+                continue
+            for name, argument in condition.items():
+                if name == "$between":
+                    predicates.append((key, "$gte", argument[0]))
+                    predicates.append((key, "$lte", argument[1]))
+                else:
+                    predicates.append((key, name, argument))
+        else:
+            predicates.append((key, "$eq", str(condition) if is_index else condition))
+    predicates.sort(key=lambda predicate: predicate[1] != "$eq")
+    return predicates, rest
+
+
+def match_columns(
+    query: typing.Mapping,
+    columns: typing.Mapping[str, typing.Sequence],
+    size: int,
+    match_operators: typing.Callable[[typing.Any, typing.Mapping], bool],
+    is_index: bool = False,
+    is_operators: typing.Callable[[typing.Any], bool] = is_operators,
+) -> typing.List[int]:
+    """Finds positions of rows matching query.
+
+    :param dict query: search query containing only columns keys.
+    :param columns: dict of key to column values.
+    :param int size: number of rows.
+    :param match_operators: function matching value against operators
+                            not supported by column predicates.
+    :param bool is_index: compare equality with values converted to strings.
+    :param is_operators: function checking if condition is operators mapping.
+    :return: sorted list of matching rows positions.
+    """
+
+    predicates, rest = split_query(query, is_index=is_index, is_operators=is_operators)
+    positions = None
+    for key, name, argument in predicates:
+        column = columns[key]
+        if positions is not None:
+            column = _take(column, positions)
+        mask = _get_mask(column, name, argument)
+        if numpy is not None and isinstance(mask, numpy.ndarray):
+            if positions is None:
+                positions = numpy.flatnonzero(mask).tolist()
+            else:
+                positions = numpy.asarray(positions)[mask].tolist()
+        else:
+            positions = list(
+                itertools.compress(
+                    range(size) if positions is None else positions, mask
+                )
+            )
+        if not positions:
+            return positions
+    if positions is None:
+        positions = list(range(size))
+    for key, condition in rest.items():
+        column = columns[key]
+        if isinstance(condition, types.FunctionType):
+            positions = [i for i in positions if condition(column[i])]
+        else:
+            positions = [i for i in positions if match_operators(column[i], condition)]
+    return positions
+
+
+def _take(column: typing.Sequence, positions: typing.List[int]) -> typing.Sequence:
+    if numpy is not None and isinstance(column, numpy.ndarray):
+        return column[positions]
+    return [column[i] for i in positions]
+
+
+def _get_mask(column: typing.Sequence, name: str, argument) -> typing.Iterable:
+    if numpy is not None and isinstance(column, numpy.ndarray):
+        mask = _get_numpy_mask(column, name, argument)
+        if mask is not None:
+            return mask
+        column = column.tolist()
+    if name == "$eq":
+        return map(functools.partial(operator.eq, argument), column)
+    if name == "$in":
+        argument = _as_container(argument)
+    predicate = functools.partial(COLUMN_OPERATORS[name], argument)
+    try:
+        return list(map(predicate, column))
+    except TypeError:
+        return [_safe_call(predicate, value) for value in column]
+
+
+def _get_numpy_mask(column, name: str, argument):
+    """Evaluates predicate on numeric numpy array. Returns None if it can't."""
+
+    if column.dtype.kind not in "biuf":
+        return None
+    arguments = argument if name == "$in" else [argument]
+    if not all(
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        for value in arguments
+    ):
+        return None
+    if name == "$in":
+        return numpy.isin(column, list(arguments))
+    return NUMPY_OPERATORS[name](column, argument)
+
+
+def _as_container(argument) -> typing.Container:
+    try:
+        return frozenset(argument)
+    except TypeError:
+        return tuple(argument)
+
+
+def _safe_call(predicate, value) -> bool:
+    try:
+        return predicate(value)
+    except TypeError:
+        return False
@@ -0,0 +1,86 @@
+import asyncio
+import contextlib
+import threading
+import typing
+import zlib
+
+
+class Versioned(typing.NamedTuple):
+    """Index data stored by compare-and-set writes.
+
+    Version is increased by every write, so COMPARE_AND_SET_METHOD
+    may compare versions only instead of whole index data.
+    Tuples compare versions first, so plain equality check is cheap too.
+    """
+
+    version: int
+    data: typing.Any
+
+
+class IndexConflictError(RuntimeError):
+    """Index was changed concurrently on every compare-and-set attempt."""
+
+
+def get_version(stored) -> int:
+    """Gets version of stored index data. Unversioned data has version 0."""
+
+    return stored.version if isinstance(stored, Versioned) else 0
+
+
+def unwrap(stored):
+    """Gets index data from stored value."""
+
+    return stored.data if isinstance(stored, Versioned) else stored
+
+
+class StripedLock:
+    """Fixed set of locks shared by keys with the same hash.
+
+    Serializes read-modify-write of each index key within process
+    while writes of different indexes, buckets and shards run in parallel
+    (unless their keys share stripe). Doesn't protect from other processes,
+    register Cache.COMPARE_AND_SET_METHOD for them.
+
+    Example:
+        Cache.register_index_locks(StripedLock(64))
+    """
+
+    def __init__(self, stripes: int = 64):
+        """
+        :param int stripes: number of locks.
+        """
+
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    def get(self, key: str) -> threading.Lock:
+        return self.locks[zlib.crc32(key.encode()) % len(self.locks)]
+
+    @contextlib.contextmanager
+    def locked(self, key: str):
+        with self.get(key):
+            yield
+
+
+class AsyncStripedLock:
+    """asyncio version of StripedLock serializing index rewrites of coroutines.
+
+    Locks are created on first use, so instance must be used by single event loop.
+
+    Example:
+        AsyncCache.register_index_locks(AsyncStripedLock(64))
+    """
+
+    def __init__(self, stripes: int = 64):
+        """
+        :param int stripes: number of locks.
+        """
+
+        self.stripes = stripes
+        self.locks = {}
+
+    def get(self, key: str) -> asyncio.Lock:
+        stripe = zlib.crc32(key.encode()) % self.stripes
+        lock = self.locks.get(stripe)
+        if lock is None:
+            lock = self.locks[stripe] = asyncio.Lock()
+        return lock
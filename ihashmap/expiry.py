@@ -0,0 +1,241 @@
+import collections.abc
+import logging
+import threading
+import time
+import typing
+
+from ihashmap.cache import Cache, PipelineContext
+from ihashmap.index import SortedIndex
+
+logger = logging.getLogger(__name__)
+
+EXPIRES_AT = "_expires_at"
+"""Value key storing expiration time in seconds since epoch."""
+
+
+class ExpiryIndex(SortedIndex, abstract=True):
+    """Index of values expiration times. Values without expiration time are skipped.
+
+    Declared for cache by Expiry.track.
+    """
+
+    keys = [EXPIRES_AT, Cache.PRIMARY_KEY]
+    partial = True
+
+    @classmethod
+    def get_changes(
+        cls,
+        old_value: typing.Optional[typing.Mapping],
+        new_value: typing.Optional[typing.Mapping],
+    ) -> typing.Dict[typing.Optional[str], typing.Tuple[list, list]]:
+        return super().get_changes(
+            *(
+                value if get_expiration(value) is not None else None
+                for value in (old_value, new_value)
+            )
+        )
+
+
+class Expiry:
+    """Expiration of cached values.
+
+    Values of tracked caches expire at time stored under EXPIRES_AT key,
+    set by caller (see Expiry.set_ttl) or stamped on write from cache ttl
+    if missing. Expired values are hidden from reads and searches at once
+    and removed with their index entries by Expiry.sweep, which finds them
+    in ExpiryIndex and deletes them with delete_many in batches.
+    Call sweep periodically or start background sweeper.
+
+    Searches answered by index entries only (see Cache.search projection)
+    may return expired values until they are swept.
+    AsyncCache doesn't hide expired values.
+
+    Example:
+        expiry = Expiry()
+        expiry.track("my_cache", ttl=3600)
+        Cache.register_expiry(expiry)
+        expiry.start(interval=10)
+    """
+
+    def __init__(
+        self,
+        cache: typing.Optional[Cache] = None,
+        batch_size: typing.Optional[int] = None,
+        clock: typing.Callable[[], float] = time.time,
+    ):
+        """
+        :param cache: cache used to delete expired values, new Cache by default.
+        :param batch_size: number of values deleted at once, Cache.CHUNK_SIZE by default.
+        :param clock: function returning current time in seconds since epoch.
+        """
+
+        self.cache = cache if cache is not None else Cache()
+        self.batch_size = batch_size or self.cache.CHUNK_SIZE
+        self.clock = clock
+        self.ttls = {}
+        self.indexes = {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def track(self, name: str, ttl: typing.Optional[float] = None):
+        """Declares ExpiryIndex of cache and sets its default time to live.
+
+        Values stored before cache is tracked are not in ExpiryIndex
+        until they are written again or index is built by IndexBuilder.
+
+        :param str name: cache name.
+        :param ttl: seconds values written without EXPIRES_AT live,
+                    None to keep them forever.
+        """
+
+        if name not in self.indexes:
+            self.indexes[name] = type(
+                f"ExpiryIndex_{name}", (ExpiryIndex,), {"cache_name": name}
+            )
+        self.ttls[name] = ttl
+
+    def set_ttl(
+        self, value: typing.MutableMapping, ttl: float
+    ) -> typing.MutableMapping:
+        """Sets value expiration time ttl seconds from now. Write value to apply it."""
+
+        value[EXPIRES_AT] = self.clock() + ttl
+        return value
+
+    def is_expired(self, name: str, value, now: typing.Optional[float] = None) -> bool:
+        """Checks if value of tracked cache has expired."""
+
+        if name not in self.indexes:
+            return False
+        expires_at = get_expiration(value)
+        if expires_at is None:
+            return False
+        return expires_at <= (self.clock() if now is None else now)
+
+    def stamp(self, name: str, values: typing.Iterable):
+        """Sets expiration time of written values without EXPIRES_AT key from cache ttl.
+
+        Values with EXPIRES_AT set to None never expire.
+        """
+
+        ttl = self.ttls.get(name)
+        if ttl is None:
+            return
+        expires_at = self.clock() + ttl
+        for value in values:
+            if isinstance(value, collections.abc.MutableMapping) and (
+                EXPIRES_AT not in value
+            ):
+                value[EXPIRES_AT] = expires_at
+
+    def find_expired(
+        self, name: str, now: typing.Optional[float] = None
+    ) -> typing.List[tuple]:
+        """Finds ExpiryIndex entries of values expired by now."""
+
+        index = self.indexes[name]
+        index_data = index.get(name)
+        now = self.clock() if now is None else now
+        _, stop = index.get_range(index_data, {"$lte": now})
+        return list(index_data[:stop])
+
+    def sweep(
+        self, name: typing.Optional[str] = None, now: typing.Optional[float] = None
+    ) -> int:
+        """Deletes expired values with their index entries.
+
+        Values found by ExpiryIndex are read and deleted only if they are still
+        expired, so values written again with later expiration time are kept.
+        Remaining found entries (of such values, earlier writes of deleted values
+        and values missing in storage) are removed from ExpiryIndex.
+
+        :param name: cache name, all tracked caches by default.
+        :param now: time values expired by, current time by default.
+        :return: number of deleted values.
+        """
+
+        now = self.clock() if now is None else now
+        deleted = 0
+        for name in [name] if name is not None else list(self.indexes):
+            index = self.indexes[name]
+            entries = self.find_expired(name, now)
+            if not entries:
+                continue
+            expired = 0
+            for start in range(0, len(entries), self.batch_size):
+                stop = start + self.batch_size
+                keys = list(
+                    dict.fromkeys(
+                        index.codec.decode(index.keys, entry)[Cache.PRIMARY_KEY]
+                        for entry in entries[start:stop]
+                    )
+                )
+                keys = [
+                    key
+                    for key, value in zip(keys, self.cache._get_many(name, keys))
+                    if self.is_expired(name, value, now)
+                ]
+                if keys:
+                    self.cache.delete_many(name, keys)
+                    expired += len(keys)
+            stale = set(index.get(name)).intersection(entries)
+            if stale:
+                index.apply_changes(name, removed=stale)
+            deleted += expired
+            metrics = Cache.METRICS
+            if metrics is not None:
+                metrics.increment("expired_values_total", {"cache": name}, expired)
+        return deleted
+
+    def start(self, interval: float = 1.0):
+        """Starts daemon thread sweeping all tracked caches every interval seconds."""
+
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(interval,), name="ihashmap-expiry", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stops background sweeper and waits for current sweep."""
+
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, interval: float):
+        while not self._stopped.wait(interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Expired values sweep failed")
+
+
+def get_expiration(value) -> typing.Optional[float]:
+    """Gets value expiration time or None if value doesn't expire."""
+
+    if not isinstance(value, collections.abc.Mapping):
+        return None
+    return value.get(EXPIRES_AT)
+
+
+@Cache.PIPELINE.set.before(priority=0)
+@Cache.PIPELINE.update.before(priority=0)
+def stamp_value(ctx: PipelineContext):
+    """Sets expiration time of written value before index hooks see it."""
+
+    expiry = ctx.cls_or_self.EXPIRY
+    if expiry is not None:
+        expiry.stamp(ctx.name, ctx.args[1:2])
+
+
+@Cache.PIPELINE.set_many.before(priority=0)
+@Cache.PIPELINE.update_many.before(priority=0)
+def stamp_values(ctx: PipelineContext):
+    expiry = ctx.cls_or_self.EXPIRY
+    if expiry is not None:
+        expiry.stamp(ctx.name, ctx.args[0].values())
@@ -1,8 +1,20 @@
 import bisect
-import collections
+import collections.abc
+import heapq
+import random
+import sys
+import time
+import types
 import typing
+import zlib
 
+from ihashmap import columnar
 from ihashmap.cache import Cache, PipelineContext
+from ihashmap.codec import IndexCodec, StringCodec, TupleCodec
+from ihashmap.concurrency import IndexConflictError, Versioned, get_version, unwrap
+from ihashmap.tracking import get_changed_keys, get_original, take_snapshot
+
+_MISSING = object()
 
 
 class IndexContainer(collections.UserList):
@@ -12,6 +24,50 @@ class IndexContainer(collections.UserList):
     def insert(self, i: int, item) -> None:
         bisect.insort(self.data, item)
 
+    def add(self, item) -> None:
+        """Inserts item keeping container sorted. Existing items are skipped."""
+
+        position = bisect.bisect_left(self.data, item)
+        if position == len(self.data) or self.data[position] != item:
+            self.data.insert(position, item)
+
+    def discard(self, item) -> None:
+        """Removes item from container if present."""
+
+        position = bisect.bisect_left(self.data, item)
+        if position < len(self.data) and self.data[position] == item:
+            del self.data[position]
+
+
+class IndexStats:
+    """Index cardinality statistics collected by current process.
+
+    Used by query planner to estimate conditions selectivity.
+    """
+
+    def __init__(self, unique: bool = False):
+        self.unique = unique
+        self.entries = 0
+        self.values = collections.Counter()
+
+    @property
+    def distinct(self) -> int:
+        """Number of distinct indexed values."""
+
+        return self.entries if self.unique else len(self.values)
+
+    def add(self, value, count: int = 1):
+        self.entries += count
+        if not self.unique and count:
+            self.values[value] += count
+
+    def remove(self, value, count: int = 1):
+        self.entries = max(self.entries - count, 0)
+        if not self.unique and count and value in self.values:
+            self.values[value] -= count
+            if self.values[value] <= 0:
+                del self.values[value]
+
 
 class Index:
     """Sub-mapping representation that is stored separately for quick search."""
@@ -20,9 +76,62 @@ class Index:
     cache_name: str = None
     keys: typing.List[str]
 
+    codec: IndexCodec = StringCodec()
+    """Converts values to stored index entries and back. See ihashmap.codec."""
+
+    typed: bool = False
+    """Index entries keep original values types. Defined by codec.
+    String entries of untyped index can't be compared with operators."""
+
+    packed: bool = False
+    """Index entries are stored as single object. Defined by codec."""
+
+    exact: bool = True
+    """Index entries keep values of keys unchanged, so search results
+    may be built from entries of typed index without fetching values."""
+
+    partial: bool = False
+    """Index skips some values, so search uses it only for queries on its keys
+    which skipped values can't match."""
+
+    bucketed: bool = False
+    """Store primary keys in separate buckets keyed by other index keys values.
+    Equality search on all bucket keys then reads single bucket only."""
+
+    shards: int = 1
+    """Number of keys index entries are spread over, see Index.get_shard.
+    Writes of single value touch one shard only, reads fetch all shards at once.
+    Bucketed indexes are already split by buckets and can't be sharded."""
+
+    requires_build: bool = False
+    """Index is declared for already cached values. Search ignores it until
+    ihashmap.builder.IndexBuilder fills it."""
+
+    CAS_RETRIES: int = 10
+    CAS_BACKOFF: float = 0.001
+    """Compare-and-set attempts of index rewrite and initial backoff in seconds
+    doubled by every attempt. See Index.modify."""
+
+    MATCH_CHUNK_SIZE: int = 1024
+    """Number of entries matched at once by search with limit, so it stops
+    after enough values are found (and reads only needed snapshot pages)."""
+
+    RANGE_SELECTIVITY: float = 1 / 3
+    CALLABLE_SELECTIVITY: float = 1 / 2
+    """Estimated fraction of values matching operator or function condition."""
+
     __INDEXES__ = {}
     """Storage for all existing indexes."""
 
+    __STATS__ = {}
+    """Storage for indexes statistics by index and cache name."""
+
+    __INDEXED_KEYS__ = {}
+    """Keys used by all indexes of cache name."""
+
+    __READY__ = {}
+    """Known readiness of indexes by index and cache name. See Index.is_ready."""
+
     HOOKS = [
         ("before_create", Cache.PIPELINE.set.before),
         ("after_create", Cache.PIPELINE.set.after),
@@ -32,40 +141,408 @@ class Index:
         ("after_update", Cache.PIPELINE.update.after),
         ("before_delete", Cache.PIPELINE.delete.before),
         ("after_delete", Cache.PIPELINE.delete.after),
+        ("before_create_many", Cache.PIPELINE.set_many.before),
+        ("after_create_many", Cache.PIPELINE.set_many.after),
+        ("before_update_many", Cache.PIPELINE.update_many.before),
+        ("after_update_many", Cache.PIPELINE.update_many.after),
+        ("before_delete_many", Cache.PIPELINE.delete_many.before),
+        ("after_delete_many", Cache.PIPELINE.delete_many.after),
     ]
 
-    def __init_subclass__(cls, **kwargs):
+    def __init_subclass__(cls, abstract=False, **kwargs):
+        cls.typed = cls.codec.typed
+        cls.packed = cls.codec.packed and not cls.bucketed
+        if cls.bucketed and cls.shards > 1:
+            raise TypeError(f"{cls.__name__} can't be both bucketed and sharded")
+        if abstract:
+            return
+
         if cls.cache_name is not None:
             cls.__INDEXES__.setdefault(cls.cache_name, []).append(cls)
         else:
             cls.__INDEXES__.setdefault("__global__", []).append(cls)
+        cls.__INDEXED_KEYS__.clear()
 
         for hook, pipe_wrapper in cls.HOOKS:
             if hasattr(cls, hook):
                 hook_action = getattr(cls, hook)
                 setattr(cls, hook, pipe_wrapper(cache_name=cls.cache_name)(hook_action))
 
-        # TODO: rebuild index?
+        # Values cached before index declaration are indexed by IndexBuilder.
 
     @classmethod
-    def get_name(cls, cache_name):
-        """Composes index name."""
+    def get_name(cls, cache_name, bucket=None, shard=None):
+        """Composes index name.
 
-        keys = "_".join(cls.keys)
-        return f"{cache_name}:{keys}"
+        Buckets and shards are stored under index name with suffix.
+        """
+
+        name = f"{cache_name}:{'_'.join(cls.keys)}"
+        if bucket is not None:
+            name = f"{name}:{bucket}"
+        if shard is not None:
+            name = f"{name}#{shard}"
+        return name
 
     @classmethod
-    def get_index(cls, value: typing.Mapping) -> str:
+    def is_sharded(cls, bucket=None, shard=None) -> bool:
+        """Checks if whole index is addressed and it is stored in several shards."""
+
+        return cls.shards > 1 and bucket is None and shard is None
+
+    @classmethod
+    def get_shard(cls, entry) -> int:
+        """Finds shard storing index entry.
+
+        Entries are distributed by primary key hash (or whole entry hash
+        if primary key isn't indexed), so all entries of value are stored
+        in same shard. Override to partition entries by ranges.
+
+        :param entry: index entry encoded by codec.
+        :return: shard number.
+        """
+
+        value = cls.codec.decode(cls.keys, entry)
+        key = value.get(Cache.PRIMARY_KEY, entry)
+        return zlib.crc32(str(key).encode()) % cls.shards
+
+    @classmethod
+    def split_shards(cls, entries: typing.Iterable) -> typing.Dict[int, list]:
+        """Groups index entries by shard keeping their order."""
+
+        shards = {}
+        for entry in entries:
+            shards.setdefault(cls.get_shard(entry), []).append(entry)
+        return shards
+
+    @classmethod
+    def split_changes(
+        cls, added: typing.Iterable, removed: typing.Iterable
+    ) -> typing.Dict[int, typing.Tuple[list, list]]:
+        """Groups added and removed entries by shard."""
+
+        changes = {}
+        for position, entries in enumerate((added, removed)):
+            for shard, shard_entries in cls.split_shards(entries).items():
+                changes.setdefault(shard, ([], []))[position].extend(shard_entries)
+        return changes
+
+    @classmethod
+    def merge_shards(cls, shards_data: typing.Iterable[typing.Sequence]):
+        """Merges sorted entries of all shards into single sorted index data."""
+
+        merged = list(heapq.merge(*shards_data))
+        if cls.packed:
+            return cls.load_entries(cls.dump_entries(merged))
+        return IndexContainer(merged)
+
+    @classmethod
+    def get_index(cls, value: typing.Mapping):
         """Cuts data from value for index storage.
 
         :param dict value: cached value.
-        :return: str: index in string format.
+        :return: index entry encoded by codec.
+        """
+
+        return cls.codec.encode(cls.keys, value)
+
+    @classmethod
+    def get_bucket_keys(cls) -> typing.List[str]:
+        """Keys composing bucket of bucketed index. All keys except primary key."""
+
+        return [key for key in cls.keys if key != Cache.PRIMARY_KEY] or list(cls.keys)
+
+    @classmethod
+    def get_bucket(cls, value: typing.Mapping) -> str:
+        """Composes name of bucket storing value primary key.
+
+        :param dict value: cached value.
+        :return: str: bucket in string format.
+        """
+
+        return ":".join(str(value[key]) for key in cls.get_bucket_keys())
+
+    @classmethod
+    def get_changes(
+        cls,
+        old_value: typing.Optional[typing.Mapping],
+        new_value: typing.Optional[typing.Mapping],
+    ) -> typing.Dict[typing.Optional[str], typing.Tuple[list, list]]:
+        """Computes index changes between two versions of value.
+
+        :param old_value: value before change or None if value is created.
+        :param new_value: value after change or None if value is deleted.
+        :return: dict of bucket (None for index itself) to added and removed entries.
+        """
+
+        changes = {}
+        for value, position in ((old_value, 1), (new_value, 0)):
+            if value is None:
+                continue
+            if cls.bucketed:
+                bucket, entry = cls.get_bucket(value), value[Cache.PRIMARY_KEY]
+            else:
+                bucket, entry = None, cls.get_index(value)
+            changes.setdefault(bucket, ([], []))[position].append(entry)
+        return {
+            bucket: (added, removed)
+            for bucket, (added, removed) in changes.items()
+            if added != removed
+        }
+
+    @classmethod
+    def merge_changes(
+        cls,
+        values: typing.Iterable[
+            typing.Tuple[
+                typing.Optional[typing.Mapping], typing.Optional[typing.Mapping]
+            ]
+        ],
+    ) -> typing.Dict[typing.Optional[str], typing.Tuple[list, list]]:
+        """Computes index changes for batch of (old_value, new_value) pairs."""
+
+        changes = {}
+        for old_value, new_value in values:
+            for bucket, (added, removed) in cls.get_changes(
+                old_value, new_value
+            ).items():
+                bucket_changes = changes.setdefault(bucket, ([], []))
+                bucket_changes[0].extend(added)
+                bucket_changes[1].extend(removed)
+        return changes
+
+    @classmethod
+    def write_changes(
+        cls,
+        cache_name: str,
+        changes: typing.Dict[typing.Optional[str], typing.Tuple[list, list]],
+        batch: bool = False,
+    ):
+        """Writes index changes computed by get_changes or merge_changes.
+
+        Single changes are written using Index.add and Index.remove,
+        batches using single read and single write per index (or bucket).
+        Buckets are added to bucketed index on first entry
+        and removed from it when they become empty.
+
+        :param str cache_name: cache name.
+        :param changes: index changes.
+        :param bool batch: write changes using Index.apply_changes.
+        """
+
+        buckets_added, buckets_removed = [], []
+        for bucket, (added, removed) in changes.items():
+            is_empty = cls._write_entries(cache_name, added, removed, bucket, batch)
+            cls._update_stats(cache_name, bucket, added, removed)
+            if bucket is None:
+                continue
+            if added:
+                buckets_added.append(bucket)
+            elif is_empty:
+                buckets_removed.append(bucket)
+        if buckets_added or buckets_removed:
+            cls.write_changes(
+                cache_name, {None: (buckets_added, buckets_removed)}, batch=batch
+            )
+
+    @classmethod
+    def write_context_changes(
+        cls,
+        ctx: PipelineContext,
+        changes: typing.Dict[typing.Optional[str], typing.Tuple[list, list]],
+        batch: bool = False,
+    ):
+        """Writes index changes made by pipeline execution.
+
+        Changes made while Cache.batch is flushed are merged into it
+        and written once per index after all values are written.
+        """
+
+        unit_of_work = getattr(ctx.cls_or_self, "_batch", None)
+        if unit_of_work is not None and unit_of_work.flushing:
+            unit_of_work.add_index_changes(cls, ctx.name, changes)
+        else:
+            cls.write_changes(ctx.name, changes, batch=batch)
+
+    @classmethod
+    def _write_entries(cls, cache_name, added, removed, bucket, batch, shard=None):
+        """Writes entries changes of index, its bucket or shard.
+
+        Changes of sharded index are written to changed shards only.
+
+        :return: True if bucket is empty after changes.
+        """
+
+        if cls.is_sharded(bucket, shard):
+            for shard, (shard_added, shard_removed) in cls.split_changes(
+                added, removed
+            ).items():
+                cls._write_entries(
+                    cache_name, shard_added, shard_removed, bucket, batch, shard=shard
+                )
+            return False
+        if batch:
+            index_data = cls.apply_changes(
+                cache_name, added, removed, bucket=bucket, shard=shard
+            )
+        else:
+            for entry in removed:
+                cls.remove(cache_name, entry, bucket=bucket, shard=shard)
+            for entry in added:
+                cls.add(cache_name, entry, bucket=bucket, shard=shard)
+            if bucket is None or added:
+                return False
+            index_data = cls.get(cache_name, bucket=bucket)
+        return not index_data
+
+    @classmethod
+    def get_stats(cls, cache_name: str, refresh: bool = False) -> IndexStats:
+        """Gets index statistics. Reads whole index when called first time.
+
+        Statistics are kept up to date by writes made in current process.
+
+        :param str cache_name: cache name.
+        :param bool refresh: recollect statistics from stored index.
+        """
+
+        stats = cls.__STATS__.get((cls, cache_name))
+        if stats is not None and not refresh:
+            return stats
+        index_data = cls.get(cache_name)
+        buckets_data = None
+        if cls.bucketed:
+            index_data = list(index_data)
+            buckets_data = cls.get_many(cache_name, index_data)
+        stats = cls.create_stats(index_data, buckets_data)
+        cls.set_stats(cache_name, stats)
+        return stats
+
+    @classmethod
+    def has_stats(cls, cache_name: str) -> bool:
+        return (cls, cache_name) in cls.__STATS__
+
+    @classmethod
+    def set_stats(cls, cache_name: str, stats: IndexStats):
+        cls.__STATS__[(cls, cache_name)] = stats
+
+    @classmethod
+    def drop_stats(cls, cache_name: str):
+        """Forgets statistics, they are recollected on next usage."""
+
+        cls.__STATS__.pop((cls, cache_name), None)
+
+    @classmethod
+    def get_build_name(cls, cache_name: str) -> str:
+        """Composes name of stored IndexBuilder state."""
+
+        return f"{cls.get_name(cache_name)}@build"
+
+    @classmethod
+    def is_ready(cls, cache_name: str, read: bool = True) -> bool:
+        """Checks if index contains all cached values and can be used by search.
+
+        Index is not ready while IndexBuilder fills it, or until it does
+        if index requires_build. Ready state is remembered by process,
+        otherwise build state is read on every check.
+
+        :param str cache_name: cache name.
+        :param bool read: read build state from storage unless index is known to be ready.
+        """
+
+        ready = cls.__READY__.get((cls, cache_name))
+        if ready or not read:
+            return bool(ready)
+        state = Cache._read(Cache, cls.INDEX_CACHE_NAME, cls.get_build_name(cache_name))
+        return cls.set_build_state(cache_name, state)
+
+    @classmethod
+    def set_build_state(
+        cls, cache_name: str, state: typing.Optional[typing.Mapping]
+    ) -> bool:
+        """Remembers readiness of index from stored IndexBuilder state.
+
+        :param str cache_name: cache name.
+        :param state: stored build state or None if index was never built.
+        :return: True if index is ready.
         """
 
-        values = []
-        for key in cls.keys:
-            values.append(value[key])
-        return ":".join(str(value) for value in values)
+        if state is None:
+            ready = not cls.requires_build
+        else:
+            ready = state["status"] == "ready"
+        cls.__READY__[(cls, cache_name)] = ready
+        return ready
+
+    @classmethod
+    def create_stats(
+        cls,
+        index_data: typing.Sequence,
+        buckets_data: typing.Optional[typing.List[typing.Sequence]] = None,
+    ) -> IndexStats:
+        """Collects statistics from stored index data.
+
+        :param index_data: stored index entries (buckets for bucketed index).
+        :param buckets_data: primary keys stored in every bucket.
+        """
+
+        stats = IndexStats(unique=Cache.PRIMARY_KEY in cls.get_bucket_keys())
+        if cls.bucketed:
+            for bucket, primary_keys in zip(index_data, buckets_data):
+                stats.add(bucket, len(primary_keys))
+        else:
+            for value in cls.get_values(index_data):
+                stats.add(cls._get_stats_value(value))
+        return stats
+
+    @classmethod
+    def _get_stats_value(cls, value: typing.Mapping):
+        return tuple(value[key] for key in cls.get_bucket_keys())
+
+    @classmethod
+    def _update_stats(cls, cache_name, bucket, added, removed):
+        stats = cls.__STATS__.get((cls, cache_name))
+        if stats is None:
+            return
+        if bucket is not None:
+            stats.add(bucket, len(added))
+            stats.remove(bucket, len(removed))
+        elif not cls.bucketed:
+            for value in cls.get_values(added):
+                stats.add(cls._get_stats_value(value))
+            for value in cls.get_values(removed):
+                stats.remove(cls._get_stats_value(value))
+
+    @classmethod
+    def estimate(
+        cls, cache_name: str, query: typing.Mapping
+    ) -> typing.Tuple[float, float]:
+        """Estimates query selectivity and cost of finding matching index values.
+
+        :param str cache_name: cache name.
+        :param dict query: search query containing only index keys.
+        :return: fraction of values matching query and number of index entries read.
+        """
+
+        stats = cls.get_stats(cache_name)
+        bucket_keys = cls.get_bucket_keys()
+        selectivity, equal = 1.0, 0
+        for key, condition in query.items():
+            if isinstance(condition, types.FunctionType):
+                selectivity *= cls.CALLABLE_SELECTIVITY
+            elif Cache.is_operators(condition):
+                selectivity *= cls.RANGE_SELECTIVITY
+            elif key == Cache.PRIMARY_KEY and key not in bucket_keys:
+                selectivity /= max(stats.entries, 1)
+            else:
+                equal += 1
+        if equal:
+            selectivity *= max(stats.distinct, 1) ** -(equal / len(bucket_keys))
+
+        if not cls.bucketed:
+            return selectivity, stats.entries
+        if equal == len(bucket_keys):
+            return selectivity, 1 + stats.entries * selectivity
+        return selectivity, stats.distinct + stats.entries * selectivity
 
     @classmethod
     def before_create(cls, ctx: PipelineContext):
@@ -83,27 +560,19 @@ class Index:
         """
 
         value = ctx.local_data["original_value"]
-        index_data = set(cls.get(ctx.name))
-        index_data.add(cls.get_index(value))
-        index_data = IndexContainer(index_data)
-        cls.set(ctx.name, index_data)
+        cls.write_context_changes(ctx, cls.get_changes(None, value))
 
     @classmethod
     def before_delete(cls, ctx: PipelineContext):
-        """Saves cache name for future use in pipeline.
+        """Gets deleted value once for all indexes for after_delete usage.
 
         :param ctx: PipelineManager context.
         """
 
-        (key,) = ctx.args
-        cache = ctx.cls_or_self
-        value = cache._get(ctx.name, key)
-        keys = []
-        for index_key in cls.keys:
-            keys.append(str(value.__shadow_copy__[index_key]))
-        ctx.local_data.setdefault("before_delete", {})[cls.__name__] = {
-            "keys": ":".join(keys)
-        }
+        if "original_value" not in ctx.local_data:
+            (key,) = ctx.args
+            cache = ctx.cls_or_self
+            ctx.local_data["original_value"] = cache._get(ctx.name, key)
 
     @classmethod
     def after_delete(cls, ctx: PipelineContext):
@@ -112,35 +581,158 @@ class Index:
         :param dict ctx: PipelineManager context.
         """
 
-        index_data = set(cls.get(ctx.name))
-        index_data.remove(ctx.local_data["before_delete"][cls.__name__]["keys"])
-        index_data = IndexContainer(index_data)
-        cls.set(ctx.name, index_data)
+        value = ctx.local_data["original_value"]
+        if value is not None:
+            cls.write_context_changes(ctx, cls.get_changes(value, None))
 
     @classmethod
     def before_update(cls, ctx: PipelineContext):
-        """Creates value copy for after_update usage."""
+        """Finds previous indexed fields and changed keys once for all indexes.
 
+        Previous fields are taken from value snapshot (see ihashmap.tracking)
+        or read from storage if value has none.
+        """
+
+        if "previous_value" in ctx.local_data:
+            return
         key, value = ctx.args
+        previous = get_original(value)
+        if previous is None:
+            previous = ctx.cls_or_self._get(ctx.name, key)
         ctx.local_data["original_value"] = value
+        ctx.local_data["previous_value"] = previous
+        ctx.local_data["changed_keys"] = cls.get_changed_keys(ctx.name, previous, value)
 
     @classmethod
     def after_update(cls, ctx: PipelineContext):
-        """Updates index based on pipeline context.
+        """Updates index if any of its keys was changed.
 
         :param dict ctx: PipelineManager context.
         """
 
-        value = ctx.local_data["original_value"]
-        if cls.get_index(value.__shadow_copy__) != cls.get_index(ctx.result):
-            index_data = set(cls.get(ctx.name))
-            try:
-                index_data.remove(cls.get_index(value.__shadow_copy__))
-            except ValueError:
-                pass
-            index_data.add(cls.get_index(ctx.result))
-            index_data = IndexContainer(index_data)
-            cls.set(ctx.name, index_data)
+        if cls.is_unchanged(ctx.local_data["changed_keys"]):
+            return
+        previous, value = (
+            ctx.local_data["previous_value"],
+            ctx.local_data["original_value"],
+        )
+        cls.write_context_changes(ctx, cls.get_changes(previous, value))
+
+    @classmethod
+    def before_create_many(cls, ctx: PipelineContext):
+        """Stores original values for after_create_many usage."""
+
+        (values,) = ctx.args
+        ctx.local_data["original_values"] = values
+
+    @classmethod
+    def after_create_many(cls, ctx: PipelineContext):
+        """Adds index entries for all created values at once.
+
+        :param ctx: PipelineManager context.
+        """
+
+        values = ctx.local_data["original_values"]
+        changes = cls.merge_changes((None, value) for value in values.values())
+        cls.write_context_changes(ctx, changes, batch=True)
+
+    @classmethod
+    def before_update_many(cls, ctx: PipelineContext):
+        """Batch version of before_update.
+
+        Values without snapshots are read from storage with single batch read.
+        """
+
+        if "previous_values" in ctx.local_data:
+            return
+        (values,) = ctx.args
+        previous = {key: get_original(value) for key, value in values.items()}
+        missing = [key for key, value in previous.items() if value is None]
+        if missing:
+            previous.update(zip(missing, ctx.cls_or_self._get_many(ctx.name, missing)))
+        ctx.local_data["original_values"] = values
+        ctx.local_data["previous_values"] = previous
+        ctx.local_data["changed_keys"] = {
+            key: cls.get_changed_keys(ctx.name, previous[key], value)
+            for key, value in values.items()
+        }
+
+    @classmethod
+    def after_update_many(cls, ctx: PipelineContext):
+        """Updates index entries of all values with changed index keys at once.
+
+        :param ctx: PipelineManager context.
+        """
+
+        values = ctx.local_data["original_values"]
+        previous = ctx.local_data["previous_values"]
+        changes = cls.merge_changes(
+            (previous[key], value)
+            for key, value in values.items()
+            if not cls.is_unchanged(ctx.local_data["changed_keys"][key])
+        )
+        if changes:
+            cls.write_context_changes(ctx, changes, batch=True)
+
+    @classmethod
+    def get_indexed_keys(cls, cache_name: str) -> typing.FrozenSet[str]:
+        """Finds keys used by all indexes of cache including primary key."""
+
+        keys = cls.__INDEXED_KEYS__.get(cache_name)
+        if keys is None:
+            keys = {Cache.PRIMARY_KEY}
+            for index in cls.find_index_for_cache(cache_name):
+                keys.update(index.keys)
+            keys = cls.__INDEXED_KEYS__[cache_name] = frozenset(keys)
+        return keys
+
+    @classmethod
+    def get_changed_keys(
+        cls,
+        cache_name: str,
+        previous: typing.Optional[typing.Mapping],
+        value: typing.Mapping,
+    ) -> typing.Optional[typing.Set[str]]:
+        """Finds changed indexed keys of value.
+
+        :return: set of keys or None if previous value is unknown.
+        """
+
+        if previous is None:
+            return None
+        return get_changed_keys(previous, value, cls.get_indexed_keys(cache_name))
+
+    @classmethod
+    def is_unchanged(cls, changed_keys: typing.Optional[typing.Set[str]]) -> bool:
+        """Checks if none of index keys is in changed keys found by get_changed_keys."""
+
+        return changed_keys is not None and changed_keys.isdisjoint(cls.keys)
+
+    @classmethod
+    def before_delete_many(cls, ctx: PipelineContext):
+        """Gets deleted values once per batch for after_delete_many usage.
+
+        :param ctx: PipelineManager context.
+        """
+
+        if "original_values" not in ctx.local_data:
+            (keys,) = ctx.args
+            keys = list(keys)
+            values = ctx.cls_or_self._get_many(ctx.name, keys)
+            ctx.local_data["original_values"] = dict(zip(keys, values))
+
+    @classmethod
+    def after_delete_many(cls, ctx: PipelineContext):
+        """Removes index entries of all deleted values at once.
+
+        :param ctx: PipelineManager context.
+        """
+
+        values = ctx.local_data["original_values"]
+        changes = cls.merge_changes(
+            (value, None) for value in values.values() if value is not None
+        )
+        cls.write_context_changes(ctx, changes, batch=True)
 
     @classmethod
     def find_index_for_cache(cls, cache_name: str) -> typing.List["Index"]:
@@ -164,25 +756,476 @@ class Index:
         :return: list of dicts with index data.
         """
 
-        return [dict(zip(cls.keys, value.split(":"))) for value in index_data]
+        return cls.codec.decode_many(cls.keys, index_data)
+
+    @classmethod
+    def can_match(cls, key: str, condition) -> bool:
+        """Checks if index data is enough to evaluate query condition.
+
+        :param str key: query key.
+        :param condition: query value.
+        """
+
+        if key not in cls.keys:
+            return False
+        return cls.typed or not Cache.is_operators(condition)
+
+    @classmethod
+    def get_order_key(cls) -> typing.Optional[str]:
+        """Key by which values returned from Index.find are ordered."""
+
+        return None
+
+    @classmethod
+    def find(
+        cls,
+        cache_name: str,
+        query: typing.Mapping,
+        reverse: bool = False,
+        limit: typing.Optional[int] = None,
+    ) -> typing.List[dict]:
+        """Finds index values matching query.
+
+        Bucketed index answers equality query on all bucket keys
+        by reading single bucket.
+
+        :param str cache_name: cache name.
+        :param dict query: search query containing only index keys.
+        :param bool reverse: return values in reversed order.
+        :param limit: maximum number of values.
+        :return: list of dicts with index data.
+        """
+
+        if not cls.bucketed:
+            return cls.match(query, cls.get(cache_name), reverse=reverse, limit=limit)
+        buckets = cls.get_query_buckets(query)
+        if buckets is None:
+            buckets = cls.filter_buckets(query, cls.get(cache_name))
+        buckets_data = cls.get_many(cache_name, buckets)
+        return cls.match_buckets(
+            query, buckets, buckets_data, reverse=reverse, limit=limit
+        )
+
+    @classmethod
+    def match(
+        cls,
+        query: typing.Mapping,
+        index_data: typing.Sequence,
+        reverse: bool = False,
+        limit: typing.Optional[int] = None,
+    ) -> typing.List[dict]:
+        """Matches stored index entries against query.
+
+        :param dict query: search query containing only index keys.
+        :param index_data: stored index entries.
+        :param bool reverse: return values in reversed order.
+        :param limit: maximum number of values.
+        :return: list of dicts with index data.
+        """
+
+        size = len(index_data)
+        if limit is None or size <= cls.MATCH_CHUNK_SIZE:
+            return cls._match_chunk(query, index_data, reverse, limit)
+        result = []
+        for start in range(0, size, cls.MATCH_CHUNK_SIZE):
+            stop = min(start + cls.MATCH_CHUNK_SIZE, size)
+            if reverse:
+                start, stop = size - stop, size - start
+            chunk = index_data[start:stop]
+            result.extend(cls._match_chunk(query, chunk, reverse, limit - len(result)))
+            if len(result) >= limit:
+                break
+        return result
+
+    @classmethod
+    def _match_chunk(cls, query, index_data, reverse, limit):
+        if not query:
+            result = cls.get_values(index_data)
+            if reverse:
+                result.reverse()
+            return result[:limit]
+        positions = cls.match_positions(query, index_data)
+        if reverse:
+            positions.reverse()
+        return [cls.codec.decode(cls.keys, index_data[i]) for i in positions[:limit]]
+
+    @classmethod
+    def match_positions(
+        cls, query: typing.Mapping, index_data: typing.Sequence
+    ) -> typing.List[int]:
+        """Finds positions of index entries matching query.
+
+        Entries are decoded to columns and conditions are evaluated
+        column by column, see ihashmap.columnar.
+
+        :param dict query: search query containing only index keys.
+        :param index_data: stored index entries.
+        :return: sorted list of positions.
+        """
+
+        columns = cls.codec.decode_columns(cls.keys, index_data, numpy=columnar.numpy)
+        return columnar.match_columns(
+            query,
+            columns,
+            len(index_data),
+            Cache._match_operators,
+            is_index=not cls.typed,
+            is_operators=Cache.is_operators,
+        )
+
+    @classmethod
+    def get_query_buckets(cls, query: typing.Mapping) -> typing.Optional[list]:
+        """Composes buckets of bucketed index from equality query.
+
+        :param dict query: search query containing only index keys.
+        :return: list of buckets or None if query doesn't define all bucket keys.
+        """
+
+        bucket_keys = cls.get_bucket_keys()
+        for key in bucket_keys:
+            if (
+                key not in query
+                or isinstance(query[key], types.FunctionType)
+                or Cache.is_operators(query[key])
+            ):
+                return None
+        return [":".join(str(query[key]) for key in bucket_keys)]
+
+    @classmethod
+    def filter_buckets(
+        cls, query: typing.Mapping, buckets: typing.Iterable[str]
+    ) -> typing.List[str]:
+        """Finds buckets of bucketed index which values may match query.
+
+        :param dict query: search query containing only index keys.
+        :param buckets: all existing buckets.
+        """
+
+        bucket_keys = cls.get_bucket_keys()
+        bucket_query = {
+            key: value for key, value in query.items() if key in bucket_keys
+        }
+        return [
+            bucket
+            for bucket in buckets
+            if Cache._match_query(
+                dict(zip(bucket_keys, bucket.split(":"))), bucket_query, is_index=True
+            )
+        ]
+
+    @classmethod
+    def match_buckets(
+        cls,
+        query: typing.Mapping,
+        buckets: typing.List[str],
+        buckets_data: typing.List[typing.Sequence],
+        reverse: bool = False,
+        limit: typing.Optional[int] = None,
+    ) -> typing.List[dict]:
+        """Matches primary keys stored in buckets against query.
+
+        :param dict query: search query containing only index keys.
+        :param buckets: buckets names.
+        :param buckets_data: primary keys stored in every bucket.
+        :param bool reverse: return values in reversed order.
+        :param limit: maximum number of values.
+        :return: list of dicts with index data.
+        """
+
+        bucket_keys = cls.get_bucket_keys()
+        result = []
+        for bucket, primary_keys in zip(buckets, buckets_data):
+            bucket_value = dict(zip(bucket_keys, bucket.split(":")))
+            for primary_key in primary_keys:
+                value = dict(bucket_value)
+                value[Cache.PRIMARY_KEY] = primary_key
+                if Cache._match_query(value, query, is_index=True):
+                    result.append(value)
+        if reverse:
+            result.reverse()
+        return result[:limit]
 
     @classmethod
     @Cache.PIPELINE.index_get
-    def get(cls, cache_name):
-        return Cache.GET_METHOD(
+    def get(cls, cache_name, bucket=None, shard=None):
+        if cls.is_sharded(bucket, shard):
+            return cls.merge_shards(cls.get_shards(cache_name))
+        cls.count_operation("index_reads_total")
+        return cls.load_entries(
+            Cache._read(
+                Cache,
+                cls.INDEX_CACHE_NAME,
+                cls.get_name(cache_name, bucket, shard),
+                default=IndexContainer(),
+            ),
+            bucket=bucket,
+        )
+
+    @classmethod
+    def get_shards(cls, cache_name) -> typing.List[typing.Sequence]:
+        """Gets entries of all shards at once using Cache.GET_MANY_METHOD if registered."""
+
+        cls.count_operation("index_reads_total")
+        stored = Cache._read_many(
+            Cache,
+            cls.INDEX_CACHE_NAME,
+            [cls.get_name(cache_name, shard=shard) for shard in range(cls.shards)],
+            default=IndexContainer(),
+        )
+        return [cls.load_entries(shard_data) for shard_data in stored]
+
+    @classmethod
+    @Cache.PIPELINE.index_get_many
+    def get_many(cls, cache_name, buckets: typing.List[str]) -> typing.List:
+        """Gets several buckets at once using Cache.GET_MANY_METHOD if registered."""
+
+        if Cache.GET_MANY_METHOD is None:
+            return [cls.get(cache_name, bucket=bucket) for bucket in buckets]
+        cls.count_operation("index_reads_total")
+        stored = Cache._read_many(
             Cache,
             cls.INDEX_CACHE_NAME,
-            cls.get_name(cache_name),
+            [cls.get_name(cache_name, bucket) for bucket in buckets],
             default=IndexContainer(),
         )
+        return [
+            cls.load_entries(data, bucket=bucket)
+            for bucket, data in zip(buckets, stored)
+        ]
 
     @classmethod
     @Cache.PIPELINE.index_set
-    def set(cls, cache_name, value: IndexContainer):
-        return Cache.SET_METHOD(
-            Cache, cls.INDEX_CACHE_NAME, cls.get_name(cache_name), value
+    def set(
+        cls,
+        cache_name,
+        value: IndexContainer,
+        bucket=None,
+        shard=None,
+        expected=_MISSING,
+    ):
+        """Writes index data (or its bucket or shard).
+
+        :param expected: stored value read before change. If passed, value is written
+                         by Cache.COMPARE_AND_SET_METHOD with increased version.
+        :return: result of SET_METHOD or COMPARE_AND_SET_METHOD.
+        """
+
+        if cls.is_sharded(bucket, shard):
+            shards = cls.split_shards(value)
+            for shard in range(cls.shards):
+                cls.set(cache_name, IndexContainer(shards.get(shard, [])), shard=shard)
+            return None
+        cls.count_operation("index_writes_total")
+        name = cls.get_name(cache_name, bucket, shard)
+        stored = cls.dump_entries(value, bucket=bucket)
+        if expected is _MISSING:
+            return Cache.SET_METHOD(Cache, cls.INDEX_CACHE_NAME, name, stored)
+        return Cache.COMPARE_AND_SET_METHOD(
+            Cache,
+            cls.INDEX_CACHE_NAME,
+            name,
+            expected,
+            Versioned(get_version(expected) + 1, stored),
+        )
+
+    @classmethod
+    def modify(
+        cls,
+        cache_name: str,
+        function: typing.Callable[
+            [typing.Sequence], typing.Tuple[typing.Sequence, bool]
+        ],
+        bucket: typing.Optional[str] = None,
+        shard: typing.Optional[int] = None,
+    ) -> typing.Sequence:
+        """Rewrites index data (or its bucket or shard) with data computed by function.
+
+        Rewrites of the same index key are serialized by Cache.INDEX_LOCKS if registered.
+        If Cache.COMPARE_AND_SET_METHOD is registered data is written only if it wasn't
+        changed since it was read, otherwise it is read and computed again
+        up to CAS_RETRIES times with randomized exponential backoff.
+
+        :param str cache_name: cache name.
+        :param function: function receiving index data and returning updated data
+                         and flag if it differs from original.
+        :param bucket: bucket of bucketed index.
+        :param shard: shard of sharded index.
+        :return: updated index data.
+        :raises IndexConflictError: if index was changed concurrently on every attempt.
+        """
+
+        locks = Cache.INDEX_LOCKS
+        if locks is None:
+            return cls._modify(cache_name, function, bucket, shard)
+        with locks.locked(cls.get_name(cache_name, bucket, shard)):
+            return cls._modify(cache_name, function, bucket, shard)
+
+    @classmethod
+    def _modify(cls, cache_name, function, bucket, shard):
+        if Cache.COMPARE_AND_SET_METHOD is None:
+            index_data, changed = function(
+                cls.get(cache_name, bucket=bucket, shard=shard)
+            )
+            if changed:
+                cls.set(cache_name, index_data, bucket=bucket, shard=shard)
+            return index_data
+
+        name = cls.get_name(cache_name, bucket, shard)
+        for attempt in range(cls.CAS_RETRIES):
+            if attempt:
+                cls.count_operation("index_conflicts_total")
+                time.sleep(random.uniform(0, cls.CAS_BACKOFF * 2 ** (attempt - 1)))
+            cls.count_operation("index_reads_total")
+            stored = Cache._read(Cache, cls.INDEX_CACHE_NAME, name)
+            index_data, changed = function(
+                cls.load_entries(
+                    IndexContainer() if stored is None else stored, bucket=bucket
+                )
+            )
+            if not changed or cls.set(
+                cache_name, index_data, bucket=bucket, shard=shard, expected=stored
+            ):
+                return index_data
+        raise IndexConflictError(
+            f"{name} was changed concurrently on {cls.CAS_RETRIES} attempts"
+        )
+
+    @classmethod
+    def count_operation(cls, metric: str):
+        """Counts index storage operation if metrics are registered.
+
+        :param str metric: index_reads_total, index_writes_total
+                           or index_conflicts_total.
+        """
+
+        metrics = Cache.METRICS
+        if metrics is not None:
+            metrics.increment(metric, {"index": cls.__name__})
+
+    @classmethod
+    def load_entries(cls, stored, bucket=None) -> typing.Sequence:
+        """Converts stored index data to sorted entries using codec if packed."""
+
+        stored = unwrap(stored)
+        if cls.is_packed(bucket):
+            return cls.codec.load(cls.keys, stored)
+        return stored
+
+    @classmethod
+    def dump_entries(cls, index_data: typing.Sequence, bucket=None):
+        """Converts sorted entries to stored index data using codec if packed."""
+
+        if cls.is_packed(bucket):
+            return cls.codec.dump(cls.keys, index_data)
+        return index_data
+
+    @classmethod
+    def is_packed(cls, bucket=None) -> bool:
+        """Checks if index (or its bucket) data is stored as single object."""
+
+        return bucket is None and cls.packed
+
+    @classmethod
+    @Cache.PIPELINE.index_add
+    def add(cls, cache_name, entry, bucket=None, shard=None):
+        """Adds single entry to index.
+
+        Uses Cache.INDEX_ADD_METHOD if registered and index is not packed,
+        otherwise rewrites whole index (or shard storing entry).
+        """
+
+        if cls.is_sharded(bucket, shard):
+            shard = cls.get_shard(entry)
+        if Cache.INDEX_ADD_METHOD is not None and not cls.is_packed(bucket):
+            cls.count_operation("index_writes_total")
+            return Cache.INDEX_ADD_METHOD(
+                Cache,
+                cls.INDEX_CACHE_NAME,
+                cls.get_name(cache_name, bucket, shard),
+                entry,
+            )
+        return cls.modify(
+            cache_name,
+            lambda index_data: cls.merge_entries(index_data, added=[entry]),
+            bucket=bucket,
+            shard=shard,
         )
 
+    @classmethod
+    @Cache.PIPELINE.index_remove
+    def remove(cls, cache_name, entry, bucket=None, shard=None):
+        """Removes single entry from index.
+
+        Uses Cache.INDEX_REMOVE_METHOD if registered and index is not packed,
+        otherwise rewrites whole index (or shard storing entry).
+        """
+
+        if cls.is_sharded(bucket, shard):
+            shard = cls.get_shard(entry)
+        if Cache.INDEX_REMOVE_METHOD is not None and not cls.is_packed(bucket):
+            cls.count_operation("index_writes_total")
+            return Cache.INDEX_REMOVE_METHOD(
+                Cache,
+                cls.INDEX_CACHE_NAME,
+                cls.get_name(cache_name, bucket, shard),
+                entry,
+            )
+        return cls.modify(
+            cache_name,
+            lambda index_data: cls.merge_entries(index_data, removed=[entry]),
+            bucket=bucket,
+            shard=shard,
+        )
+
+    @classmethod
+    def apply_changes(
+        cls,
+        cache_name: str,
+        added: typing.Iterable = (),
+        removed: typing.Iterable = (),
+        bucket: typing.Optional[str] = None,
+        shard: typing.Optional[int] = None,
+    ) -> IndexContainer:
+        """Applies batch of index changes using single read and single write
+        (more if Index.modify retries concurrent change).
+
+        :param str cache_name: cache name.
+        :param added: entries to add.
+        :param removed: entries to remove.
+        :param bucket: bucket of bucketed index.
+        :param shard: shard of sharded index.
+        :return: updated index data.
+        """
+
+        added, removed = list(added), list(removed)
+        return cls.modify(
+            cache_name,
+            lambda index_data: cls.merge_entries(index_data, added, removed),
+            bucket=bucket,
+            shard=shard,
+        )
+
+    @classmethod
+    def merge_entries(
+        cls,
+        index_data: typing.Iterable,
+        added: typing.Iterable = (),
+        removed: typing.Iterable = (),
+    ) -> typing.Tuple[IndexContainer, bool]:
+        """Applies entries changes to stored index data.
+
+        :param index_data: stored index entries.
+        :param added: entries to add.
+        :param removed: entries to remove.
+        :return: updated index data and flag if it differs from original.
+        """
+
+        original_data = set(index_data)
+        updated_data = original_data.difference(removed)
+        updated_data.update(added)
+        changed = updated_data != original_data
+        return IndexContainer(sorted(updated_data)), changed
+
     @classmethod
     def set_index_cache_name(cls, index_cache_name: str):
         cls.INDEX_CACHE_NAME = index_cache_name
@@ -190,3 +1233,388 @@ class Index:
 
 class PkIndex(Index):
     keys = ["_id"]
+
+
+class _FirstItemView:
+    """Sequence of sorted entries first items suitable for bisect."""
+
+    def __init__(self, data, index: typing.Type[Index]):
+        self.data = data
+        self.index = index
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, position):
+        return self.index.codec.first(self.index.keys, self.data[position])
+
+
+class SortedIndex(Index, abstract=True):
+    """Index storing typed entries sorted by first key.
+
+    Answers equality, range ($gt, $gte, $lt, $lte, $between) and $prefix
+    queries on first key using binary search and returns values ordered by it.
+    First key values of all cached values must be comparable.
+    Entries are stored as tuples unless other typed codec is set.
+
+    Example:
+        class IndexByCreated(SortedIndex):
+            keys = ["created", "_id"]
+    """
+
+    codec = TupleCodec()
+
+    LOWER_BOUNDS = {"$gt": bisect.bisect_right, "$gte": bisect.bisect_left}
+    UPPER_BOUNDS = {"$lt": bisect.bisect_left, "$lte": bisect.bisect_right}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not cls.typed:
+            raise TypeError(f"{cls.__name__} requires typed codec")
+
+    @classmethod
+    def get_order_key(cls) -> typing.Optional[str]:
+        return cls.keys[0]
+
+    @classmethod
+    def get_range(
+        cls, index_data: typing.Sequence, condition
+    ) -> typing.Tuple[int, int]:
+        """Finds positions range of entries which first key may match condition.
+
+        :param index_data: sorted index entries.
+        :param condition: query condition on first key.
+        :return: start and stop positions.
+        """
+
+        view = _FirstItemView(index_data, cls)
+        start, stop = 0, len(index_data)
+        if condition is None or isinstance(condition, types.FunctionType):
+            return start, stop
+        if not Cache.is_operators(condition):
+            condition = {"$gte": condition, "$lte": condition}
+        for name, argument in condition.items():
+            if name == "$between":
+                start = max(start, bisect.bisect_left(view, argument[0]))
+                stop = min(stop, bisect.bisect_right(view, argument[1]))
+            elif name == "$prefix":
+                start = max(start, bisect.bisect_left(view, argument))
+                successor = _get_prefix_successor(argument)
+                if successor is not None:
+                    stop = min(stop, bisect.bisect_left(view, successor))
+            elif name in cls.LOWER_BOUNDS:
+                start = max(start, cls.LOWER_BOUNDS[name](view, argument))
+            elif name in cls.UPPER_BOUNDS:
+                stop = min(stop, cls.UPPER_BOUNDS[name](view, argument))
+        return start, max(start, stop)
+
+    @classmethod
+    def match(
+        cls,
+        query: typing.Mapping,
+        index_data: typing.Sequence,
+        reverse: bool = False,
+        limit: typing.Optional[int] = None,
+    ) -> typing.List[dict]:
+        """Matches stored index entries against query ordered by first key.
+
+        Only entries in range matching first key condition are checked.
+        Without limit they are matched column by column,
+        otherwise one by one until enough values are found.
+        """
+
+        start, stop = cls.get_range(index_data, query.get(cls.keys[0]))
+        if limit is None:
+            index_data = index_data[start:stop]
+            positions = cls.match_positions(query, index_data)
+            if reverse:
+                positions.reverse()
+            return [cls.codec.decode(cls.keys, index_data[i]) for i in positions]
+        positions = range(start, stop)
+        if reverse:
+            positions = reversed(positions)
+        result = []
+        for position in positions:
+            value = cls.codec.decode(cls.keys, index_data[position])
+            if Cache._match_query(value, query):
+                result.append(value)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+
+class PrefixIndex(SortedIndex, abstract=True):
+    """SortedIndex of string first key answering $prefix queries on normalized text.
+
+    First key values are stored transformed by normalize function
+    (e.g. str.casefold), so $prefix queries are case insensitive
+    and matched values are found with binary search in O(log N + k).
+    Search with limit and without sort stops after limit values.
+    Without normalize function it is plain SortedIndex.
+
+    Example:
+        class IndexByName(PrefixIndex):
+            keys = ["name", "_id"]
+            normalize = staticmethod(lambda name: name.strip().casefold())
+
+        cache.search("my_cache", {"name": {"$prefix": "Jo"}}, limit=10)
+    """
+
+    normalize: typing.Optional[typing.Callable[[str], str]] = None
+    """Transforms first key values and $prefix arguments."""
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.exact = cls.normalize is None
+
+    @classmethod
+    def normalize_text(cls, text):
+        if cls.normalize is None or not isinstance(text, str):
+            return text
+        return cls.normalize(text)
+
+    @classmethod
+    def get_index(cls, value: typing.Mapping):
+        key = cls.keys[0]
+        if not cls.exact and key in value:
+            value = dict(value)
+            value[key] = cls.normalize_text(value[key])
+        return super().get_index(value)
+
+    @classmethod
+    def get_order_key(cls) -> typing.Optional[str]:
+        return cls.keys[0] if cls.exact else None
+
+    @classmethod
+    def can_match(cls, key: str, condition) -> bool:
+        """Normalized first key can answer $prefix conditions only."""
+
+        if key == cls.keys[0] and not cls.exact:
+            return isinstance(condition, collections.abc.Mapping) and list(
+                condition
+            ) == ["$prefix"]
+        return super().can_match(key, condition)
+
+    @classmethod
+    def match(
+        cls,
+        query: typing.Mapping,
+        index_data: typing.Sequence,
+        reverse: bool = False,
+        limit: typing.Optional[int] = None,
+    ) -> typing.List[dict]:
+        """Matches normalized query against stored index entries."""
+
+        key = cls.keys[0]
+        condition = query.get(key)
+        if not cls.exact and Cache.is_operators(condition):
+            query = dict(query)
+            query[key] = {
+                name: cls.normalize_text(argument)
+                for name, argument in condition.items()
+            }
+        return super().match(query, index_data, reverse=reverse, limit=limit)
+
+
+def _get_prefix_successor(prefix: str) -> typing.Optional[str]:
+    """Finds smallest string greater than all strings starting with prefix.
+
+    :return: successor or None if there is no such string.
+    """
+
+    while prefix:
+        last = ord(prefix[-1])
+        if last < sys.maxunicode:
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+    return None
+
+
+class InvertedIndex(Index, abstract=True):
+    """Index of list valued key storing primary keys of values by every element.
+
+    Each element is bucket containing sorted primary keys of values
+    having it (its posting list). Answers $contains, $all and $any
+    conditions on first key by intersecting and uniting posting lists
+    of queried elements only. Elements are stored and matched as strings.
+
+    Example:
+        class IndexByTags(InvertedIndex):
+            keys = ["tags", "_id"]
+
+        cache.search("my_cache", {"tags": {"$all": ["red", "new"]}})
+    """
+
+    bucketed = True
+
+    OPERATORS = ("$contains", "$all", "$any")
+    """Conditions answered by index."""
+
+    def __init_subclass__(cls, **kwargs):
+        if list(cls.keys[1:]) != [Cache.PRIMARY_KEY]:
+            raise TypeError(
+                f"{cls.__name__} keys must be list valued key and {Cache.PRIMARY_KEY}"
+            )
+        super().__init_subclass__(**kwargs)
+
+    @classmethod
+    def get_elements(cls, value: typing.Mapping) -> typing.Set[str]:
+        """Gets elements of indexed key of value as strings.
+
+        Missing key has no elements, scalar value is single element.
+        """
+
+        elements = value.get(cls.keys[0])
+        if elements is None:
+            return set()
+        if isinstance(elements, (str, bytes)) or not isinstance(
+            elements, collections.abc.Iterable
+        ):
+            elements = [elements]
+        return {str(element) for element in elements}
+
+    @classmethod
+    def get_changes(
+        cls,
+        old_value: typing.Optional[typing.Mapping],
+        new_value: typing.Optional[typing.Mapping],
+    ) -> typing.Dict[typing.Optional[str], typing.Tuple[list, list]]:
+        """Computes posting lists changes between two versions of value.
+
+        Only elements added to or removed from value are changed.
+        """
+
+        old_elements = set() if old_value is None else cls.get_elements(old_value)
+        new_elements = set() if new_value is None else cls.get_elements(new_value)
+        changes = {}
+        for element in sorted(new_elements - old_elements):
+            changes[element] = ([new_value[Cache.PRIMARY_KEY]], [])
+        for element in sorted(old_elements - new_elements):
+            changes[element] = ([], [old_value[Cache.PRIMARY_KEY]])
+        return changes
+
+    @classmethod
+    def can_match(cls, key: str, condition) -> bool:
+        """Checks if condition consists of index operators with non empty arguments."""
+
+        return (
+            key == cls.keys[0]
+            and isinstance(condition, collections.abc.Mapping)
+            and bool(condition)
+            and all(
+                name in cls.OPERATORS and (name == "$contains" or len(argument) > 0)
+                for name, argument in condition.items()
+            )
+        )
+
+    @classmethod
+    def get_operators(
+        cls, query: typing.Mapping
+    ) -> typing.List[typing.Tuple[str, typing.List[str]]]:
+        """Lists query operators on indexed key with their elements as strings."""
+
+        return [
+            (
+                name,
+                (
+                    [str(argument)]
+                    if name == "$contains"
+                    else [str(element) for element in argument]
+                ),
+            )
+            for name, argument in query.get(cls.keys[0], {}).items()
+        ]
+
+    @classmethod
+    def estimate(
+        cls, cache_name: str, query: typing.Mapping
+    ) -> typing.Tuple[float, float]:
+        """Estimates selectivity from average posting list length.
+
+        Cost is number of read posting lists and their entries.
+        """
+
+        stats = cls.get_stats(cache_name)
+        total = max(PkIndex.get_stats(cache_name).entries, 1)
+        element_selectivity = min(stats.entries / max(stats.distinct, 1) / total, 1.0)
+        selectivity, cost = 1.0, 0.0
+        for name, elements in cls.get_operators(query):
+            if name == "$any":
+                selectivity *= min(element_selectivity * len(elements), 1.0)
+            else:
+                selectivity *= element_selectivity ** len(elements)
+            cost += len(elements) * (1 + element_selectivity * total)
+        return selectivity, cost
+
+    @classmethod
+    def get_query_buckets(cls, query: typing.Mapping) -> typing.Optional[list]:
+        """Lists posting lists of all queried elements."""
+
+        if cls.keys[0] not in query:
+            return None
+        return sorted(
+            {
+                element
+                for _, elements in cls.get_operators(query)
+                for element in elements
+            }
+        )
+
+    @classmethod
+    def match_buckets(
+        cls,
+        query: typing.Mapping,
+        buckets: typing.List[str],
+        buckets_data: typing.List[typing.Sequence],
+        reverse: bool = False,
+        limit: typing.Optional[int] = None,
+    ) -> typing.List[dict]:
+        """Intersects ($contains, $all) and unites ($any) posting lists.
+
+        :return: list of dicts with primary keys ordered by them.
+        """
+
+        postings = dict(zip(buckets, buckets_data))
+        primary_keys = None
+        for name, elements in cls.get_operators(query):
+            lists = [postings.get(element, ()) for element in elements]
+            if name == "$any":
+                found = set().union(*lists)
+            else:
+                found = set(lists[0]).intersection(*lists[1:])
+            primary_keys = found if primary_keys is None else primary_keys & found
+        if primary_keys is None:
+            primary_keys = set().union(*buckets_data)
+        result = [
+            {Cache.PRIMARY_KEY: primary_key}
+            for primary_key in sorted(primary_keys, reverse=reverse)
+        ]
+        return result[:limit]
+
+
+@Cache.PIPELINE.get.after(priority=2)
+@Cache.PIPELINE.set.after(priority=2)
+@Cache.PIPELINE.update.after(priority=2)
+def add_snapshot(ctx: PipelineContext):
+    """Takes snapshot of indexed fields of read or written value.
+
+    Runs after index hooks so they still see previous snapshot.
+    """
+
+    value = ctx.local_data.get("original_value", ctx.result)
+    if value is not None:
+        take_snapshot(value, Index.get_indexed_keys(ctx.name))
+
+
+@Cache.PIPELINE.get_many.after(priority=2)
+@Cache.PIPELINE.set_many.after(priority=2)
+@Cache.PIPELINE.update_many.after(priority=2)
+def add_snapshots(ctx: PipelineContext):
+    """Batch version of add_snapshot."""
+
+    values = ctx.local_data.get("original_values")
+    values = ctx.result if values is None else values.values()
+    keys = Index.get_indexed_keys(ctx.name)
+    for value in values or ():
+        if value is not None:
+            take_snapshot(value, keys)
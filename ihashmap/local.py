@@ -0,0 +1,184 @@
+import collections
+import copy
+import sys
+import threading
+import time
+import typing
+
+from ihashmap.cache import Cache, PipelineContext
+from ihashmap.index import Index
+
+_MISSING = object()
+
+
+def shallow_copy(value):
+    """Copies value with its own top level data.
+
+    collections.UserDict data is copied explicitly, Python 3.6 copies only
+    attributes referencing it.
+    """
+
+    copied = copy.copy(value)
+    if isinstance(value, collections.UserDict) and copied.data is value.data:
+        copied.data = copy.copy(value.data)
+    return copied
+
+
+class LocalCache:
+    """In-process read-through tier in front of Cache.GET_METHOD.
+
+    Values read from storage are kept in memory and evicted
+    in least recently used order when entries or bytes limit is exceeded
+    or when their time to live expires.
+    Stored values are invalidated by set, update and delete pipelines
+    of entities and indexes, so only writes made by other processes
+    can be observed stale for at most ttl seconds.
+
+    Values are copied when stored and returned, so changes made in place
+    are seen neither by other readers nor by value snapshots of index hooks
+    until value is written. Copies are shallow: nested containers are shared.
+    Index data is read only and returned without copying.
+    """
+
+    def __init__(
+        self,
+        max_entries: typing.Optional[int] = 10000,
+        max_bytes: typing.Optional[int] = None,
+        ttl: typing.Optional[float] = None,
+        sizeof: typing.Callable[[typing.Any], int] = sys.getsizeof,
+        clock: typing.Callable[[], float] = time.monotonic,
+        copy_value: typing.Optional[typing.Callable[[typing.Any], typing.Any]] = (
+            shallow_copy
+        ),
+    ):
+        """
+        :param max_entries: maximum number of stored values.
+        :param max_bytes: maximum total size of stored values.
+        :param ttl: seconds after which stored value is read from storage again.
+        :param sizeof: function estimating value size in bytes.
+        :param clock: function returning current time in seconds.
+        :param copy_value: function copying stored and returned values,
+                           None to share values which are never changed in place.
+        """
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.clock = clock
+        self.copy_value = copy_value
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, name: str, key: str, default=_MISSING):
+        """Gets stored value counting hit or miss.
+
+        :param str name: cache name.
+        :param str key: hash key.
+        :param default: returned when value is not stored or expired.
+        """
+
+        with self._lock:
+            entry = self._entries.get((name, key))
+            if entry is not None and self.ttl is not None and entry[1] <= self.clock():
+                self._pop((name, key))
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end((name, key))
+            self.hits += 1
+        return self._copy(name, entry[0])
+
+    def put(self, name: str, key: str, value):
+        """Stores value evicting least recently used ones if limits are exceeded."""
+
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires = self.clock() + self.ttl if self.ttl is not None else None
+        value = self._copy(name, value)
+        with self._lock:
+            self._pop((name, key))
+            self._entries[(name, key)] = (value, expires, size)
+            self.size += size
+            while (
+                self.max_entries is not None and len(self._entries) > self.max_entries
+            ) or (self.max_bytes is not None and self.size > self.max_bytes):
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, name: str, key: str):
+        with self._lock:
+            self._pop((name, key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        """Returns counters of local cache usage."""
+
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": len(self._entries),
+            "bytes": self.size,
+        }
+
+    def _copy(self, name: str, value):
+        if self.copy_value is None or name == Index.INDEX_CACHE_NAME:
+            return value
+        return self.copy_value(value)
+
+    def _pop(self, cache_key: tuple):
+        entry = self._entries.pop(cache_key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+
+def _invalidate(cache, name: str, keys: typing.Iterable[str]):
+    local_cache = cache.LOCAL_CACHE
+    if local_cache is None:
+        return
+    for key in keys:
+        local_cache.invalidate(name, key)
+
+
+@Cache.PIPELINE.set.after()
+@Cache.PIPELINE.update.after()
+@Cache.PIPELINE.delete.after()
+def invalidate_value(ctx: PipelineContext):
+    _invalidate(ctx.cls_or_self, ctx.name, ctx.args[:1])
+
+
+@Cache.PIPELINE.set_many.after()
+@Cache.PIPELINE.update_many.after()
+@Cache.PIPELINE.delete_many.after()
+def invalidate_values(ctx: PipelineContext):
+    keys = ctx.local_data.get("original_values") or ctx.args[0]
+    _invalidate(ctx.cls_or_self, ctx.name, keys)
+
+
+@Cache.PIPELINE.index_set.after()
+@Cache.PIPELINE.index_add.after()
+@Cache.PIPELINE.index_remove.after()
+def invalidate_index(ctx: PipelineContext):
+    index = ctx.cls_or_self
+    bucket = ctx.kwargs.get("bucket", ctx.args[1] if len(ctx.args) > 1 else None)
+    name = index.get_name(ctx.name, bucket, ctx.kwargs.get("shard"))
+    _invalidate(Cache, index.INDEX_CACHE_NAME, [name])
@@ -0,0 +1,279 @@
+import bisect
+import collections
+import logging
+import threading
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+"""Default histogram buckets upper bounds in seconds."""
+
+PAYLOADS = {
+    "get": lambda ctx: [ctx.result],
+    "get_many": lambda ctx: ctx.result or (),
+    "set": lambda ctx: ctx.args[1:2],
+    "update": lambda ctx: ctx.args[1:2],
+    "set_many": lambda ctx: ctx.args[0].values(),
+    "update_many": lambda ctx: ctx.args[0].values(),
+    "index_get": lambda ctx: [ctx.result],
+    "index_get_many": lambda ctx: ctx.result or (),
+    "index_set": lambda ctx: ctx.args[:1],
+    "index_add": lambda ctx: ctx.args[:1],
+    "index_remove": lambda ctx: ctx.args[:1],
+}
+"""Functions returning values transferred by pipeline main function."""
+
+
+class Histogram:
+    """Counts of observed values by buckets upper bounds."""
+
+    def __init__(self, buckets: typing.Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self) -> dict:
+        """Returns count, sum and cumulative counts by bucket upper bound."""
+
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+class Metrics:
+    """Latency histograms and counters of pipelines, backend calls,
+    indexes and searches.
+
+    Recorded when registered by Cache.register_metrics. Unregistered
+    metrics cost single attribute check per pipeline execution.
+
+    Recorded metrics (labels in braces):
+        pipeline_seconds{pipeline}: whole pipeline execution.
+        action_seconds{pipeline, action}: single before or after action.
+        backend_seconds{pipeline}: pipeline main function (backend call).
+        backend_calls_total{pipeline}, backend_bytes_total{pipeline}:
+            backend calls and size of transferred values if sizeof is set.
+        index_reads_total{index}, index_writes_total{index}: index operations.
+        index_conflicts_total{index}: retried compare-and-set index rewrites.
+        expired_values_total{cache}: values deleted by ihashmap.expiry.Expiry.sweep.
+        search_seconds{cache}, slow_searches_total{cache}: Cache.search calls.
+
+    Searches slower than slow_search seconds are logged with their plan
+    and kept in slow_searches.
+    """
+
+    def __init__(
+        self,
+        slow_search: typing.Optional[float] = 0.1,
+        slow_search_log_size: int = 100,
+        sizeof: typing.Optional[typing.Callable[[typing.Any], int]] = None,
+        buckets: typing.Sequence[float] = LATENCY_BUCKETS,
+        clock: typing.Callable[[], float] = time.perf_counter,
+    ):
+        """
+        :param slow_search: seconds after which search is logged as slow,
+                            None disables slow searches log.
+        :param int slow_search_log_size: number of kept slow searches.
+        :param sizeof: function estimating transferred value size in bytes,
+                       bytes are not counted if not set.
+        :param buckets: histograms buckets upper bounds in seconds.
+        :param clock: function returning current time in seconds.
+        """
+
+        self.slow_search = slow_search
+        self.sizeof = sizeof
+        self.buckets = tuple(buckets)
+        self.clock = clock
+        self.histograms = {}
+        self.counters = {}
+        self.slow_searches = collections.deque(maxlen=slow_search_log_size)
+        self._action_names = {}
+        self._lock = threading.Lock()
+
+    def observe(self, metric: str, labels: typing.Mapping[str, str], value: float):
+        """Adds value to histogram."""
+
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def increment(
+        self, metric: str, labels: typing.Mapping[str, str], value: float = 1
+    ):
+        """Increases counter."""
+
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def get_action_name(self, action: typing.Callable) -> str:
+        """Composes action label. Index hooks are named by their index."""
+
+        name = self._action_names.get(action)
+        if name is None:
+            owner = getattr(action, "__self__", None)
+            if isinstance(owner, type):
+                name = f"{owner.__name__}.{action.__name__}"
+            else:
+                name = getattr(action, "__qualname__", repr(action))
+            self._action_names[action] = name
+        return name
+
+    def measure_action(self, pipeline: str, action: typing.Callable, ctx):
+        """Executes pipeline action recording its latency."""
+
+        started = self.clock()
+        action(ctx)
+        self.observe_action(pipeline, action, self.clock() - started)
+
+    def observe_action(self, pipeline: str, action: typing.Callable, seconds: float):
+        self.observe(
+            "action_seconds",
+            {"pipeline": pipeline, "action": self.get_action_name(action)},
+            seconds,
+        )
+
+    def observe_backend(self, pipeline: str, ctx, seconds: float):
+        """Records pipeline main function call."""
+
+        labels = {"pipeline": pipeline}
+        self.observe("backend_seconds", labels, seconds)
+        self.increment("backend_calls_total", labels)
+        if self.sizeof is not None and pipeline in PAYLOADS:
+            size = sum(
+                self.sizeof(value)
+                for value in PAYLOADS[pipeline](ctx)
+                if value is not None
+            )
+            self.increment("backend_bytes_total", labels, size)
+
+    def observe_pipeline(self, pipeline: str, seconds: float):
+        self.observe("pipeline_seconds", {"pipeline": pipeline}, seconds)
+
+    def observe_search(self, plan, rows: int, seconds: float):
+        """Records search executed by query plan. Logs it if it is slow.
+
+        :param ihashmap.planner.QueryPlan plan: executed plan.
+        :param int rows: number of results.
+        :param float seconds: search duration.
+        """
+
+        labels = {"cache": plan.cache_name}
+        self.observe("search_seconds", labels, seconds)
+        if self.slow_search is None or seconds < self.slow_search:
+            return
+        self.increment("slow_searches_total", labels)
+        entry = {
+            "cache_name": plan.cache_name,
+            "query": sorted(plan.query),
+            "seconds": seconds,
+            "rows": rows,
+            "index": plan.scans[0].index.__name__,
+            "matched": dict(plan.matched),
+            "fetched": plan.fetched,
+            "plan": plan.explain(),
+        }
+        self.slow_searches.append(entry)
+        logger.warning(
+            "Slow search in %s by %s took %.3fs using %s: %s",
+            entry["cache_name"],
+            entry["query"],
+            seconds,
+            entry["index"],
+            entry["matched"],
+        )
+
+    def as_dict(self) -> dict:
+        """Exports metrics.
+
+        :return: dict with histograms and counters as lists of dicts
+                 with name, labels and values and list of slow searches.
+        """
+
+        with self._lock:
+            histograms = [
+                dict(name=name, labels=dict(labels), **histogram.as_dict())
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+        return {
+            "histograms": histograms,
+            "counters": counters,
+            "slow_searches": list(self.slow_searches),
+        }
+
+    def to_prometheus(self, prefix: str = "ihashmap_") -> str:
+        """Exports metrics in Prometheus text exposition format."""
+
+        exported = self.as_dict()
+        lines, types = [], set()
+        for histogram in exported["histograms"]:
+            name = prefix + histogram["name"]
+            if name not in types:
+                types.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            labels = histogram["labels"]
+            for bound, count in histogram["buckets"].items():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(dict(labels, le=le))
+                lines.append(f"{name}_bucket{bucket_labels} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']!r}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        for counter in exported["counters"]:
+            name = prefix + counter["name"]
+            if name not in types:
+                types.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(
+                f"{name}{_format_labels(counter['labels'])} {counter['value']}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.slow_searches.clear()
+
+
+def _format_labels(labels: typing.Mapping[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
@@ -0,0 +1,170 @@
+import collections
+import concurrent.futures
+import threading
+import typing
+
+
+class ParallelExecutor:
+    """Runs backend calls and query matching of Cache.search and Cache.all concurrently.
+
+    Storage calls run in thread pool, results are returned in order of
+    requested keys. At most max_in_flight calls are submitted at once,
+    so storage isn't flooded by large results. Fan-out started inside
+    executor task runs inline, so nested calls can't exhaust the pool.
+
+    Matching of fetched values against query conditions not covered
+    by indexes runs in match_executor if set (e.g. ProcessPoolExecutor
+    for CPU heavy conditions), otherwise in calling thread. Values and queries
+    sent to process pool must be picklable (module level functions, not lambdas).
+
+    Example:
+        Cache.register_executor(ParallelExecutor(max_workers=16))
+    """
+
+    def __init__(
+        self,
+        executor: typing.Optional[concurrent.futures.Executor] = None,
+        max_workers: int = 8,
+        max_in_flight: typing.Optional[int] = None,
+        batch_size: int = 100,
+        match_executor: typing.Optional[concurrent.futures.Executor] = None,
+        match_chunk_size: int = 256,
+    ):
+        """
+        :param executor: executor running storage calls, thread pool by default.
+        :param int max_workers: number of threads of default executor.
+        :param max_in_flight: maximum number of submitted calls, 2 * max_workers by default.
+        :param int batch_size: number of keys fetched by single GET_MANY_METHOD call.
+        :param match_executor: executor matching values against query.
+        :param int match_chunk_size: number of values matched by single task.
+        """
+
+        self.executor = executor or concurrent.futures.ThreadPoolExecutor(max_workers)
+        self.max_in_flight = max_in_flight or 2 * max_workers
+        self.batch_size = batch_size
+        self.match_executor = match_executor
+        self.match_chunk_size = match_chunk_size
+        self._owns_executor = executor is None
+        self._local = threading.local()
+
+    def map(
+        self,
+        function: typing.Callable,
+        items: typing.Iterable,
+        executor: typing.Optional[concurrent.futures.Executor] = None,
+    ) -> typing.Iterator:
+        """Calls function for every item concurrently.
+
+        Items are consumed lazily as earlier calls complete.
+
+        :param function: function called with single item.
+        :param items: function arguments.
+        :param executor: executor to use instead of storage calls executor.
+        :return: iterator over results in items order.
+        """
+
+        if getattr(self._local, "in_task", False):
+            yield from map(function, items)
+            return
+        executor = executor or self.executor
+        if executor is self.executor:
+            function = self._wrap_task(function)
+        pending = collections.deque()
+        try:
+            for item in items:
+                if len(pending) >= self.max_in_flight:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(function, item))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _wrap_task(self, function: typing.Callable) -> typing.Callable:
+        def task(item):
+            self._local.in_task = True
+            try:
+                return function(item)
+            finally:
+                self._local.in_task = False
+
+        return task
+
+    def read(
+        self, cache, name: str, keys: typing.List[str], default=None
+    ) -> typing.List:
+        """Reads values by single key calls or GET_MANY_METHOD calls of batch_size keys.
+
+        :param cache: Cache (or Cache class) whose METHODS are called.
+        :param str name: cache name.
+        :param list keys: keys to read.
+        :param default: value returned for missing keys.
+        :return: values in keys order.
+        """
+
+        cls = cache if isinstance(cache, type) else type(cache)
+        if cls.GET_MANY_METHOD is None:
+            return list(
+                self.map(lambda key: cls.GET_METHOD(cache, name, key, default), keys)
+            )
+        batches = [
+            keys[start:stop]
+            for start, stop in _chunk_bounds(len(keys), self.batch_size)
+        ]
+        result = []
+        for values in self.map(
+            lambda batch: cls.GET_MANY_METHOD(cache, name, batch, default), batches
+        ):
+            result.extend(values)
+        return result
+
+    def filter(
+        self, cache, values: typing.List[typing.Mapping], query: typing.Mapping
+    ) -> typing.List[typing.Mapping]:
+        """Selects values matching query keeping their order.
+
+        :param cache: Cache (or Cache class) whose _match_query is used.
+        :param list values: values to match.
+        :param dict query: query conditions.
+        :return: matching values.
+        """
+
+        cls = cache if isinstance(cache, type) else type(cache)
+        if self.match_executor is None or len(values) <= self.match_chunk_size:
+            return [value for value in values if cls._match_query(value, query)]
+        chunks = [
+            values[start:stop]
+            for start, stop in _chunk_bounds(len(values), self.match_chunk_size)
+        ]
+        result = []
+        for chunk, matches in zip(
+            chunks,
+            self.map(_MatchTask(cls, query), chunks, executor=self.match_executor),
+        ):
+            result.extend(value for value, match in zip(chunk, matches) if match)
+        return result
+
+    def shutdown(self, wait: bool = True):
+        """Shuts default executor down. Passed executors are left running."""
+
+        if self._owns_executor:
+            self.executor.shutdown(wait=wait)
+
+
+def _chunk_bounds(
+    size: int, chunk_size: int
+) -> typing.Iterator[typing.Tuple[int, int]]:
+    for start in range(0, size, chunk_size):
+        yield start, start + chunk_size
+
+
+class _MatchTask:
+    """Picklable task matching chunk of values against query."""
+
+    def __init__(self, cache_class: type, query: typing.Mapping):
+        self.cache_class = cache_class
+        self.query = query
+
+    def __call__(self, values: typing.List[typing.Mapping]) -> typing.List[bool]:
+        return [self.cache_class._match_query(value, self.query) for value in values]
@@ -0,0 +1,302 @@
+import itertools
+import typing
+
+from ihashmap.index import Index, PkIndex
+
+
+class IndexScan:
+    """Usage of single index in query plan."""
+
+    def __init__(self, index: typing.Type[Index], query: dict, cache_name: str):
+        self.index = index
+        self.query = query
+        self.selectivity, self.cost = index.estimate(cache_name, query)
+
+    def explain(self) -> dict:
+        return {
+            "index": self.index.__name__,
+            "query": sorted(self.query),
+            "selectivity": self.selectivity,
+            "cost": self.cost,
+        }
+
+
+class QueryPlan:
+    """Execution plan of Cache.search query.
+
+    Planner estimates selectivity of query conditions for every index
+    using IndexStats and picks cheapest index to drive the search.
+    While some conditions are not covered by chosen indexes,
+    index reducing total cost most is added and primary keys
+    found by it are intersected with the others.
+    Entities are fetched only for primary keys found by all chosen indexes.
+    When driving index is typed and contains all query and projection keys,
+    results are built from index values without fetching entities at all.
+    """
+
+    ENTITY_FETCH_COST: float = 100
+    """Cost of fetching single entity relative to reading single index entry."""
+
+    def __init__(
+        self,
+        cache_name: str,
+        query: typing.Mapping,
+        sort: typing.Optional[str] = None,
+        limit: typing.Optional[int] = None,
+        projection: typing.Optional[typing.Sequence[str]] = None,
+    ):
+        self.cache_name = cache_name
+        self.query = query
+        self.sort_key, self.reverse = None, False
+        if sort is not None:
+            self.sort_key, self.reverse = sort.lstrip("-"), sort.startswith("-")
+        self.limit = limit
+        self.projection = projection
+        self.total = PkIndex.get_stats(cache_name).entries
+        self.scans = []
+        self.rest_query = dict(query)
+        # Numbers of index values matched by scans and entities fetched by execution.
+        self.matched = {}
+        self.fetched = 0
+        self._choose_scans(self.get_indexes())
+
+    def get_indexes(self) -> typing.List[typing.Type[Index]]:
+        """Finds indexes usable by search. Indexes which are not ready are skipped."""
+
+        return [
+            index
+            for index in Index.find_index_for_cache(self.cache_name)
+            if index is PkIndex or index.is_ready(self.cache_name)
+        ]
+
+    @property
+    def selectivity(self) -> float:
+        selectivity = 1.0
+        for scan in self.scans:
+            selectivity *= scan.selectivity
+        return selectivity
+
+    @property
+    def estimated_rows(self) -> float:
+        """Estimated number of values found by indexes."""
+
+        return self.total * self.selectivity
+
+    @property
+    def cost(self) -> float:
+        scans_cost = sum(scan.cost for scan in self.scans)
+        if self.scans and self.covers_projection:
+            return scans_cost
+        return scans_cost + self.ENTITY_FETCH_COST * self.estimated_rows
+
+    @property
+    def in_order(self) -> bool:
+        """Values found by driving index are already sorted as requested."""
+
+        return self.sort_key is None or (
+            self.scans[0].index.get_order_key() == self.sort_key
+        )
+
+    @property
+    def covers_projection(self) -> bool:
+        """Results can be built from driving index values only."""
+
+        index = self.scans[0].index
+        return (
+            self.projection is not None
+            and not self.rest_query
+            and index.typed
+            and index.exact
+            and all(key in index.keys for key in self.projection)
+            and (self.sort_key is None or self.sort_key in index.keys)
+        )
+
+    def _create_scan(self, index: typing.Type[Index]) -> IndexScan:
+        query = {
+            key: value
+            for key, value in self.rest_query.items()
+            if index.can_match(key, value)
+        }
+        return IndexScan(index, query, self.cache_name)
+
+    def _add_scan(self, scan: IndexScan):
+        self.scans.append(scan)
+        for key in scan.query:
+            del self.rest_query[key]
+
+    def _cost_with(self, scan: IndexScan) -> float:
+        self.scans.append(scan)
+        try:
+            return self.cost
+        finally:
+            self.scans.pop()
+
+    def _choose_scans(self, indexes: typing.List[typing.Type[Index]]):
+        indexes = [
+            index
+            for index in indexes
+            if not index.partial or self._create_scan(index).query
+        ]
+        ordered = [
+            index
+            for index in indexes
+            if self.sort_key is not None and index.get_order_key() == self.sort_key
+        ]
+        if ordered and self.limit is not None:
+            driver = self._create_scan(ordered[0])
+        else:
+            driver = min(
+                (self._create_scan(index) for index in indexes),
+                key=lambda scan: (self._cost_with(scan), scan.index not in ordered),
+            )
+        self._add_scan(driver)
+
+        while self.rest_query:
+            scans = [
+                self._create_scan(index)
+                for index in indexes
+                if all(scan.index is not index for scan in self.scans)
+            ]
+            scans = [scan for scan in scans if scan.query]
+            if not scans:
+                break
+            best = min(scans, key=self._cost_with)
+            if self._cost_with(best) >= self.cost:
+                break
+            self._add_scan(best)
+
+    def explain(self) -> dict:
+        """Describes chosen plan.
+
+        :return: dict with used index scans, conditions left for entity matching
+                 and cost estimations.
+        """
+
+        return {
+            "cache_name": self.cache_name,
+            "scans": [scan.explain() for scan in self.scans],
+            "rest_query": sorted(self.rest_query),
+            "covered": not self.rest_query,
+            "in_order": self.in_order,
+            "covers_projection": self.covers_projection,
+            "estimated_rows": self.estimated_rows,
+            "cost": self.cost,
+        }
+
+    def find_values(self, cache) -> typing.Iterator[dict]:
+        """Finds driving index values matching all chosen index scans."""
+
+        driver, filters = self.scans[0], self.scans[1:]
+        primary_keys = None
+        for scan in filters:
+            found = {
+                value[cache.PRIMARY_KEY]
+                for value in scan.index.find(self.cache_name, scan.query)
+            }
+            self.matched[scan.index.__name__] = len(found)
+            primary_keys = found if primary_keys is None else primary_keys & found
+            if not primary_keys:
+                return
+        push_limit = (
+            self.in_order
+            and not filters
+            and not self.rest_query
+            and not cache._may_expire(self.cache_name)
+        )
+        matched = driver.index.find(
+            self.cache_name,
+            driver.query,
+            reverse=self.reverse and self.in_order,
+            limit=self.limit if push_limit else None,
+        )
+        self.matched[driver.index.__name__] = len(matched)
+        for value in matched:
+            if primary_keys is None or value[cache.PRIMARY_KEY] in primary_keys:
+                yield value
+
+    def iterate(self, cache, chunk_size: int) -> typing.Iterator[typing.Mapping]:
+        """Executes plan lazily fetching entities in chunks.
+
+        Results which must be sorted after fetching are collected first.
+
+        :param Cache cache: cache instance used for entities fetching.
+        :param int chunk_size: maximum number of entities fetched at once.
+        :return: iterator over matching values or their projections.
+        """
+
+        if not self.in_order:
+            result = self.sort_values(list(self._iterate_values(cache, chunk_size)))
+            yield from self._project(result[: self.limit])
+            return
+        yield from self._project(self._iterate_values(cache, chunk_size))
+
+    def execute(self, cache, chunk_size: int) -> typing.List[typing.Mapping]:
+        """Executes plan.
+
+        :param Cache cache: cache instance used for entities fetching.
+        :param int chunk_size: maximum number of entities fetched at once.
+        :return: list of matching values or their projections.
+        """
+
+        return list(self.iterate(cache, chunk_size))
+
+    def _iterate_values(
+        self, cache, chunk_size: int
+    ) -> typing.Iterator[typing.Mapping]:
+        values = self.find_values(cache)
+        limit = self.limit if self.in_order else None
+        if self.covers_projection and not cache._may_expire(self.cache_name):
+            yield from itertools.islice(values, limit)
+            return
+        found = 0
+        while limit is None or found < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - found)
+            chunk = [
+                value[cache.PRIMARY_KEY] for value in itertools.islice(values, size)
+            ]
+            if not chunk:
+                return
+            self.fetched += len(chunk)
+            for entity in self._match_entities(
+                cache, cache._get_many(self.cache_name, chunk)
+            ):
+                yield entity
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+
+    def _match_entities(
+        self, cache, entities: typing.Iterable[typing.Optional[typing.Mapping]]
+    ) -> typing.List[typing.Mapping]:
+        entities = [
+            entity
+            for entity in entities
+            if entity is not None and not cache._is_expired(self.cache_name, entity)
+        ]
+        if cache.EXECUTOR is not None and self.rest_query:
+            return cache.EXECUTOR.filter(cache, entities, self.rest_query)
+        return [
+            entity for entity in entities if cache._match_query(entity, self.rest_query)
+        ]
+
+    def sort_values(self, values: typing.List[typing.Mapping]) -> typing.List:
+        """Sorts values by sort key. Values without it (or with None) go last.
+
+        :param values: matching values.
+        :return: sorted values.
+        """
+
+        key = self.sort_key
+        result = [value for value in values if value.get(key) is not None]
+        result.sort(key=lambda value: value[key], reverse=self.reverse)
+        result.extend(value for value in values if value.get(key) is None)
+        return result
+
+    def _project(self, values: typing.Iterable[typing.Mapping]) -> typing.Iterator:
+        for value in values:
+            yield self._project_value(value)
+
+    def _project_value(self, value: typing.Mapping) -> typing.Mapping:
+        if self.projection is None:
+            return value
+        return {key: value.get(key) for key in self.projection}
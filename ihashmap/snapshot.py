@@ -0,0 +1,468 @@
+import bisect
+import collections.abc
+import mmap
+import os
+import pickle
+import struct
+import threading
+import typing
+
+from ihashmap.cache import Cache
+from ihashmap.concurrency import Versioned, get_version, unwrap
+from ihashmap.index import Index, IndexContainer
+
+MAGIC = b"IHMSNAP1"
+HEADER = struct.Struct(">8sQ")
+"""Snapshot file header: magic and offset of table of contents."""
+
+RECORD = struct.Struct(">I")
+"""Changes log record header: length of pickled record."""
+
+SNAPSHOT_FILE = "indexes.snapshot"
+LOG_FILE = "indexes.log"
+
+PAGES, BYTES, OBJECT = "pages", "bytes", "object"
+"""Kinds of stored values: paged index entries, packed index bytes and other values."""
+
+STATS_KEY = "@stats"
+"""Table key of saved planner statistics of indexes."""
+
+
+class SnapshotEntries(collections.abc.Sequence):
+    """Read-only index entries loaded from snapshot page by page on access."""
+
+    def __init__(self, buffer, pages: typing.List[typing.Tuple[int, int, int]]):
+        """
+        :param buffer: memory mapped snapshot file.
+        :param pages: list of pages offsets, sizes and number of entries.
+        """
+
+        self.buffer = buffer
+        self.pages = pages
+        self.starts = []
+        length = 0
+        for _, _, count in pages:
+            self.starts.append(length)
+            length += count
+        self.length = length
+        self.loaded = {}
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(self.length))]
+        if position < 0:
+            position += self.length
+        if not 0 <= position < self.length:
+            raise IndexError(position)
+        page = bisect.bisect_right(self.starts, position) - 1
+        return self.load_page(page)[position - self.starts[page]]
+
+    def __iter__(self):
+        for page in range(len(self.pages)):
+            yield from self.load_page(page)
+
+    def load_page(self, page: int) -> list:
+        entries = self.loaded.get(page)
+        if entries is None:
+            offset, size, _ = self.pages[page]
+            stop = offset + size
+            entries = self.loaded[page] = pickle.loads(self.buffer[offset:stop])
+        return entries
+
+
+class IndexSnapshot:
+    """Persists indexes into memory mapped file for quick restart.
+
+    Snapshot file contains every index (its buckets and shards) stored under
+    Index.get_name names, entries are split into pages loaded lazily when
+    search accesses them. Index writes made after snapshot are appended
+    to changes log, which is replayed on open and merged by next save.
+
+    While registered, index reads are served from changes and snapshot
+    first and from GET_METHOD for indexes missing in them, index writes
+    go to both storage and changes log. Snapshot reflects writes of current
+    process only. Compare-and-set index rewrites (if the method is registered
+    before snapshot) are checked against stored data: data read from snapshot
+    is replaced by stored one when they differ and rewrite is retried.
+
+    Planner statistics of indexes are saved too and restored by register,
+    so restarted process doesn't read whole indexes to collect them.
+    Memory map of replaced snapshot stays open while SnapshotEntries use it.
+
+    Example:
+        snapshot = IndexSnapshot("/var/lib/app/indexes")
+        snapshot.open()
+        snapshot.register()
+        ...
+        snapshot.save(["my_cache"])
+    """
+
+    def __init__(self, path: str, page_size: int = 1024, fsync: bool = False):
+        """
+        :param str path: directory storing snapshot and changes log.
+        :param int page_size: number of index entries per page.
+        :param bool fsync: flush changes log to disk after every record.
+        """
+
+        self.path = path
+        self.page_size = page_size
+        self.fsync = fsync
+        self.table = {}
+        self.changes = {}
+        self.stats = {}
+        self._buffer = None
+        self._file = None
+        self._log = None
+        self._methods = None
+        self._lock = threading.RLock()
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.path, SNAPSHOT_FILE)
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.path, LOG_FILE)
+
+    def open(self):
+        """Maps snapshot file into memory and replays changes log."""
+
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            self._close_files()
+            self.table, self.changes, self.stats = {}, {}, {}
+            if os.path.exists(self.snapshot_path):
+                self._map_snapshot()
+            if os.path.exists(self.log_path):
+                self._replay_log()
+            self._log = open(self.log_path, "ab")
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.changes or key in self.table
+
+    def keys(self) -> typing.Set[str]:
+        return set(self.table).union(self.changes)
+
+    def get(self, key: str, default=None):
+        """Gets stored value. Paged index entries are returned as SnapshotEntries."""
+
+        with self._lock:
+            if key in self.changes:
+                return self.changes[key]
+            if key not in self.table:
+                return default
+            return self._load(key)
+
+    def set(self, key: str, value):
+        """Replaces stored value logging change."""
+
+        if isinstance(value, collections.UserList):
+            value = IndexContainer(value)  # don't share storage object changed in place
+        with self._lock:
+            self.changes[key] = value
+            self._append(("set", key, value))
+
+    def add(self, key: str, entry):
+        """Adds single index entry logging change."""
+
+        with self._lock:
+            self._get_entries(key).add(entry)
+            self._append(("add", key, entry))
+
+    def remove(self, key: str, entry):
+        """Removes single index entry logging change."""
+
+        with self._lock:
+            self._get_entries(key).discard(entry)
+            self._append(("remove", key, entry))
+
+    def save(self, cache_names: typing.Iterable[str] = ()):
+        """Writes all stored values into new snapshot and truncates changes log.
+
+        :param cache_names: caches whose indexes are read from storage,
+                            so indexes missing in snapshot are added to it
+                            and their statistics are collected.
+        """
+
+        with self._lock:
+            values = {key: self.get(key) for key in self.keys()}
+            stats = dict(self.stats)
+            for cache_name in cache_names:
+                self._read_indexes(cache_name, values)
+                for index in Index.find_index_for_cache(cache_name):
+                    index.get_stats(cache_name)
+            for (index, cache_name), index_stats in Index.__STATS__.items():
+                stats[index.get_name(cache_name)] = index_stats
+            os.makedirs(self.path, exist_ok=True)
+            temporary_path = f"{self.snapshot_path}.tmp"
+            with open(temporary_path, "wb") as snapshot_file:
+                self._write_snapshot(snapshot_file, values, stats)
+                snapshot_file.flush()
+                os.fsync(snapshot_file.fileno())
+            self._close_files()
+            os.replace(temporary_path, self.snapshot_path)
+            open(self.log_path, "wb").close()
+            self.open()
+
+    def restore_stats(self, cache_names: typing.Optional[typing.Iterable[str]] = None):
+        """Restores saved statistics of indexes which have none.
+
+        Called by register. Statistics don't reflect index changes logged
+        after save, they are estimations used by query planner only.
+
+        :param cache_names: caches whose indexes statistics are restored,
+                            all caches with defined indexes by default.
+        """
+
+        if cache_names is None:
+            cache_names = [name for name in Index.__INDEXES__ if name != "__global__"]
+        for cache_name in cache_names:
+            for index in Index.find_index_for_cache(cache_name):
+                saved = self.stats.get(index.get_name(cache_name))
+                if saved is not None and not index.has_stats(cache_name):
+                    index.set_stats(cache_name, saved)
+
+    def register(self):
+        """Routes index reads and writes of Cache through snapshot."""
+
+        if self._methods is not None:
+            return
+        self.restore_stats()
+        self._methods = methods = {
+            "GET_METHOD": Cache.GET_METHOD,
+            "SET_METHOD": Cache.SET_METHOD,
+            "INDEX_ADD_METHOD": Cache.INDEX_ADD_METHOD,
+            "INDEX_REMOVE_METHOD": Cache.INDEX_REMOVE_METHOD,
+            "COMPARE_AND_SET_METHOD": Cache.COMPARE_AND_SET_METHOD,
+        }
+
+        def get_method(cache, name, key, default=None):
+            if name == Index.INDEX_CACHE_NAME and key in self:
+                return self.get(key, default)
+            return methods["GET_METHOD"](cache, name, key, default)
+
+        def set_method(cache, name, key, value):
+            result = methods["SET_METHOD"](cache, name, key, value)
+            if name == Index.INDEX_CACHE_NAME:
+                self.set(key, value)
+            return result
+
+        Cache.register_get_method(get_method)
+        Cache.register_set_method(set_method)
+        if methods["COMPARE_AND_SET_METHOD"] is not None:
+            Cache.register_compare_and_set_method(
+                _checked_compare_and_set(
+                    methods["COMPARE_AND_SET_METHOD"], self._compare_and_set
+                )
+            )
+        for attribute, log in (
+            ("INDEX_ADD_METHOD", self.add),
+            ("INDEX_REMOVE_METHOD", self.remove),
+        ):
+            if methods[attribute] is not None:
+                setattr(Cache, attribute, _logged_delta(methods[attribute], log))
+
+    def unregister(self):
+        """Restores Cache methods replaced by register."""
+
+        if self._methods is None:
+            return
+        for attribute, method in self._methods.items():
+            setattr(Cache, attribute, method)
+        self._methods = None
+
+    def _compare_and_set(self, cache, key: str, expected, value) -> bool:
+        """Writes index data computed from expected one read from snapshot.
+
+        Expected data is compared with stored one, so rewrite succeeds
+        if snapshot matches storage. Otherwise snapshot is updated
+        from storage and rewrite is retried by Index.modify.
+        Written data is logged as changes.
+        """
+
+        stored = self._methods["GET_METHOD"](cache, Index.INDEX_CACHE_NAME, key, None)
+        if not _same_data(expected, stored):
+            self.set(key, IndexContainer() if stored is None else stored)
+            return False
+        value = Versioned(get_version(stored) + 1, unwrap(value))
+        compare_and_set = self._methods["COMPARE_AND_SET_METHOD"]
+        if not compare_and_set(cache, Index.INDEX_CACHE_NAME, key, stored, value):
+            return False
+        self.set(key, value)
+        return True
+
+    def _get_entries(self, key: str) -> IndexContainer:
+        entries = self.changes.get(key)
+        if not isinstance(entries, IndexContainer):
+            stored = self.get(key)
+            entries = IndexContainer(() if stored is None else unwrap(stored))
+            self.changes[key] = entries
+        return entries
+
+    def _append(self, record: tuple):
+        if self._log is None:
+            raise RuntimeError("IndexSnapshot is not opened")
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        self._log.write(RECORD.pack(len(data)) + data)
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+
+    def _replay_log(self):
+        with open(self.log_path, "rb") as log_file:
+            data = log_file.read()
+        position = 0
+        while position + RECORD.size <= len(data):
+            (size,) = RECORD.unpack_from(data, position)
+            start = position + RECORD.size
+            if start + size > len(data):
+                break  # record torn by crash
+            position = start + size
+            operation, key, value = pickle.loads(data[start:position])
+            if operation == "set":
+                self.changes[key] = value
+            elif operation == "add":
+                self._get_entries(key).add(value)
+            else:
+                self._get_entries(key).discard(value)
+
+    def _map_snapshot(self):
+        self._file = open(self.snapshot_path, "rb")
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, table_offset = HEADER.unpack_from(self._buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{self.snapshot_path} is not index snapshot")
+        self.table = pickle.loads(self._buffer[table_offset:])
+        if STATS_KEY in self.table:
+            self.stats = self._load(STATS_KEY)
+            del self.table[STATS_KEY]
+
+    def _close_files(self):
+        # Buffer isn't closed: SnapshotEntries returned by get may still use it,
+        # memory map is closed when last of them is garbage collected.
+        for opened in (self._file, self._log):
+            if opened is not None:
+                opened.close()
+        self._buffer = self._file = self._log = None
+
+    def _load(self, key: str):
+        kind, location = self.table[key]
+        if kind == PAGES:
+            return SnapshotEntries(self._buffer, location)
+        offset, size = location
+        stop = offset + size
+        data = self._buffer[offset:stop]
+        return data if kind == BYTES else pickle.loads(data)
+
+    def _write_snapshot(
+        self,
+        snapshot_file,
+        values: typing.Mapping[str, typing.Any],
+        stats: typing.Mapping[str, typing.Any],
+    ):
+        snapshot_file.write(HEADER.pack(MAGIC, 0))
+        table = {
+            STATS_KEY: (
+                OBJECT,
+                _write_data(
+                    snapshot_file, pickle.dumps(stats, pickle.HIGHEST_PROTOCOL)
+                ),
+            )
+        }
+        for key, value in sorted(values.items()):
+            value = unwrap(value)
+            if isinstance(value, (bytes, bytearray)):
+                table[key] = (BYTES, _write_data(snapshot_file, bytes(value)))
+            elif isinstance(value, (list, collections.UserList, SnapshotEntries)):
+                entries = list(value)
+                pages = []
+                for start in range(0, len(entries), self.page_size):
+                    stop = start + self.page_size
+                    page = entries[start:stop]
+                    offset, size = _write_data(
+                        snapshot_file, pickle.dumps(page, pickle.HIGHEST_PROTOCOL)
+                    )
+                    pages.append((offset, size, len(page)))
+                table[key] = (PAGES, pages)
+            else:
+                table[key] = (
+                    OBJECT,
+                    _write_data(
+                        snapshot_file, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                    ),
+                )
+        table_offset = snapshot_file.tell()
+        snapshot_file.write(pickle.dumps(table, pickle.HIGHEST_PROTOCOL))
+        snapshot_file.seek(0)
+        snapshot_file.write(HEADER.pack(MAGIC, table_offset))
+
+    def _read_indexes(self, cache_name: str, values: typing.Dict[str, typing.Any]):
+        """Adds stored data of cache indexes missing in values read from storage."""
+
+        get_method = (self._methods or {}).get("GET_METHOD") or Cache.GET_METHOD
+
+        def read(key: str):
+            if key not in values:
+                value = get_method(Cache, Index.INDEX_CACHE_NAME, key, None)
+                if value is None:
+                    return None
+                values[key] = value
+            return values[key]
+
+        for index in Index.find_index_for_cache(cache_name):
+            read(index.get_build_name(cache_name))
+            if index.shards > 1:
+                for shard in range(index.shards):
+                    read(index.get_name(cache_name, shard=shard))
+                continue
+            buckets = read(index.get_name(cache_name))
+            if index.bucketed and buckets is not None:
+                for bucket in unwrap(buckets):
+                    read(index.get_name(cache_name, bucket))
+
+
+def _same_data(first, second) -> bool:
+    """Compares index data ignoring versions and containers types."""
+
+    first, second = unwrap(first), unwrap(second)
+    if first is second:
+        return True
+    if first is None or second is None:
+        return not (first or second)
+    if isinstance(first, (bytes, bytearray)) or isinstance(second, (bytes, bytearray)):
+        return first == second
+    return list(first) == list(second)
+
+
+def _write_data(snapshot_file, data: bytes) -> typing.Tuple[int, int]:
+    offset = snapshot_file.tell()
+    snapshot_file.write(data)
+    return offset, len(data)
+
+
+def _logged_delta(method: typing.Callable, log: typing.Callable) -> typing.Callable:
+    def logged_method(cache, name, key, entry):
+        result = method(cache, name, key, entry)
+        if name == Index.INDEX_CACHE_NAME:
+            log(key, entry)
+        return result
+
+    return logged_method
+
+
+def _checked_compare_and_set(
+    method: typing.Callable, check: typing.Callable
+) -> typing.Callable:
+    def checked_method(cache, name, key, expected, value):
+        if name != Index.INDEX_CACHE_NAME:
+            return method(cache, name, key, expected, value)
+        return check(cache, key, expected, value)
+
+    return checked_method
@@ -0,0 +1,145 @@
+import collections.abc
+import typing
+
+_MISSING = object()
+
+
+class TrackedDict(collections.UserDict):
+    """Dict recording original values of changed keys.
+
+    Values of this type don't need snapshots of indexed fields:
+    changes are recorded on assignment, so reads make no extra allocations
+    and updates compare changed keys only.
+    Changes are recorded after value is read or written by Cache (until then
+    Cache doesn't know its stored version) and dropped on every such read or write.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.__original__ = None
+        super().__init__(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        self._track(key)
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        self._track(key)
+        del self.data[key]
+
+    def __copy__(self):
+        return type(self)(self.data)
+
+    def _track(self, key):
+        original = self.__original__
+        if original is not None and key not in original:
+            original[key] = self.data.get(key, _MISSING)
+
+    def get_original(self) -> typing.Optional[typing.Mapping]:
+        """Returns view of value before recorded changes.
+
+        :return: view or None if changes are not recorded yet.
+        """
+
+        if self.__original__ is None:
+            return None
+        return _OriginalView(self)
+
+    def get_changed_keys(self) -> typing.Set[str]:
+        """Returns keys which values differ from original ones."""
+
+        return {
+            key
+            for key, value in (self.__original__ or {}).items()
+            if self.data.get(key, _MISSING) != value
+        }
+
+    def commit(self):
+        """Forgets recorded changes and starts recording new ones."""
+
+        if self.__original__:
+            self.__original__.clear()
+        elif self.__original__ is None:
+            self.__original__ = {}
+
+
+class _OriginalView(collections.abc.Mapping):
+    """Read only view of TrackedDict before recorded changes."""
+
+    def __init__(self, value: TrackedDict):
+        self.value = value
+
+    def __getitem__(self, key):
+        original = self.value.__original__
+        if key not in original:
+            return self.value.data[key]
+        if original[key] is _MISSING:
+            raise KeyError(key)
+        return original[key]
+
+    def __iter__(self):
+        keys = set(self.value.data).union(self.value.__original__)
+        return (key for key in keys if key in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, key):
+        original = self.value.__original__
+        if key in original:
+            return original[key] is not _MISSING
+        return key in self.value.data
+
+
+def take_snapshot(value, keys: typing.Iterable[str]):
+    """Remembers indexed fields of value for future diff with its changed version.
+
+    Snapshot is stored in value.__shadow_copy__ and contains only given keys.
+    TrackedDict values just forget recorded changes (containers changed in place
+    are not recorded by them, assign changed copy instead).
+
+    :param value: cached value.
+    :param keys: indexed keys.
+    """
+
+    if isinstance(value, TrackedDict):
+        value.commit()
+        return
+    value.__shadow_copy__ = {
+        key: _copy_container(value[key]) for key in keys if key in value
+    }
+
+
+def _copy_container(item):
+    """Copies mutable containers, so their in place changes are detected."""
+
+    if isinstance(item, (list, set, dict)):
+        return type(item)(item)
+    return item
+
+
+def get_original(value) -> typing.Optional[typing.Mapping]:
+    """Returns indexed fields of value as they were on last snapshot.
+
+    :return: mapping or None if value has no snapshot.
+    """
+
+    if isinstance(value, TrackedDict):
+        return value.get_original()
+    return getattr(value, "__shadow_copy__", None)
+
+
+def get_changed_keys(
+    original: typing.Mapping, value: typing.Mapping, keys: typing.Iterable[str]
+) -> typing.Set[str]:
+    """Finds indexed keys which values were changed.
+
+    :param original: value returned by get_original.
+    :param value: changed value.
+    :param keys: indexed keys.
+    """
+
+    if isinstance(value, TrackedDict) and isinstance(original, _OriginalView):
+        return value.get_changed_keys().intersection(keys)
+    return {
+        key for key in keys if original.get(key, _MISSING) != value.get(key, _MISSING)
+    }
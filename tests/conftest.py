@@ -0,0 +1,78 @@
+import pytest
+
+from ihashmap.cache import Cache
+from ihashmap.index import Index
+
+
+@pytest.fixture
+def fake_cache():
+    return {Index.INDEX_CACHE_NAME: {}}
+
+
+@pytest.fixture
+def fake_get(fake_cache):
+    def _get(self, name, key, default=None):
+        return fake_cache[name].get(key, default)
+
+    return _get
+
+
+@pytest.fixture
+def fake_set(fake_cache):
+    def _set(self, name, key, value):
+        fake_cache.setdefault(name, {})[key] = value
+        return value
+
+    return _set
+
+
+@pytest.fixture
+def fake_update(fake_cache):
+    return fake_cache.update
+
+
+@pytest.fixture
+def fake_delete(fake_cache):
+    def _delete(self, name, key):
+        del fake_cache[name][key]
+
+    return _delete
+
+
+@pytest.fixture
+def registered_methods(fake_cache, fake_get, fake_set, fake_delete):
+    Cache.register_get_method(fake_get)
+    Cache.register_set_method(fake_set)
+    Cache.register_update_method(fake_set)
+    Cache.register_delete_method(fake_delete)
+    return fake_cache
+
+
+@pytest.fixture
+def compare_and_set(registered_methods, monkeypatch):
+    calls = []
+
+    def _compare_and_set(self, name, key, expected, value):
+        calls.append(key)
+        storage = registered_methods.setdefault(name, {})
+        if storage.get(key) != expected:
+            return False
+        storage[key] = value
+        return True
+
+    monkeypatch.setattr(Index, "CAS_BACKOFF", 0)
+    Cache.register_compare_and_set_method(_compare_and_set)
+    yield calls
+    Cache.register_compare_and_set_method(None)
+
+
+@pytest.fixture
+def pipeline_actions():
+    """Functions registered in Cache.PIPELINE by test, their actions are removed after it."""
+
+    functions = []
+    yield functions
+    for pipe in Cache.PIPELINE.pipes.values():
+        pipe._pipe_before[:] = [a for a in pipe._pipe_before if a.f not in functions]
+        pipe._pipe_after[:] = [a for a in pipe._pipe_after if a.f not in functions]
+        pipe.invalidate()
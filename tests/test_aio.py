@@ -0,0 +1,284 @@
+import asyncio
+import collections
+
+import pytest
+
+from ihashmap.aio import AsyncCache
+from ihashmap.concurrency import AsyncStripedLock, Versioned
+from ihashmap.index import Index, SortedIndex
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class FakeAsyncCache(AsyncCache):
+    def __init__(self, storage):
+        self.storage = storage
+        self.running = 0
+        self.max_running = 0
+
+    async def GET_METHOD(self, name, key, default=None):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0)
+        self.running -= 1
+        return self.storage.get(name, {}).get(key, default)
+
+    async def SET_METHOD(self, name, key, value):
+        self.storage.setdefault(name, {})[key] = value
+        return value
+
+    UPDATE_METHOD = SET_METHOD
+
+    async def DELETE_METHOD(self, name, key):
+        del self.storage[name][key]
+
+
+def test_AsyncCache(fake_cache):
+    class AsyncIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_aio"
+        bucketed = True
+
+    class AsyncIndexByPrice(SortedIndex):
+        keys = ["price", "_id"]
+        cache_name = "test_aio"
+
+    cache = FakeAsyncCache(fake_cache)
+    run(
+        cache.set_many(
+            "test_aio",
+            {
+                str(i): collections.UserDict(
+                    {"_id": str(i), "color": ["red", "blue"][i % 2], "price": i}
+                )
+                for i in range(10)
+            },
+        )
+    )
+    value = collections.UserDict({"_id": "10", "color": "red", "price": 0})
+    run(cache.set("test_aio", "10", value))
+    run(cache.delete("test_aio", "0"))
+
+    result = run(cache.search("test_aio", {"color": "red"}))
+    assert AsyncIndexByColor.get_stats("test_aio").entries == 10
+    assert {value["_id"] for value in result} == {"2", "4", "6", "8", "10"}
+
+    result = run(
+        cache.search("test_aio", {"price": {"$gte": 3}}, sort="-price", limit=2)
+    )
+    assert [value["price"] for value in result] == [9, 8]
+
+    async def collect():
+        return [value async for value in cache.iter_all("test_aio", chunk_size=3)]
+
+    assert len(run(collect())) == 10
+    plan = run(cache.explain("test_aio", {"color": "blue"}))
+    assert plan["scans"][0]["index"] == "AsyncIndexByColor"
+
+
+def test_AsyncCache_concurrency(fake_cache):
+    class AsyncConcurrencyCache(FakeAsyncCache):
+        CONCURRENCY = 3
+
+    cache = AsyncConcurrencyCache(fake_cache)
+    run(
+        cache.set_many(
+            "test_aio_concurrency",
+            {str(i): collections.UserDict({"_id": str(i)}) for i in range(20)},
+        )
+    )
+    assert len(run(cache.all("test_aio_concurrency"))) == 20
+    assert cache.max_running == 3
+
+
+def test_AsyncCache_batch(fake_cache):
+    class AsyncUnitOfWorkIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_aio_unit_of_work"
+
+    class AsyncBatchCache(FakeAsyncCache):
+        async def SET_METHOD(self, name, key, value):
+            writes.append((name, key))
+            return await super().SET_METHOD(name, key, value)
+
+    writes = []
+    name = AsyncUnitOfWorkIndexByColor.cache_name
+    cache = AsyncBatchCache(fake_cache)
+    for key in ("1", "2"):
+        value = collections.UserDict({"_id": key, "color": "red"})
+        run(cache.set(name, key, value))
+    writes.clear()
+
+    async def write_batch():
+        async with cache.batch():
+            first = await cache.get(name, "1")
+            first["color"] = "blue"
+            await cache.update(name, "1", first)
+            await cache.delete(name, "2")
+            await cache.set(
+                name, "3", collections.UserDict({"_id": "3", "color": "red"})
+            )
+            async with cache.batch():
+                value = collections.UserDict({"_id": "4", "color": "green"})
+                await cache.set(name, "4", value)
+
+            assert writes == []
+            assert await cache.get(name, "2") is None
+            assert await cache.get_many(name, ["1", "2", "4"]) == [first, None, value]
+
+    run(write_batch())
+    assert sorted(writes) == [
+        (Index.INDEX_CACHE_NAME, "test_aio_unit_of_work:_id"),
+        (Index.INDEX_CACHE_NAME, "test_aio_unit_of_work:_id_color"),
+        (name, "3"),
+        (name, "4"),
+    ]
+    indexes = fake_cache[Index.INDEX_CACHE_NAME]
+    assert indexes["test_aio_unit_of_work:_id"] == ["1", "3", "4"]
+    assert indexes["test_aio_unit_of_work:_id_color"] == ["1:blue", "3:red", "4:green"]
+    assert run(cache.search(name, {"color": "red"})) == [{"_id": "3", "color": "red"}]
+
+
+def test_AsyncCache_batch_rollback(fake_cache):
+    name = "test_aio_unit_of_work_rollback"
+    cache = FakeAsyncCache(fake_cache)
+    run(cache.set(name, "1", collections.UserDict({"_id": "1"})))
+
+    async def write_batch():
+        async with cache.batch():
+            await cache.set(name, "2", collections.UserDict({"_id": "2"}))
+            await cache.delete(name, "1")
+            raise ValueError()
+
+    with pytest.raises(ValueError):
+        run(write_batch())
+    assert cache._batch is None
+    assert run(cache.all(name)) == [{"_id": "1"}]
+    run(cache.set(name, "2", collections.UserDict({"_id": "2"})))
+    assert len(run(cache.all(name))) == 2
+
+
+def test_AsyncCache_batch_failed_flush(fake_cache):
+    name = "test_aio_unit_of_work_failed"
+    cache = FakeAsyncCache(fake_cache)
+
+    async def write_batch():
+        async with cache.batch():
+            await cache.set(name, "1", collections.UserDict({"_id": "1"}))
+            await cache.delete(name, "missing")
+
+    with pytest.raises(KeyError):
+        run(write_batch())
+    assert list(fake_cache[name]) == ["1"]
+    assert run(cache.all(name)) == [{"_id": "1"}]
+
+
+def test_AsyncCache_sharded(fake_cache):
+    class AsyncShardedIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_aio_sharded"
+        shards = 3
+
+    cache = FakeAsyncCache(fake_cache)
+    values = {
+        str(i): collections.UserDict({"_id": str(i), "color": ["red", "blue"][i % 2]})
+        for i in range(9)
+    }
+    run(cache.set_many("test_aio_sharded", values))
+    indexes = fake_cache[Index.INDEX_CACHE_NAME]
+    assert sorted(
+        entry
+        for shard in range(3)
+        for entry in indexes[f"test_aio_sharded:_id_color#{shard}"]
+    ) == sorted(f"{i}:{['red', 'blue'][i % 2]}" for i in range(9))
+
+    cache.max_running = 0
+    result = run(cache.search("test_aio_sharded", {"color": "blue"}))
+    assert [value["_id"] for value in result] == ["1", "3", "5", "7"]
+    assert cache.max_running > 1
+
+    run(cache.delete("test_aio_sharded", "1"))
+    shard = AsyncShardedIndexByColor.get_shard("1:blue")
+    assert "1:blue" not in indexes[f"test_aio_sharded:_id_color#{shard}"]
+
+
+def test_AsyncCache_requires_build(fake_cache):
+    class AsyncBuiltIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_aio_build"
+        requires_build = True
+
+    cache = FakeAsyncCache(fake_cache)
+    query = {"color": "red"}
+    assert run(cache.explain("test_aio_build", query))["scans"][0]["index"] == "PkIndex"
+
+    fake_cache[Index.INDEX_CACHE_NAME]["test_aio_build:_id_color@build"] = {
+        "status": "ready"
+    }
+    assert (
+        run(cache.explain("test_aio_build", query))["scans"][0]["index"]
+        == "AsyncBuiltIndexByColor"
+    )
+
+
+class StaleReadAsyncCache(FakeAsyncCache):
+    async def GET_METHOD(self, name, key, default=None):
+        value = self.storage.get(name, {}).get(key, default)
+        await asyncio.sleep(0)
+        return value
+
+
+def test_AsyncCache_compare_and_set(fake_cache, monkeypatch):
+    class AsyncCompareAndSetCache(StaleReadAsyncCache):
+        async def COMPARE_AND_SET_METHOD(self, name, key, expected, value):
+            storage = self.storage.setdefault(name, {})
+            if storage.get(key) != expected:
+                return False
+            storage[key] = value
+            return True
+
+    monkeypatch.setattr(Index, "CAS_BACKOFF", 0)
+    cache = AsyncCompareAndSetCache(fake_cache)
+
+    async def set_all():
+        await asyncio.gather(
+            *(
+                cache.set("test_aio_cas", str(i), collections.UserDict({"_id": str(i)}))
+                for i in range(10)
+            )
+        )
+
+    run(set_all())
+    stored = fake_cache[Index.INDEX_CACHE_NAME]["test_aio_cas:_id"]
+    assert isinstance(stored, Versioned)
+    assert sorted(stored.data) == sorted(str(i) for i in range(10))
+    assert len(run(cache.all("test_aio_cas"))) == 10
+
+
+@pytest.mark.parametrize("stripes", [1, 4])
+def test_AsyncCache_striped_locks(fake_cache, stripes):
+    class AsyncLockedCache(StaleReadAsyncCache):
+        INDEX_LOCKS = AsyncStripedLock(stripes)
+
+    cache = AsyncLockedCache(fake_cache)
+
+    async def set_all():
+        await asyncio.gather(
+            *(
+                cache.set(
+                    "test_aio_locks", str(i), collections.UserDict({"_id": str(i)})
+                )
+                for i in range(10)
+            )
+        )
+
+    run(set_all())
+    assert sorted(fake_cache[Index.INDEX_CACHE_NAME]["test_aio_locks:_id"]) == sorted(
+        str(i) for i in range(10)
+    )
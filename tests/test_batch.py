@@ -0,0 +1,108 @@
+import collections
+
+import pytest
+
+from ihashmap.cache import Cache
+from ihashmap.index import Index, PkIndex
+
+
+@pytest.fixture
+def storage_writes(registered_methods, pipeline_actions):
+    writes = []
+
+    @Cache.PIPELINE.set_many.after()
+    @Cache.PIPELINE.update_many.after()
+    @Cache.PIPELINE.delete_many.after()
+    @Cache.PIPELINE.index_set.after()
+    def count_writes(ctx):
+        if ctx.name.startswith("test_unit_of_work"):
+            writes.append(ctx.cls_or_self)
+
+    pipeline_actions.append(count_writes)
+    return writes
+
+
+def test_Cache_batch_flush(registered_methods, storage_writes):
+    class UnitOfWorkIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_unit_of_work"
+
+    name = UnitOfWorkIndexByColor.cache_name
+    cache = Cache()
+    cache.set(name, "1", collections.UserDict({"_id": "1", "color": "red"}))
+    cache.set(name, "2", collections.UserDict({"_id": "2", "color": "red"}))
+    storage_writes.clear()
+
+    with cache.batch():
+        first = cache.get(name, "1")
+        first["color"] = "blue"
+        cache.update(name, "1", first)
+        cache.delete(name, "2")
+        for key in ("3", "4"):
+            cache.set(name, key, collections.UserDict({"_id": key, "color": "red"}))
+        fourth = cache.get(name, "4")
+        fourth["color"] = "green"
+        cache.update(name, "4", fourth)
+
+        assert storage_writes == []
+        assert cache.get(name, "2") is None
+        assert cache.get_many(name, ["1", "2", "4"]) == [first, None, fourth]
+
+    assert storage_writes[:3] == [cache, cache, cache]
+    assert set(storage_writes[3:]) == {PkIndex, UnitOfWorkIndexByColor}
+    assert len(storage_writes) == 5
+    assert cache.search(name, {"color": "red"}) == [{"_id": "3", "color": "red"}]
+    assert registered_methods[Index.INDEX_CACHE_NAME][
+        "test_unit_of_work:_id_color"
+    ] == ["1:blue", "3:red", "4:green"]
+    assert registered_methods[Index.INDEX_CACHE_NAME]["test_unit_of_work:_id"] == [
+        "1",
+        "3",
+        "4",
+    ]
+
+
+def test_Cache_batch_rollback(registered_methods, storage_writes):
+    class UnitOfWorkIndexBySize(Index):
+        keys = ["_id", "size"]
+        cache_name = "test_unit_of_work_rollback"
+
+    name = UnitOfWorkIndexBySize.cache_name
+    cache = Cache()
+    cache.set(name, "1", collections.UserDict({"_id": "1", "size": 1}))
+    storage_writes.clear()
+
+    value = cache.get(name, "1")
+    with pytest.raises(ValueError):
+        with cache.batch():
+            value["size"] = 2
+            cache.update(name, "1", value)
+            cache.set(name, "2", collections.UserDict({"_id": "2", "size": 1}))
+            with cache.batch():
+                cache.delete(name, "1")
+            raise ValueError()
+
+    assert storage_writes == []
+    assert cache.get(name, "2") is None
+    assert cache.search(name, {"size": 2}) == []
+
+    cache.update(name, "1", value)
+    assert cache.search(name, {"size": 2}) == [{"_id": "1", "size": 2}]
+
+
+def test_Cache_batch_failed_flush(registered_methods):
+    class UnitOfWorkIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_unit_of_work_failed"
+
+    name = UnitOfWorkIndexByColor.cache_name
+    cache = Cache()
+    with pytest.raises(KeyError):
+        with cache.batch():
+            cache.set(name, "1", collections.UserDict({"_id": "1", "color": "red"}))
+            cache.delete(name, "missing")
+
+    assert list(registered_methods[name]) == ["1"]
+    assert PkIndex.get(name) == ["1"]
+    assert cache.all(name) == [{"_id": "1", "color": "red"}]
+    assert cache.search(name, {"color": "red"}) == [{"_id": "1", "color": "red"}]
@@ -0,0 +1,100 @@
+import collections
+
+from ihashmap.bloom import BloomFilter, CountingBloomFilter, KeyFilter
+from ihashmap.cache import Cache
+from ihashmap.index import Index
+
+
+def test_BloomFilter():
+    bloom = BloomFilter.create(1000, error_rate=0.01)
+    assert bloom.hashes == 7
+    for i in range(1000):
+        bloom.add(str(i))
+    assert all(str(i) in bloom for i in range(1000))
+    false_positives = sum(str(i) in bloom for i in range(1000, 11000))
+    assert false_positives < 200
+    assert 0.005 < bloom.error_rate < 0.02
+
+    assert BloomFilter.create(1000, 0.01, max_bytes=64).nbytes == 64
+    assert CountingBloomFilter.create(1000, 0.01, max_bytes=64).nbytes == 64
+
+    counting = CountingBloomFilter.create(100, error_rate=0.01)
+    counting.add("1")
+    counting.add("2")
+    counting.remove("1")
+    assert "1" not in counting
+    assert "2" in counting
+
+
+def test_Cache_key_filter(registered_methods):
+    class BloomIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_bloom"
+
+    cache = Cache()
+    cache.set("test_bloom", "1", collections.UserDict({"_id": "1", "color": "red"}))
+
+    key_filter = KeyFilter()
+    key_filter.track("test_bloom", capacity=100, error_rate=0.001)
+    Cache.register_key_filter(key_filter)
+    original_get = Cache.GET_METHOD
+    reads = []
+
+    def counted_get(self, name, key, default=None):
+        reads.append((name, key))
+        return original_get(self, name, key, default)
+
+    Cache.register_get_method(counted_get)
+    try:
+        assert cache.get("test_bloom", "1")["color"] == "red"
+        assert cache.get("test_bloom", "missing") is None
+        assert ("test_bloom", "missing") not in reads
+        assert cache.get_many("test_bloom", ["1", "other"])[1] is None
+        assert ("test_bloom", "other") not in reads
+
+        cache.set_many(
+            "test_bloom",
+            {"2": collections.UserDict({"_id": "2", "color": "blue"})},
+        )
+        assert cache.get("test_bloom", "2")["color"] == "blue"
+        cache.delete("test_bloom", "1")
+        reads.clear()
+        assert cache.get("test_bloom", "1") is None
+        assert reads == []
+        assert [
+            value["_id"] for value in cache.search("test_bloom", {"color": "blue"})
+        ] == ["2"]
+
+        stats = key_filter.stats("test_bloom")
+        assert stats["avoided"] == 3
+        assert stats["false_positives"] == 0
+        assert stats["keys"] == 1
+        assert stats["bytes"] == key_filter.filters["test_bloom"].nbytes
+    finally:
+        Cache.register_get_method(original_get)
+        Cache.register_key_filter(None)
+
+
+def test_Cache_key_filter_rewrites(registered_methods):
+    key_filter = KeyFilter()
+    key_filter.track("test_bloom_rewrites", capacity=100, error_rate=0.001)
+    Cache.register_key_filter(key_filter)
+    try:
+        cache = Cache()
+        for key in ("1", "2", "3"):
+            value = collections.UserDict({"_id": key, "size": 1})
+            cache.set("test_bloom_rewrites", key, value)
+        cache.update("test_bloom_rewrites", "1", cache.get("test_bloom_rewrites", "1"))
+        cache.set("test_bloom_rewrites", "2", collections.UserDict({"_id": "2"}))
+        cache.update_many(
+            "test_bloom_rewrites", {"3": collections.UserDict({"_id": "3"})}
+        )
+        cache.set_many("test_bloom_rewrites", {"3": collections.UserDict({"_id": "3"})})
+        assert key_filter.stats("test_bloom_rewrites")["keys"] == 3
+
+        cache.delete_many("test_bloom_rewrites", ["1", "2", "3"])
+        assert key_filter.stats("test_bloom_rewrites")["keys"] == 0
+        for key in ("1", "2", "3"):
+            assert not key_filter.might_contain("test_bloom_rewrites", key)
+    finally:
+        Cache.register_key_filter(None)
@@ -0,0 +1,102 @@
+import collections
+
+import pytest
+
+from ihashmap.builder import IndexBuilder
+from ihashmap.cache import Cache
+from ihashmap.index import Index
+from ihashmap.local import LocalCache
+
+
+def test_IndexBuilder(registered_methods):
+    cache_name = "test_builder"
+    cache = Cache()
+    cache.set_many(
+        cache_name,
+        {
+            str(i): collections.UserDict(
+                {"_id": str(i), "color": ["red", "blue"][i % 2]}
+            )
+            for i in range(10)
+        },
+    )
+
+    class BuiltIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_builder"
+        requires_build = True
+
+    def get_driver():
+        return cache.explain(cache_name, {"color": "blue"})["scans"][0]["index"]
+
+    assert get_driver() == "PkIndex"
+    assert len(cache.search(cache_name, {"color": "blue"})) == 5
+
+    progress, sleeps = [], []
+
+    def interrupt(done, total):
+        progress.append((done, total))
+        if done == 6:
+            raise KeyboardInterrupt()
+
+    builder = IndexBuilder(
+        BuiltIndexByColor,
+        cache_name,
+        cache=cache,
+        chunk_size=3,
+        max_rate=3,
+        progress=interrupt,
+        clock=lambda: 0.0,
+        sleep=sleeps.append,
+    )
+    with pytest.raises(KeyboardInterrupt):
+        builder.run()
+    assert builder.get_state() == {"status": "building", "last_key": "5", "done": 6}
+    assert get_driver() == "PkIndex"
+
+    cache.set(cache_name, "11", collections.UserDict({"_id": "11", "color": "blue"}))
+    builder.progress = lambda done, total: progress.append((done, total))
+    assert builder.run()["status"] == "ready"
+    assert progress == [(3, 10), (6, 10), (10, 11), (11, 11)]
+    assert sleeps == [1.0, 1.0, 4 / 3]
+
+    assert get_driver() == "BuiltIndexByColor"
+    assert sorted(
+        value["_id"] for value in cache.search(cache_name, {"color": "blue"})
+    ) == [
+        "1",
+        "11",
+        "3",
+        "5",
+        "7",
+        "9",
+    ]
+    assert (
+        len(registered_methods[Index.INDEX_CACHE_NAME]["test_builder:_id_color"]) == 11
+    )
+
+    registered_methods[Index.INDEX_CACHE_NAME]["test_builder:_id_color"] = []
+    builder.run(rebuild=True)
+    assert (
+        len(registered_methods[Index.INDEX_CACHE_NAME]["test_builder:_id_color"]) == 11
+    )
+
+
+def test_IndexBuilder_local_cache(registered_methods):
+    cache_name = "test_builder_local"
+    Cache().set(cache_name, "1", collections.UserDict({"_id": "1", "color": "red"}))
+
+    class LocalBuiltIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_builder_local"
+        requires_build = True
+
+    Cache.register_local_cache(LocalCache())
+    try:
+        builder = IndexBuilder(LocalBuiltIndexByColor, cache_name)
+        builder.set_state({"status": "building", "last_key": None, "done": 0})
+        assert builder.get_state()["status"] == "building"
+        assert builder.run()["status"] == "ready"
+        assert builder.get_state()["status"] == "ready"
+    finally:
+        Cache.register_local_cache(None)
@@ -4,43 +4,14 @@ from unittest.mock import MagicMock
 import bson
 import pytest
 
-from ihashmap.cache import Cache
-from ihashmap.index import Index, IndexContainer
-
-
-@pytest.fixture
-def fake_cache():
-    return {Index.INDEX_CACHE_NAME: {}}
-
-
-@pytest.fixture
-def fake_get(fake_cache):
-    def _get(self, name, key, default=None):
-        return fake_cache[name].get(key, default)
-
-    return _get
-
-
-@pytest.fixture
-def fake_set(fake_cache):
-    def _set(self, name, key, value):
-        fake_cache.setdefault(name, {})[key] = value
-        return value
-
-    return _set
-
-
-@pytest.fixture
-def fake_update(fake_cache):
-    return fake_cache.update
-
-
-@pytest.fixture
-def fake_delete(fake_cache):
-    def _delete(self, name, key):
-        del fake_cache[name][key]
-
-    return _delete
+from ihashmap.cache import Cache, PipelineManager
+from ihashmap.index import (
+    Index,
+    IndexContainer,
+    InvertedIndex,
+    PrefixIndex,
+    SortedIndex,
+)
 
 
 def test_Cache_simple(fake_cache, fake_get, fake_set, fake_update, fake_delete):
@@ -115,3 +86,470 @@ def test_IndexContainer_append():
 
     container.append(id1)
     assert container == [id1, id2]
+
+
+def test_IndexContainer_add_discard():
+    container = IndexContainer()
+    container.add("b")
+    container.add("a")
+    container.add("b")
+    assert container == ["a", "b"]
+
+    container.discard("c")
+    container.discard("a")
+    assert container == ["b"]
+
+
+def test_Index_delta_methods(fake_cache, fake_get, fake_set, fake_delete):
+    Cache.register_get_method(fake_get)
+    Cache.register_set_method(fake_set)
+    Cache.register_delete_method(fake_delete)
+
+    set_calls = []
+
+    def index_add(self, name, key, entry):
+        fake_cache[name].setdefault(key, IndexContainer()).add(entry)
+
+    def index_remove(self, name, key, entry):
+        fake_cache[name].setdefault(key, IndexContainer()).discard(entry)
+
+    def counting_set(self, name, key, value):
+        set_calls.append((name, key))
+        return fake_set(self, name, key, value)
+
+    Cache.register_set_method(counting_set)
+    Cache.register_index_add_method(index_add)
+    Cache.register_index_remove_method(index_remove)
+    try:
+
+        class IndexByColor(Index):
+            keys = ["_id", "color"]
+            cache_name = "test_delta"
+
+        cache = Cache()
+        cache.set("test_delta", "2", collections.UserDict({"_id": "2", "color": "red"}))
+        cache.set(
+            "test_delta", "1", collections.UserDict({"_id": "1", "color": "blue"})
+        )
+
+        assert set_calls == [("test_delta", "2"), ("test_delta", "1")]
+        assert fake_cache[Index.INDEX_CACHE_NAME]["test_delta:_id"] == ["1", "2"]
+        assert fake_cache[Index.INDEX_CACHE_NAME]["test_delta:_id_color"] == [
+            "1:blue",
+            "2:red",
+        ]
+
+        cache.delete("test_delta", "2")
+        assert fake_cache[Index.INDEX_CACHE_NAME]["test_delta:_id"] == ["1"]
+        assert cache.search("test_delta", {"color": "blue"}) == [
+            {"_id": "1", "color": "blue"}
+        ]
+    finally:
+        Cache.INDEX_ADD_METHOD = None
+        Cache.INDEX_REMOVE_METHOD = None
+
+
+def test_Pipeline_compile_invalidation():
+    parent = PipelineManager()
+    calls = []
+
+    parent.get.before(priority=2)(lambda ctx: calls.append("parent"))
+    child = PipelineManager(parent_manager=parent)
+    child.get.before(cache_name="other")(lambda ctx: calls.append("other"))
+
+    assert len(child.get.compile("test")[0]) == 1
+    assert child.get.compile("test") is child.get.compile("test")
+
+    parent.get.before(priority=0)(lambda ctx: calls.append("first"))
+    before, _ = child.get.compile("test")
+    for action in before:
+        action(None)
+    assert calls == ["first", "parent"]
+    assert len(child.get.compile("other")[0]) == 3
+
+
+def test_Cache_batch(fake_cache, fake_get, fake_set, fake_delete, pipeline_actions):
+    Cache.register_get_method(fake_get)
+    Cache.register_set_method(fake_set)
+    Cache.register_update_method(fake_set)
+    Cache.register_delete_method(fake_delete)
+
+    class IndexByKind(Index):
+        keys = ["_id", "kind"]
+        cache_name = "test_batch"
+
+    index_writes = []
+
+    @Cache.PIPELINE.index_set.after()
+    def count_writes(ctx):
+        index_writes.append(ctx.name)
+
+    pipeline_actions.append(count_writes)
+
+    entities = {
+        str(i): collections.UserDict({"_id": str(i), "kind": i % 2}) for i in range(4)
+    }
+
+    cache = Cache()
+    cache.set_many("test_batch", entities)
+    assert index_writes == ["test_batch", "test_batch"]
+    assert cache.get_many("test_batch", ["0", "3", "10"]) == [
+        entities["0"],
+        entities["3"],
+        None,
+    ]
+    found = cache.search("test_batch", {"kind": 1})
+    assert sorted(found, key=lambda value: value["_id"]) == [
+        entities["1"],
+        entities["3"],
+    ]
+
+    changed = cache.get_many("test_batch", ["0", "1"])
+    for entity in changed:
+        entity.__shadow_copy__ = collections.UserDict(entity)
+        entity["kind"] = 2
+    cache.update_many("test_batch", dict(zip(["0", "1"], changed)))
+    assert fake_cache[Index.INDEX_CACHE_NAME]["test_batch:_id_kind"] == [
+        "0:2",
+        "1:2",
+        "2:0",
+        "3:1",
+    ]
+
+    index_writes.clear()
+    cache.delete_many("test_batch", ["0", "2"])
+    assert index_writes == ["test_batch", "test_batch"]
+    assert fake_cache[Index.INDEX_CACHE_NAME]["test_batch:_id"] == ["1", "3"]
+    assert fake_cache["test_batch"] == {"1": entities["1"], "3": entities["3"]}
+
+    Cache.register_get_many_method(
+        lambda self, name, keys, default=None: [
+            fake_cache[name].get(key, default) for key in keys
+        ]
+    )
+    try:
+        assert cache.get_many("test_batch", ["1"]) == [entities["1"]]
+    finally:
+        Cache.GET_MANY_METHOD = None
+
+
+def test_Index_bucketed(fake_cache, fake_get, fake_set, fake_delete, pipeline_actions):
+    Cache.register_get_method(fake_get)
+    Cache.register_set_method(fake_set)
+    Cache.register_update_method(fake_set)
+    Cache.register_delete_method(fake_delete)
+
+    class BucketedIndexByModel(Index):
+        keys = ["_id", "model"]
+        cache_name = "test_bucketed"
+        bucketed = True
+
+    cache = Cache()
+    first = collections.UserDict({"_id": "1", "model": "a"})
+    second = collections.UserDict({"_id": "2", "model": "b"})
+    third = collections.UserDict({"_id": "3", "model": "a"})
+    cache.set("test_bucketed", "1", first)
+    cache.set_many("test_bucketed", {"2": second, "3": third})
+
+    indexes = fake_cache[Index.INDEX_CACHE_NAME]
+    assert indexes["test_bucketed:_id_model"] == ["a", "b"]
+    assert indexes["test_bucketed:_id_model:a"] == ["1", "3"]
+    assert indexes["test_bucketed:_id_model:b"] == ["2"]
+
+    index_reads = []
+
+    @Cache.PIPELINE.index_get.before()
+    def count_reads(ctx):
+        index_reads.append(ctx.kwargs.get("bucket"))
+
+    pipeline_actions.append(count_reads)
+
+    assert BucketedIndexByModel.find("test_bucketed", {"model": "a"}) == [
+        {"model": "a", "_id": "1"},
+        {"model": "a", "_id": "3"},
+    ]
+    assert index_reads == ["a"]
+
+    assert cache.search("test_bucketed", {"model": lambda model: model > "a"}) == [
+        second
+    ]
+
+    cache.delete("test_bucketed", "2")
+    assert indexes["test_bucketed:_id_model"] == ["a"]
+    assert indexes["test_bucketed:_id_model:b"] == []
+
+
+def test_SortedIndex(fake_cache, fake_get, fake_set, fake_delete):
+    Cache.register_get_method(fake_get)
+    Cache.register_set_method(fake_set)
+    Cache.register_delete_method(fake_delete)
+
+    class IndexByCreated(SortedIndex):
+        keys = ["created", "_id"]
+        cache_name = "test_sorted"
+
+    cache = Cache()
+    entities = {
+        str(i): collections.UserDict({"_id": str(i), "created": i, "even": i % 2 == 0})
+        for i in (9, 10, 1, 30, 20)
+    }
+    cache.set_many("test_sorted", entities)
+
+    assert [created for created, _ in IndexByCreated.get("test_sorted")] == [
+        1,
+        9,
+        10,
+        20,
+        30,
+    ]
+    assert IndexByCreated.get_range(
+        IndexByCreated.get("test_sorted"), {"$gt": 9, "$lte": 20}
+    ) == (2, 4)
+
+    def created(query, **kwargs):
+        return [
+            entity["created"] for entity in cache.search("test_sorted", query, **kwargs)
+        ]
+
+    assert created({"created": {"$gt": 9}}) == [10, 20, 30]
+    assert created({"created": {"$between": (5, 20)}}) == [9, 10, 20]
+    assert created({"created": 10}) == [10]
+    assert created({}, sort="-created", limit=2) == [30, 20]
+    assert created({"even": True}, sort="-created", limit=2) == [30, 20]
+    assert created({"even": False, "created": {"$lt": 10}}) == [1, 9]
+    assert created({"even": True}, sort="_id") == [10, 20, 30]
+
+
+def test_Cache_search_mapping_values(registered_methods):
+    cache = Cache()
+    cache.set_many(
+        "test_mapping_values",
+        {
+            "1": collections.UserDict({"_id": "1", "meta": {"a": 1}, "n": 2}),
+            "2": collections.UserDict({"_id": "2", "meta": {"a": 2}}),
+            "3": collections.UserDict({"_id": "3", "meta": {"a": 1}, "n": 1}),
+        },
+    )
+
+    def ids(query, **kwargs):
+        return [
+            value["_id"]
+            for value in cache.search("test_mapping_values", query, **kwargs)
+        ]
+
+    assert ids({"meta": {"a": 1}}, sort="_id") == ["1", "3"]
+    assert ids({"_id": {"$lte": "2"}, "meta": {"a": 2}}) == ["2"]
+    assert ids({}, sort="n") == ["3", "1", "2"]
+    assert ids({}, sort="-n") == ["1", "3", "2"]
+    assert ids({}, sort="-n", limit=2) == ["1", "3"]
+    assert Cache.is_operators({"$gt": 1, "$lt": 3})
+    assert not Cache.is_operators({"$gt": 1, "a": 3})
+    assert not Cache.is_operators({})
+
+
+def test_Cache_iter(registered_methods, pipeline_actions):
+    class IndexByGroup(Index):
+        keys = ["_id", "group"]
+        cache_name = "test_iter"
+
+    cache = Cache()
+    cache.set_many(
+        "test_iter",
+        {
+            f"{i:02}": collections.UserDict({"_id": f"{i:02}", "group": i % 2})
+            for i in range(10)
+        },
+    )
+
+    chunks = []
+
+    @Cache.PIPELINE.get_many.before(cache_name="test_iter")
+    def count_chunks(ctx):
+        chunks.append(len(ctx.args[0]))
+
+    pipeline_actions.append(count_chunks)
+
+    values = cache.iter_all("test_iter", chunk_size=4)
+    assert next(values)["_id"] == "00"
+    assert chunks == [4]
+    assert [value["_id"] for value in values][-1] == "09"
+    assert chunks == [4, 4, 2]
+
+    chunks.clear()
+    values = cache.iter_search("test_iter", {"group": 1}, limit=3, chunk_size=2)
+    assert [value["_id"] for value in values] == ["01", "03", "05"]
+    assert chunks == [2, 1]
+
+
+def test_Cache_all_get_many_pipeline(registered_methods, pipeline_actions):
+    class IndexByLabel(Index):
+        keys = ["_id", "label"]
+        cache_name = "test_all_pipeline"
+
+    cache = Cache()
+    cache.set_many(
+        "test_all_pipeline",
+        {str(i): collections.UserDict({"_id": str(i), "label": "a"}) for i in range(3)},
+    )
+
+    @Cache.PIPELINE.get_many.after(cache_name="test_all_pipeline")
+    def mark_values(ctx):
+        ctx.result = [collections.UserDict(value, read=True) for value in ctx.result]
+
+    pipeline_actions.append(mark_values)
+
+    assert sorted(value["_id"] for value in cache.all("test_all_pipeline")) == [
+        "0",
+        "1",
+        "2",
+    ]
+    assert all(value["read"] for value in cache.all("test_all_pipeline"))
+    assert all(
+        value["read"] for value in cache.search("test_all_pipeline", {"label": "a"})
+    )
+
+
+def test_Index_sharded(registered_methods, pipeline_actions):
+    class ShardedIndexBySize(SortedIndex):
+        keys = ["size", "_id"]
+        cache_name = "test_sharded"
+        shards = 4
+
+    index_writes = []
+
+    @Cache.PIPELINE.index_set.after()
+    def count_writes(ctx):
+        if ctx.name == "test_sharded" and "shard" in ctx.kwargs:
+            index_writes.append(ctx.kwargs["shard"])
+
+    pipeline_actions.append(count_writes)
+
+    cache = Cache()
+    cache.set_many(
+        "test_sharded",
+        {str(i): collections.UserDict({"_id": str(i), "size": i}) for i in range(20)},
+    )
+    indexes = registered_methods[Index.INDEX_CACHE_NAME]
+    shards = [indexes[f"test_sharded:size__id#{shard}"] for shard in range(4)]
+    assert sorted(entry for shard in shards for entry in shard) == [
+        (i, str(i)) for i in range(20)
+    ]
+    assert all(shards)
+    assert ShardedIndexBySize.get("test_sharded") == [(i, str(i)) for i in range(20)]
+
+    index_writes.clear()
+    value = cache.get("test_sharded", "7")
+    value["size"] = 100
+    cache.update("test_sharded", "7", value)
+    shard = ShardedIndexBySize.get_shard((100, "7"))
+    assert index_writes == [shard, shard]
+    assert (100, "7") in indexes[f"test_sharded:size__id#{shard}"]
+
+    assert cache.search("test_sharded", {"size": {"$gte": 18}}) == [
+        {"_id": "18", "size": 18},
+        {"_id": "19", "size": 19},
+        {"_id": "7", "size": 100},
+    ]
+
+    with pytest.raises(TypeError):
+
+        class BucketedShardedIndex(Index):
+            keys = ["_id", "size"]
+            cache_name = "test_sharded"
+            bucketed = True
+            shards = 2
+
+
+def test_InvertedIndex(registered_methods):
+    class IndexByTags(InvertedIndex):
+        keys = ["tags", "_id"]
+        cache_name = "test_inverted"
+
+    cache = Cache()
+    cache.set_many(
+        "test_inverted",
+        {
+            "1": collections.UserDict({"_id": "1", "tags": ["red", "new"], "size": 1}),
+            "2": collections.UserDict({"_id": "2", "tags": ["red"], "size": 2}),
+            "3": collections.UserDict({"_id": "3", "tags": ["blue", "new"], "size": 3}),
+            "4": collections.UserDict({"_id": "4", "size": 4}),
+        },
+    )
+    indexes = registered_methods[Index.INDEX_CACHE_NAME]
+    assert indexes["test_inverted:tags__id"] == ["blue", "new", "red"]
+    assert indexes["test_inverted:tags__id:red"] == ["1", "2"]
+
+    def search_ids(query):
+        return [value["_id"] for value in cache.search("test_inverted", query)]
+
+    assert search_ids({"tags": {"$contains": "new"}}) == ["1", "3"]
+    assert search_ids({"tags": {"$all": ["red", "new"]}}) == ["1"]
+    assert search_ids({"tags": {"$any": ["blue", "red"]}}) == ["1", "2", "3"]
+    assert search_ids({"tags": {"$any": ["red"]}, "size": {"$gt": 1}}) == ["2"]
+    assert search_ids({"tags": {"$all": []}}) == ["1", "2", "3"]
+    assert (
+        cache.explain("test_inverted", {"tags": {"$contains": "new"}})["scans"][0][
+            "index"
+        ]
+        == "IndexByTags"
+    )
+
+    value = cache.get("test_inverted", "2")
+    value["tags"].append("blue")
+    cache.update("test_inverted", "2", value)
+    assert search_ids({"tags": {"$contains": "blue"}}) == ["2", "3"]
+
+    cache.delete("test_inverted", "3")
+    assert search_ids({"tags": {"$contains": "blue"}}) == ["2"]
+    assert indexes["test_inverted:tags__id"] == ["blue", "new", "red"]
+    cache.delete("test_inverted", "1")
+    assert indexes["test_inverted:tags__id"] == ["blue", "red"]
+
+    with pytest.raises(TypeError):
+
+        class InvalidIndexByTags(InvertedIndex):
+            keys = ["_id", "tags"]
+
+
+def test_PrefixIndex(registered_methods):
+    class IndexByName(PrefixIndex):
+        keys = ["name", "_id"]
+        cache_name = "test_prefix"
+        normalize = staticmethod(lambda name: name.strip().casefold())
+
+    class IndexByCity(PrefixIndex):
+        keys = ["city", "_id"]
+        cache_name = "test_prefix"
+
+    cache = Cache()
+    names = ["Joan", "john", " JOHNNY", "Jack", "Bob", "Jo"]
+    cache.set_many(
+        "test_prefix",
+        {
+            str(i): collections.UserDict({"_id": str(i), "name": name, "city": name})
+            for i, name in enumerate(names)
+        },
+    )
+    assert registered_methods[Index.INDEX_CACHE_NAME]["test_prefix:name__id"][:3] == [
+        ("bob", "4"),
+        ("jack", "3"),
+        ("jo", "5"),
+    ]
+
+    def search_names(query, **kwargs):
+        return [value["name"] for value in cache.search("test_prefix", query, **kwargs)]
+
+    assert search_names({"name": {"$prefix": "JOH"}}) == ["john", " JOHNNY"]
+    assert search_names({"name": {"$prefix": "jo"}}, limit=2) == ["Jo", "Joan"]
+    assert search_names({"name": {"$prefix": "x"}}) == []
+    plan = cache.explain("test_prefix", {"name": {"$prefix": "jo"}})
+    assert plan["scans"][0]["index"] == "IndexByName"
+    assert plan["rest_query"] == []
+
+    assert search_names({"city": {"$prefix": "Jo"}}) == ["Jo", "Joan"]
+    assert cache.search(
+        "test_prefix", {"city": {"$prefix": "J"}}, projection=["city"], limit=1
+    ) == [{"city": "Jack"}]
+    assert cache.search(
+        "test_prefix", {"name": {"$prefix": "b"}}, projection=["name"]
+    ) == [{"name": "Bob"}]
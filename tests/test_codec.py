@@ -0,0 +1,97 @@
+import collections
+
+from ihashmap.cache import Cache
+from ihashmap.codec import StringCodec, StructCodec, TupleCodec
+from ihashmap.index import Index, SortedIndex
+
+
+def test_codecs():
+    keys = ["price", "weight", "name"]
+    value = {"price": -5, "weight": 1.5, "name": "a:b"}
+
+    assert StringCodec().decode(keys, StringCodec().encode(keys, value)) != value
+    assert TupleCodec().decode(keys, TupleCodec().encode(keys, value)) == value
+
+    codec = StructCodec({"price": "q", "weight": "d", "name": "8s"})
+    entry = codec.encode(keys, value)
+    assert isinstance(entry, bytes) and len(entry) == 24
+    assert codec.decode(keys, entry) == value
+    assert codec.first(keys, entry) == -5
+
+    values = [
+        {"price": price, "weight": weight, "name": name}
+        for price in (-(2**40), -1, 0, 3)
+        for weight in (-2.5, -0.0, 1e-3, 7.0)
+        for name in ("", "a", "ab", "b")
+    ]
+    entries = sorted(codec.encode(keys, value) for value in values)
+    assert codec.decode_many(keys, entries) == sorted(
+        values, key=lambda value: tuple(value[key] for key in keys)
+    )
+
+
+def test_Index_struct_codec(registered_methods):
+    class CodecIndexByPrice(SortedIndex):
+        keys = ["price", "_id"]
+        cache_name = "test_codec"
+        codec = StructCodec({"price": "i", "_id": "4s"})
+
+    class CodecIndexByColor(Index):
+        keys = ["_id", "color", "size"]
+        cache_name = "test_codec"
+        codec = StructCodec({"_id": "4s", "color": "8s", "size": "H"})
+
+    assert CodecIndexByColor.typed
+
+    cache = Cache()
+    cache.set_many(
+        "test_codec",
+        {
+            str(i): collections.UserDict(
+                {
+                    "_id": str(i),
+                    "price": i - 10,
+                    "color": ["red", "blue"][i % 2],
+                    "size": i,
+                }
+            )
+            for i in range(20)
+        },
+    )
+    result = cache.search(
+        "test_codec", {"price": {"$gte": -3, "$lt": 0}}, projection=["price"]
+    )
+    assert result == [{"price": -3}, {"price": -2}, {"price": -1}]
+
+    result = cache.search(
+        "test_codec", {"color": "blue", "size": {"$gt": 15}}, projection=["_id"]
+    )
+    assert result == [{"_id": "17"}, {"_id": "19"}]
+    assert cache.explain("test_codec", {"size": 3}, projection=["_id"])[
+        "covers_projection"
+    ]
+
+
+def test_Index_packed_codec(registered_methods):
+    class CodecIndexByWeight(SortedIndex):
+        keys = ["weight", "_id"]
+        cache_name = "test_codec_packed"
+        codec = StructCodec({"weight": "d", "_id": "4s"}, packed=True)
+
+    cache = Cache()
+    for i in range(10):
+        value = collections.UserDict({"_id": str(i), "weight": i / 2})
+        cache.set("test_codec_packed", str(i), value)
+    cache.delete("test_codec_packed", "3")
+
+    stored = registered_methods[Index.INDEX_CACHE_NAME][
+        CodecIndexByWeight.get_name("test_codec_packed")
+    ]
+    assert isinstance(stored, bytes) and len(stored) == 9 * 12
+
+    result = cache.search(
+        "test_codec_packed", {"weight": {"$between": (1, 2)}}, projection=["_id"]
+    )
+    assert result == [{"_id": "2"}, {"_id": "4"}]
+    result = cache.search("test_codec_packed", {}, sort="-weight", limit=1)
+    assert result[0]["_id"] == "9"
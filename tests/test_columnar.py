@@ -0,0 +1,76 @@
+import collections
+
+import pytest
+
+from ihashmap import columnar
+from ihashmap.cache import Cache
+from ihashmap.codec import StructCodec
+from ihashmap.index import Index
+
+
+@pytest.fixture(params=["numpy", "python"])
+def engine(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(columnar, "numpy", None)
+    return request.param
+
+
+def test_match_columns(engine):
+    columns = {"size": [5, 1, 3, 7, 3], "color": ["red", "blue", "red", "red", 1]}
+    if engine == "numpy":
+        columns["size"] = columnar.numpy.array(columns["size"])
+
+    def match(query, is_index=False):
+        return columnar.match_columns(
+            query, columns, 5, Cache._match_operators, is_index=is_index
+        )
+
+    assert match({"color": "red"}) == [0, 2, 3]
+    assert match({"color": "red", "size": {"$gte": 3, "$lt": 7}}) == [0, 2]
+    assert match({"size": {"$in": [3, 7]}}) == [2, 3, 4]
+    assert match({"size": {"$between": (2, 5)}, "color": lambda v: v != 1}) == [0, 2]
+    assert match({"color": {"$gt": "p"}}) == [0, 2, 3]
+    assert match({"size": 3}, is_index=True) == []
+    assert match({}) == [0, 1, 2, 3, 4]
+    assert columnar.split_query(
+        {"meta": {"a": 1}}, is_operators=Cache.is_operators
+    ) == (
+        [("meta", "$eq", {"a": 1})],
+        {},
+    )
+
+
+def test_Index_columnar_search(registered_methods, engine):
+    class ColumnarIndexBySize(Index):
+        keys = ["_id", "size", "weight"]
+        cache_name = "test_columnar_" + engine
+        codec = StructCodec({"_id": "4s", "size": "h", "weight": "d"}, packed=True)
+
+    cache_name = ColumnarIndexBySize.cache_name
+    cache = Cache()
+    cache.set_many(
+        cache_name,
+        {
+            str(i): collections.UserDict(
+                {"_id": str(i), "size": i % 10 - 5, "weight": i / 4}
+            )
+            for i in range(100)
+        },
+    )
+    result = cache.search(
+        cache_name,
+        {"size": {"$in": [-5, 4]}, "weight": {"$lt": 10}},
+        projection=["_id", "size", "weight"],
+    )
+    assert result == [
+        {"_id": "0", "size": -5, "weight": 0.0},
+        {"_id": "10", "size": -5, "weight": 2.5},
+        {"_id": "19", "size": 4, "weight": 4.75},
+        {"_id": "20", "size": -5, "weight": 5.0},
+        {"_id": "29", "size": 4, "weight": 7.25},
+        {"_id": "30", "size": -5, "weight": 7.5},
+        {"_id": "39", "size": 4, "weight": 9.75},
+        {"_id": "9", "size": 4, "weight": 2.25},
+    ]
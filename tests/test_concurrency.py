@@ -0,0 +1,89 @@
+import collections
+import threading
+import time
+
+import pytest
+
+from ihashmap.cache import Cache
+from ihashmap.concurrency import IndexConflictError, StripedLock, Versioned
+from ihashmap.index import Index
+
+
+def test_Index_compare_and_set(registered_methods, compare_and_set):
+    class VersionedIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_cas"
+
+    indexes = registered_methods[Index.INDEX_CACHE_NAME]
+    cache = Cache()
+    cache.set("test_cas", "1", collections.UserDict({"_id": "1", "color": "red"}))
+    assert indexes["test_cas:_id_color"] == Versioned(1, ["1:red"])
+
+    original_get = Cache.GET_METHOD
+    interleaved = []
+
+    def interleaved_get(self, name, key, default=None):
+        # Other writer adds entry between read and compare-and-set of first attempt.
+        value = original_get(self, name, key, default)
+        if key == "test_cas:_id_color" and not interleaved:
+            interleaved.append(key)
+            indexes[key] = Versioned(value.version + 1, value.data + ["3:red"])
+        return value
+
+    Cache.register_get_method(interleaved_get)
+    cache.set("test_cas", "2", collections.UserDict({"_id": "2", "color": "blue"}))
+    Cache.register_get_method(original_get)
+
+    assert compare_and_set.count("test_cas:_id_color") == 3
+    assert indexes["test_cas:_id_color"] == Versioned(3, ["1:red", "2:blue", "3:red"])
+    assert len(cache.search("test_cas", {"color": "red"})) == 1
+
+    def conflicting_get(self, name, key, default=None):
+        value = original_get(self, name, key, default)
+        if key == "test_cas:_id_color":
+            indexes[key] = Versioned(value.version + 1, value.data)
+        return value
+
+    Cache.register_get_method(conflicting_get)
+    with pytest.raises(IndexConflictError):
+        cache.set("test_cas", "4", collections.UserDict({"_id": "4", "color": "red"}))
+    Cache.register_get_method(original_get)
+
+
+def test_Index_striped_locks(registered_methods):
+    class LockedIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_locks"
+
+    original_get = Cache.GET_METHOD
+
+    def slow_get(self, name, key, default=None):
+        value = original_get(self, name, key, default)
+        time.sleep(0.001)
+        return value
+
+    def write(thread):
+        cache = Cache()
+        for i in range(5):
+            key = f"{thread}-{i}"
+            cache.set(
+                "test_locks", key, collections.UserDict({"_id": key, "color": "red"})
+            )
+
+    Cache.register_get_method(slow_get)
+    Cache.register_index_locks(StripedLock(4))
+    try:
+        threads = [
+            threading.Thread(target=write, args=(thread,)) for thread in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        Cache.register_index_locks(None)
+        Cache.register_get_method(original_get)
+
+    indexes = registered_methods[Index.INDEX_CACHE_NAME]
+    assert len(indexes["test_locks:_id"]) == 20
+    assert len(indexes["test_locks:_id_color"]) == 20
@@ -0,0 +1,151 @@
+import collections
+import time
+
+from ihashmap.cache import Cache
+from ihashmap.expiry import EXPIRES_AT, Expiry
+from ihashmap.index import Index
+from ihashmap.metrics import Metrics
+
+
+def test_Expiry(registered_methods):
+    class ExpiryIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_expiry"
+
+    now = [100.0]
+    original_delete = Cache.DELETE_METHOD
+    expiry = Expiry(batch_size=2, clock=lambda: now[0])
+    expiry.track("test_expiry", ttl=10)
+    Cache.register_expiry(expiry)
+    metrics = Metrics()
+    Cache.register_metrics(metrics)
+    try:
+        cache = Cache()
+        cache.set_many(
+            "test_expiry",
+            {
+                str(i): collections.UserDict({"_id": str(i), "color": "red"})
+                for i in range(5)
+            },
+        )
+        cache.set(
+            "test_expiry",
+            "long",
+            expiry.set_ttl(collections.UserDict({"_id": "long", "color": "red"}), 100),
+        )
+        cache.set(
+            "test_expiry",
+            "forever",
+            collections.UserDict({"_id": "forever", "color": "red", EXPIRES_AT: None}),
+        )
+        assert cache.get("test_expiry", "0")[EXPIRES_AT] == 110
+        assert len(cache.search("test_expiry", {"color": "red"})) == 7
+
+        now[0] = 110
+        assert cache.get("test_expiry", "0") is None
+        assert cache.get_many("test_expiry", ["0", "long"])[0] is None
+        assert sorted(value["_id"] for value in cache.all("test_expiry")) == [
+            "forever",
+            "long",
+        ]
+        assert [
+            value["_id"] for value in cache.search("test_expiry", {"color": "red"})
+        ] == ["forever", "long"]
+
+        # Stored values expired are still seen by index hooks and swept in batches.
+        assert expiry.sweep() == 5
+        stored = registered_methods["test_expiry"]
+        assert sorted(stored) == ["forever", "long"]
+        indexes = registered_methods[Index.INDEX_CACHE_NAME]
+        assert list(indexes["test_expiry:_id_color"]) == [
+            "forever:red",
+            "long:red",
+        ]
+        assert list(indexes["test_expiry:_expires_at__id"]) == [(200.0, "long")]
+        assert (
+            metrics.counters[("expired_values_total", (("cache", "test_expiry"),))] == 5
+        )
+
+        # Entries of values deleted behind cache's back are dropped.
+        Cache.register_delete_method(lambda self, name, key: stored.pop(key, None))
+        del stored["long"]
+        now[0] = 200
+        assert expiry.sweep("test_expiry") == 0
+        assert list(indexes["test_expiry:_expires_at__id"]) == []
+
+        cache.set(
+            "test_expiry", "0", collections.UserDict({"_id": "0", "color": "red"})
+        )
+        now[0] = 300
+        expiry.start(interval=0.001)
+        for _ in range(1000):
+            if "0" not in stored:
+                break
+            time.sleep(0.001)
+        expiry.stop()
+        assert sorted(stored) == ["forever"]
+    finally:
+        Cache.register_delete_method(original_delete)
+        Cache.register_expiry(None)
+        Cache.register_metrics(None)
+
+
+def test_Expiry_sweep_keeps_refreshed(registered_methods):
+    now = [100.0]
+    expiry = Expiry(clock=lambda: now[0])
+    expiry.track("test_expiry_refresh", ttl=10)
+    Cache.register_expiry(expiry)
+    try:
+        cache = Cache()
+        for key in ("1", "2"):
+            cache.set("test_expiry_refresh", key, collections.UserDict({"_id": key}))
+        now[0] = 105
+        cache.set(
+            "test_expiry_refresh",
+            "2",
+            expiry.set_ttl(collections.UserDict({"_id": "2"}), 10),
+        )
+        indexes = registered_methods[Index.INDEX_CACHE_NAME]
+        assert list(indexes["test_expiry_refresh:_expires_at__id"]) == [
+            (110.0, "1"),
+            (110.0, "2"),
+            (115.0, "2"),
+        ]
+
+        now[0] = 110
+        assert expiry.sweep() == 1
+        assert list(registered_methods["test_expiry_refresh"]) == ["2"]
+        assert cache.get("test_expiry_refresh", "2")[EXPIRES_AT] == 115
+        assert list(indexes["test_expiry_refresh:_expires_at__id"]) == [(115.0, "2")]
+    finally:
+        Cache.register_expiry(None)
+
+
+def test_Expiry_search_limit(registered_methods):
+    class ExpiryLimitIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_expiry_limit"
+
+    now = [100.0]
+    expiry = Expiry(clock=lambda: now[0])
+    expiry.track("test_expiry_limit", ttl=10)
+    Cache.register_expiry(expiry)
+    try:
+        cache = Cache()
+        cache.set(
+            "test_expiry_limit", "1", collections.UserDict({"_id": "1", "color": "r"})
+        )
+        cache.set(
+            "test_expiry_limit",
+            "2",
+            expiry.set_ttl(collections.UserDict({"_id": "2", "color": "r"}), 100),
+        )
+        now[0] = 110
+        assert cache.search("test_expiry_limit", {"color": "r"}, limit=1) == [
+            {"_id": "2", "color": "r", EXPIRES_AT: 200.0}
+        ]
+        assert cache.search("test_expiry_limit", {}, limit=1) == [
+            {"_id": "2", "color": "r", EXPIRES_AT: 200.0}
+        ]
+    finally:
+        Cache.register_expiry(None)
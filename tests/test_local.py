@@ -0,0 +1,87 @@
+import collections
+
+from ihashmap.cache import Cache
+from ihashmap.index import Index
+from ihashmap.local import LocalCache
+
+
+def test_LocalCache_eviction():
+    now = [0.0]
+    local_cache = LocalCache(max_entries=2, ttl=10, clock=lambda: now[0])
+    local_cache.put("test", "1", 1)
+    local_cache.put("test", "2", 2)
+    assert local_cache.get("test", "1") == 1
+    local_cache.put("test", "3", 3)
+    assert local_cache.get("test", "2", None) is None
+    assert local_cache.get("test", "1") == 1
+
+    now[0] = 10
+    assert local_cache.get("test", "3", None) is None
+    assert local_cache.stats() == {
+        "hits": 2,
+        "misses": 2,
+        "hit_ratio": 0.5,
+        "evictions": 1,
+        "expirations": 1,
+        "entries": 1,
+        "bytes": 0,
+    }
+
+    local_cache = LocalCache(max_entries=None, max_bytes=10, sizeof=len)
+    local_cache.put("test", "1", "x" * 6)
+    local_cache.put("test", "2", "x" * 6)
+    local_cache.put("test", "3", "x" * 11)
+    assert len(local_cache) == 1
+    assert local_cache.stats()["bytes"] == 6
+
+
+def test_Cache_local_cache(registered_methods):
+    class LocalIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_local"
+
+    local_cache = LocalCache()
+    Cache.register_local_cache(local_cache)
+    try:
+        cache = Cache()
+        cache.set("test_local", "1", collections.UserDict({"_id": "1", "color": "red"}))
+        assert cache.search("test_local", {"color": "red"})[0]["_id"] == "1"
+        misses = local_cache.misses
+        assert cache.search("test_local", {"color": "red"})[0]["_id"] == "1"
+        assert local_cache.misses == misses
+        assert local_cache.hits >= 2
+
+        cache.set("test_local", "2", collections.UserDict({"_id": "2", "color": "red"}))
+        result = cache.search("test_local", {"color": "red"})
+        assert [value["_id"] for value in result] == ["1", "2"]
+
+        cache.delete("test_local", "1")
+        assert cache.get("test_local", "1") is None
+        assert [value["_id"] for value in cache.all("test_local")] == ["2"]
+    finally:
+        Cache.register_local_cache(None)
+
+
+def test_LocalCache_copies_values(registered_methods):
+    class LocalIndexByName(Index):
+        keys = ["_id", "name"]
+        cache_name = "test_local_copy"
+
+    Cache.register_local_cache(LocalCache())
+    try:
+        cache = Cache()
+        cache.set(
+            "test_local_copy", "1", collections.UserDict({"_id": "1", "name": "ax"})
+        )
+        value = cache.get("test_local_copy", "1")
+        value["name"] = "axx"
+        other = cache.get("test_local_copy", "1")
+        assert other is not value
+        assert other["name"] == "ax"
+
+        cache.update("test_local_copy", "1", value)
+        indexes = registered_methods[Index.INDEX_CACHE_NAME]
+        assert list(indexes["test_local_copy:_id_name"]) == ["1:axx"]
+        assert cache.search("test_local_copy", {"name": "axx"}) == [value]
+    finally:
+        Cache.register_local_cache(None)
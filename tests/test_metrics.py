@@ -0,0 +1,79 @@
+import collections
+import itertools
+
+import pytest
+
+from ihashmap.cache import Cache
+from ihashmap.index import Index
+from ihashmap.metrics import Histogram, Metrics
+
+
+@pytest.fixture
+def metrics():
+    ticks = itertools.count()
+    metrics = Metrics(slow_search=0.002, sizeof=len, clock=lambda: next(ticks) / 1000)
+    Cache.register_metrics(metrics)
+    yield metrics
+    Cache.register_metrics(None)
+
+
+def test_Histogram():
+    histogram = Histogram(buckets=[1, 5])
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value)
+    assert histogram.as_dict() == {
+        "count": 4,
+        "sum": 14.5,
+        "buckets": {1: 2, 5: 3, float("inf"): 4},
+    }
+
+
+def test_Metrics(registered_methods, metrics):
+    class MeasuredIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_metrics"
+
+    cache = Cache()
+    for key in ("1", "2"):
+        cache.set(
+            "test_metrics", key, collections.UserDict({"_id": key, "color": "red"})
+        )
+    assert len(cache.search("test_metrics", {"color": "red"})) == 2
+
+    exported = metrics.as_dict()
+    counters = {
+        (counter["name"], tuple(counter["labels"].values())): counter["value"]
+        for counter in exported["counters"]
+    }
+    assert counters[("backend_calls_total", ("set",))] == 2
+    assert counters[("backend_bytes_total", ("set",))] == 4
+    assert counters[("index_writes_total", ("MeasuredIndexByColor",))] == 2
+    assert counters[("index_reads_total", ("MeasuredIndexByColor",))] == 4
+    assert counters[("slow_searches_total", ("test_metrics",))] == 1
+
+    histograms = {
+        (histogram["name"], tuple(histogram["labels"].values())): histogram
+        for histogram in exported["histograms"]
+    }
+    assert histograms[("pipeline_seconds", ("set",))]["count"] == 2
+    assert (
+        histograms[("action_seconds", ("MeasuredIndexByColor.after_create", "set"))][
+            "count"
+        ]
+        == 2
+    )
+
+    (slow_search,) = exported["slow_searches"]
+    assert slow_search["index"] == "MeasuredIndexByColor"
+    assert slow_search["matched"] == {"MeasuredIndexByColor": 2}
+    assert slow_search["fetched"] == 2
+    assert slow_search["rows"] == 2
+
+    text = metrics.to_prometheus()
+    assert "# TYPE ihashmap_pipeline_seconds histogram\n" in text
+    assert 'ihashmap_backend_calls_total{pipeline="set"} 2\n' in text
+    assert 'ihashmap_pipeline_seconds_bucket{pipeline="set",le="+Inf"} 2\n' in text
+
+    Cache.register_metrics(None)
+    cache.search("test_metrics", {"color": "red"})
+    assert metrics.as_dict() == exported
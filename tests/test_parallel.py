@@ -0,0 +1,74 @@
+import collections
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from ihashmap.cache import Cache
+from ihashmap.index import Index
+from ihashmap.parallel import ParallelExecutor
+
+
+@pytest.fixture
+def executor():
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as match_executor:
+        executor = ParallelExecutor(
+            max_workers=4, match_executor=match_executor, match_chunk_size=2
+        )
+        Cache.register_executor(executor)
+        yield executor
+        Cache.register_executor(None)
+        executor.shutdown()
+
+
+def test_ParallelExecutor_map():
+    executor = ParallelExecutor(max_workers=4, max_in_flight=3)
+    lock = threading.Lock()
+    running, peaks = [0], []
+
+    def call(item):
+        with lock:
+            running[0] += 1
+            peaks.append(running[0])
+        time.sleep(0.001 * (item % 3))
+        with lock:
+            running[0] -= 1
+        return item * 2
+
+    assert list(executor.map(call, range(20))) == [item * 2 for item in range(20)]
+    assert max(peaks) <= 3
+
+    nested = executor.map(lambda item: list(executor.map(call, [item, item])), range(3))
+    assert list(nested) == [[0, 0], [2, 2], [4, 4]]
+    executor.shutdown()
+
+
+def test_Cache_search_parallel(registered_methods, executor):
+    class ParallelIndexByModel(Index):
+        keys = ["_id", "model"]
+        cache_name = "test_parallel"
+
+    cache = Cache()
+    values = {
+        f"{i:02d}": collections.UserDict({"_id": f"{i:02d}", "model": i % 3, "size": i})
+        for i in range(12)
+    }
+    cache.set_many("test_parallel", values)
+
+    original_get = Cache.GET_METHOD
+    threads = set()
+
+    def slow_get(self, name, key, default=None):
+        threads.add(threading.get_ident())
+        time.sleep(0.001)
+        return original_get(self, name, key, default)
+
+    Cache.register_get_method(slow_get)
+    try:
+        assert cache.all("test_parallel") == list(values.values())
+        found = cache.search("test_parallel", {"model": 1, "size": {"$gt": 1}})
+    finally:
+        Cache.register_get_method(original_get)
+    assert [value["_id"] for value in found] == ["04", "07", "10"]
+    assert len(threads) > 1
@@ -0,0 +1,113 @@
+import collections
+
+from ihashmap.cache import Cache
+from ihashmap.index import Index, SortedIndex
+
+
+def test_QueryPlan_intersection(registered_methods, pipeline_actions):
+    class PlannerIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_planner"
+
+    class PlannerIndexBySize(Index):
+        keys = ["_id", "size"]
+        cache_name = "test_planner"
+        bucketed = True
+
+    cache = Cache()
+    entities = {
+        str(i): collections.UserDict(
+            {"_id": str(i), "color": ["red", "blue"][i % 2], "size": i % 10}
+        )
+        for i in range(100)
+    }
+    cache.set_many("test_planner", entities)
+
+    fetched = []
+
+    @Cache.PIPELINE.get_many.before(cache_name="test_planner")
+    def count_fetches(ctx):
+        fetched.extend(ctx.args[0])
+
+    pipeline_actions.append(count_fetches)
+
+    plan = cache.explain("test_planner", {"color": "red", "size": 4})
+    assert [scan["index"] for scan in plan["scans"]] == [
+        "PlannerIndexBySize",
+        "PlannerIndexByColor",
+    ]
+    assert plan["covered"]
+    assert plan["estimated_rows"] == 5
+
+    result = cache.search("test_planner", {"color": "red", "size": 4})
+    assert {entity["_id"] for entity in result} == {str(i) for i in range(4, 100, 10)}
+    assert len(fetched) == 10
+
+    plan = cache.explain("test_planner", {"size": 3, "other": 1})
+    assert [scan["index"] for scan in plan["scans"]] == ["PlannerIndexBySize"]
+    assert plan["rest_query"] == ["other"]
+    assert not plan["covered"]
+
+
+def test_QueryPlan_sort_driver(registered_methods):
+    class PlannerIndexByCreated(SortedIndex):
+        keys = ["created", "_id"]
+        cache_name = "test_planner_sort"
+
+    class PlannerIndexByKind(Index):
+        keys = ["_id", "kind"]
+        cache_name = "test_planner_sort"
+
+    cache = Cache()
+    cache.set_many(
+        "test_planner_sort",
+        {
+            str(i): collections.UserDict({"_id": str(i), "created": i, "kind": i % 3})
+            for i in range(30)
+        },
+    )
+
+    plan = cache.explain("test_planner_sort", {"kind": 1}, sort="-created", limit=2)
+    assert plan["scans"][0]["index"] == "PlannerIndexByCreated"
+    assert plan["in_order"]
+    result = cache.search("test_planner_sort", {"kind": 1}, sort="-created", limit=2)
+    assert [entity["created"] for entity in result] == [28, 25]
+
+
+def test_QueryPlan_projection(registered_methods, pipeline_actions):
+    class PlannerIndexByPrice(SortedIndex):
+        keys = ["price", "_id"]
+        cache_name = "test_planner_projection"
+
+    cache = Cache()
+    cache.set_many(
+        "test_planner_projection",
+        {
+            str(i): collections.UserDict({"_id": str(i), "price": i, "name": f"n{i}"})
+            for i in range(10)
+        },
+    )
+
+    fetched = []
+
+    @Cache.PIPELINE.get_many.before(cache_name="test_planner_projection")
+    def count_fetches(ctx):
+        fetched.extend(ctx.args[0])
+
+    pipeline_actions.append(count_fetches)
+
+    query = {"price": {"$gte": 7}}
+    assert cache.explain("test_planner_projection", query, projection=["_id"])[
+        "covers_projection"
+    ]
+    assert cache.search("test_planner_projection", query, projection=["price"]) == [
+        {"price": 7},
+        {"price": 8},
+        {"price": 9},
+    ]
+    assert fetched == []
+
+    assert cache.search(
+        "test_planner_projection", query, projection=["name"], limit=1
+    ) == [{"name": "n7"}]
+    assert fetched == ["7"]
@@ -0,0 +1,186 @@
+import collections
+import os
+
+import pytest
+
+from ihashmap.cache import Cache
+from ihashmap.concurrency import Versioned
+from ihashmap.index import Index, SortedIndex
+from ihashmap.snapshot import IndexSnapshot, SnapshotEntries
+
+
+@pytest.fixture
+def snapshot_factory(tmp_path):
+    snapshots = []
+
+    def create():
+        snapshot = IndexSnapshot(str(tmp_path), page_size=2)
+        snapshot.open()
+        snapshots.append(snapshot)
+        return snapshot
+
+    yield create
+    for snapshot in snapshots:
+        snapshot.unregister()
+        snapshot.close()
+
+
+def test_IndexSnapshot(registered_methods, snapshot_factory):
+    class SnapshotIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_snapshot"
+        bucketed = True
+
+    class SnapshotIndexBySize(SortedIndex):
+        keys = ["size", "_id"]
+        cache_name = "test_snapshot"
+
+    cache = Cache()
+    cache.set_many(
+        "test_snapshot",
+        {
+            str(i): collections.UserDict(
+                {"_id": str(i), "color": ["red", "blue"][i % 2], "size": i}
+            )
+            for i in range(10)
+        },
+    )
+    indexes = registered_methods[Index.INDEX_CACHE_NAME]
+    stored = dict(indexes)
+
+    snapshot_factory().save(["test_snapshot"])
+    assert set(stored) == {
+        "test_snapshot:_id",
+        "test_snapshot:_id_color",
+        "test_snapshot:_id_color:red",
+        "test_snapshot:_id_color:blue",
+        "test_snapshot:size__id",
+    }
+
+    # Restarted process lost indexes but restores them from snapshot.
+    indexes.clear()
+    snapshot = snapshot_factory()
+    snapshot.register()
+    assert len(cache.search("test_snapshot", {"color": "red"})) == 5
+    assert cache.search("test_snapshot", {"size": {"$gte": 8}}) == [
+        cache.get("test_snapshot", "8"),
+        cache.get("test_snapshot", "9"),
+    ]
+    entries = snapshot.get("test_snapshot:size__id")
+    assert isinstance(entries, SnapshotEntries)
+    assert list(entries) == list(stored["test_snapshot:size__id"])
+
+    lazy = snapshot.get("test_snapshot:size__id")
+    assert lazy[9] == (9, "9")
+    assert list(lazy.loaded) == [4]
+
+    cache.set(
+        "test_snapshot",
+        "10",
+        collections.UserDict({"_id": "10", "color": "red", "size": 10}),
+    )
+    cache.delete("test_snapshot", "0")
+    snapshot.unregister()
+    assert os.path.getsize(snapshot.log_path) > 0
+
+    indexes.clear()
+    restarted = snapshot_factory()
+    restarted.register()
+    assert sorted(
+        value["_id"] for value in cache.search("test_snapshot", {"color": "red"})
+    ) == ["10", "2", "4", "6", "8"]
+
+    restarted.save()
+    assert os.path.getsize(restarted.log_path) == 0
+    assert restarted.changes == {}
+    assert len(cache.search("test_snapshot", {"size": {"$lt": 3}})) == 2
+
+
+def test_IndexSnapshot_compare_and_set(
+    registered_methods, compare_and_set, snapshot_factory
+):
+    class SnapshotIndexByShape(Index):
+        keys = ["_id", "shape"]
+        cache_name = "test_snapshot_cas"
+
+    cache = Cache()
+    cache.set(
+        "test_snapshot_cas", "1", collections.UserDict({"_id": "1", "shape": "a"})
+    )
+    snapshot_factory().save(["test_snapshot_cas"])
+
+    snapshot = snapshot_factory()
+    snapshot.register()
+    indexes = registered_methods[Index.INDEX_CACHE_NAME]
+    cache.set(
+        "test_snapshot_cas", "2", collections.UserDict({"_id": "2", "shape": "b"})
+    )
+    assert indexes["test_snapshot_cas:_id_shape"] == Versioned(2, ["1:a", "2:b"])
+    assert (
+        snapshot.changes["test_snapshot_cas:_id_shape"]
+        == indexes["test_snapshot_cas:_id_shape"]
+    )
+
+    # Other process changed stored index, so snapshot is refreshed and rewrite retried.
+    indexes["test_snapshot_cas:_id_shape"] = Versioned(3, ["1:a", "2:b", "4:a"])
+    compare_and_set.clear()
+    cache.set(
+        "test_snapshot_cas", "3", collections.UserDict({"_id": "3", "shape": "a"})
+    )
+    assert indexes["test_snapshot_cas:_id_shape"] == Versioned(
+        4, ["1:a", "2:b", "3:a", "4:a"]
+    )
+    assert compare_and_set.count("test_snapshot_cas:_id_shape") == 1
+    snapshot.unregister()
+
+    restarted = snapshot_factory()
+    assert list(restarted.get("test_snapshot_cas:_id_shape").data) == [
+        "1:a",
+        "2:b",
+        "3:a",
+        "4:a",
+    ]
+
+
+def test_IndexSnapshot_cold_start(registered_methods, snapshot_factory, monkeypatch):
+    class SnapshotIndexByShade(Index):
+        keys = ["_id", "shade"]
+        cache_name = "test_snapshot_cold"
+
+    cache = Cache()
+    cache.set_many(
+        "test_snapshot_cold",
+        {
+            str(i): collections.UserDict({"_id": str(i), "shade": i % 2})
+            for i in range(20)
+        },
+    )
+    snapshot = snapshot_factory()
+    snapshot.save(["test_snapshot_cold"])
+    held = snapshot.get("test_snapshot_cold:_id_shade")
+
+    # Readers of replaced snapshot keep working after save.
+    snapshot.save(["test_snapshot_cold"])
+    assert len(list(held)) == 20
+
+    # Restarted process restores statistics and reads only needed pages.
+    registered_methods[Index.INDEX_CACHE_NAME].clear()
+    for index in Index.find_index_for_cache("test_snapshot_cold"):
+        index.drop_stats("test_snapshot_cold")
+    loaded = []
+    load_page = SnapshotEntries.load_page
+
+    def counted_load_page(self, page):
+        if page not in self.loaded:
+            loaded.append(page)
+        return load_page(self, page)
+
+    monkeypatch.setattr(SnapshotEntries, "load_page", counted_load_page)
+    monkeypatch.setattr(Index, "MATCH_CHUNK_SIZE", 4)
+    restarted = snapshot_factory()
+    restarted.register()
+    assert SnapshotIndexByShade.get_stats("test_snapshot_cold").entries == 20
+    assert cache.search("test_snapshot_cold", {"shade": 1}, limit=1) == [
+        {"_id": "11", "shade": 1}
+    ]
+    assert len(loaded) <= 2
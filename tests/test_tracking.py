@@ -0,0 +1,84 @@
+import collections
+
+from ihashmap.cache import Cache
+from ihashmap.index import Index
+from ihashmap.tracking import TrackedDict, get_changed_keys, get_original
+
+
+def test_TrackedDict():
+    value = TrackedDict({"_id": "1", "color": "red"})
+    value["color"] = "green"
+    assert get_original(value) is None
+    assert value.get_changed_keys() == set()
+
+    value["color"] = "red"
+    value.commit()
+    original = get_original(value)
+    value["color"] = "blue"
+    value["size"] = 1
+    value["size"] = 2
+    assert dict(original) == {"_id": "1", "color": "red"}
+    assert "size" not in original
+    assert value.get_changed_keys() == {"color", "size"}
+    assert get_changed_keys(original, value, ["_id", "color"]) == {"color"}
+
+    value.commit()
+    assert dict(original) == {"_id": "1", "color": "blue", "size": 2}
+
+
+def test_Cache_update_tracking(registered_methods, pipeline_actions):
+    class TrackingIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_tracking"
+
+    index_writes = []
+
+    @Cache.PIPELINE.index_set.after()
+    def count_index_writes(ctx):
+        if ctx.name == "test_tracking":
+            index_writes.append(ctx.cls_or_self)
+
+    pipeline_actions.append(count_index_writes)
+
+    cache = Cache()
+    cache.set("test_tracking", "1", collections.UserDict({"_id": "1", "color": "red"}))
+    cache.set("test_tracking", "2", TrackedDict({"_id": "2", "color": "red"}))
+    assert get_original(cache.get("test_tracking", "1")) == {"_id": "1", "color": "red"}
+
+    for key in ("1", "2"):
+        value = cache.get("test_tracking", key)
+        value["size"] = 10
+        index_writes.clear()
+        cache.update("test_tracking", key, value)
+        assert index_writes == []
+
+        value["color"] = "blue"
+        cache.update("test_tracking", key, value)
+        assert index_writes == [TrackingIndexByColor, TrackingIndexByColor]
+
+    assert cache.search("test_tracking", {"color": "blue"}) == [
+        {"_id": "1", "color": "blue", "size": 10},
+        {"_id": "2", "color": "blue", "size": 10},
+    ]
+    assert registered_methods[Index.INDEX_CACHE_NAME]["test_tracking:_id_color"] == [
+        "1:blue",
+        "2:blue",
+    ]
+
+
+def test_Cache_update_untracked(registered_methods):
+    class UntrackedIndexByColor(Index):
+        keys = ["_id", "color"]
+        cache_name = "test_untracked"
+
+    cache = Cache()
+    cache.set("test_untracked", "1", TrackedDict({"_id": "1", "color": "red"}))
+    cache.update("test_untracked", "1", TrackedDict({"_id": "1", "color": "blue"}))
+
+    assert cache.search("test_untracked", {"color": "red"}) == []
+    assert cache.search("test_untracked", {"color": "blue"}) == [
+        {"_id": "1", "color": "blue"}
+    ]
+    assert registered_methods[Index.INDEX_CACHE_NAME]["test_untracked:_id_color"] == [
+        "1:blue"
+    ]